@@ -0,0 +1,78 @@
+""" Benchmark the full login, fetch, transform and ICS writing pipeline against a local replay server
+
+    Runs the same functions as fb2cal itself (pipeline.login, pipeline.fetch_facebook_users with its offset month planner
+    and pagination, and pipeline.save_ics_file), reporting the per stage timings they record.
+    Uses the mock cassette from the tests unless a recorded cassette is given.
+    Usage: python benchmarks/bench_end_to_end.py [--cassette PATH] [--latency 0.1] [--jitter 0.02] [--payload-scale 100] [--concurrent] [--upcoming-days 30] [--iterations 5]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import configparser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from fb2cal.ics_writer import ICSWriter
+from fb2cal.metrics import Metrics
+from fb2cal.pipeline import create_facebook_browser, login, fetch_facebook_users, save_ics_file
+from fb2cal.replay import ReplayServer, load_cassette
+
+from mocks.replay_cassette_mocks import REPLAY_CASSETTE_MOCK
+
+def create_config(args, base_url, ics_file_path):
+    config = configparser.RawConfigParser()
+    config.read_dict({
+        'AUTH': {'fb_email': 'user@example.com', 'fb_pass': 'password'},
+        'FETCH': {'concurrent': str(args.concurrent), 'stream_json': str(args.stream_json), 'upcoming_days': str(args.upcoming_days)},
+        'FILESYSTEM': {'save_to_file': 'True', 'ics_file_path': ics_file_path},
+        'DEVELOPMENT': {'facebook_base_url': base_url},
+    })
+    return config
+
+def run_pipeline(config):
+    metrics = Metrics()
+
+    start = time.perf_counter()
+    facebook_browser = create_facebook_browser(config, metrics=metrics)
+    with metrics.time_stage('login'):
+        login(config, facebook_browser)
+    facebook_users = fetch_facebook_users(config, facebook_browser)
+    save_ics_file(config, ICSWriter(facebook_users), metrics)
+    total = time.perf_counter() - start
+
+    return len(facebook_users), len(metrics.quarter_birthdays), metrics.stages, total
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the fb2cal pipeline against a local replay server.')
+    parser.add_argument('--cassette', help='Recorded cassette to replay (defaults to the test mock cassette)')
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--payload-scale', type=int, default=1)
+    parser.add_argument('--concurrent', action='store_true')
+    parser.add_argument('--stream-json', action='store_true')
+    parser.add_argument('--upcoming-days', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=3)
+    args = parser.parse_args()
+
+    cassette = load_cassette(args.cassette) if args.cassette else REPLAY_CASSETTE_MOCK
+    server = ReplayServer(cassette, latency=args.latency, jitter=args.jitter, payload_scale=args.payload_scale)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = create_config(args, server.base_url, os.path.join(temp_dir, 'birthdays.ics'))
+            for iteration in range(args.iterations):
+                friend_count, offset_months, stages, total = run_pipeline(config)
+                formatted_stages = '  '.join(f'{stage} {seconds * 1000:8.1f} ms' for stage, seconds in stages.items())
+                print(f'#{iteration + 1} {friend_count:>7} friends  {offset_months:>2} offset months  total {total * 1000:8.1f} ms  {formatted_stages}')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+""" Benchmark how much memory the merged friend list keeps alive
+
+    Compares a set of FacebookUser objects (how quarters used to be merged) with a FriendTable (how they are merged now).
+    Only memory still allocated once the quarters' FacebookUser lists are released is counted.
+    Usage: python benchmarks/bench_friend_storage.py [--sizes 1000 10000 100000]
+"""
+
+import os
+import sys
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fb2cal.friend_table import FriendTable
+from fb2cal.transformer import Transformer
+
+from synthetic import generate_birthday_comet_monthly_quarters
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+def merge_into_set(facebook_users_by_quarter):
+    facebook_users = set()
+    for facebook_users_for_quarter in facebook_users_by_quarter:
+        facebook_users.update(facebook_users_for_quarter)
+    return facebook_users
+
+def merge_into_friend_table(facebook_users_by_quarter):
+    facebook_users = FriendTable()
+    seen_ids = set()
+    for facebook_users_for_quarter in facebook_users_by_quarter:
+        for facebook_user in facebook_users_for_quarter:
+            if facebook_user.id not in seen_ids:
+                seen_ids.add(facebook_user.id)
+                facebook_users.append(facebook_user)
+    return facebook_users
+
+STORAGES = {
+    'set': merge_into_set,
+    'friend_table': merge_into_friend_table,
+}
+
+def measure_retained_bytes(merge, quarters):
+    """ Bytes still allocated after transforming and merging quarters, with only the merged result alive """
+    transformer = Transformer()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    facebook_users = merge(transformer.transform_birthday_comet_monthly_to_birthdays(quarter) for quarter in quarters.values())
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return retained, len(facebook_users)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark memory kept alive by merged friend lists.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    args = parser.parse_args()
+
+    for friend_count in args.sizes:
+        quarters = generate_birthday_comet_monthly_quarters(friend_count)
+        for storage, merge in STORAGES.items():
+            retained, friends = measure_retained_bytes(merge, quarters)
+            print(f'{storage:<14} {friends:>7} friends  retained {retained / 1024 / 1024:>8.2f} MiB  {retained / friends:>7.0f} bytes per friend')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+""" Benchmark how long importing fb2cal takes using python -X importtime
+
+    Every measurement runs in a fresh interpreter so nothing is cached in sys.modules.
+    Usage: python benchmarks/bench_import_time.py [--module fb2cal.__main__] [--repeat 5] [--top 15]
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from mocks.import_time import HEAVY_MODULES, measure_import_time
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark how long importing fb2cal takes.')
+    parser.add_argument('--module', default='fb2cal.__main__')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to list')
+    args = parser.parse_args()
+
+    runs = [measure_import_time(f'import {args.module}') for _ in range(args.repeat)]
+    best_run = min(runs, key=lambda import_times: import_times[args.module][1])
+
+    print(f'{args.module}: best {best_run[args.module][1] / 1000:.1f} ms, median {sorted(run[args.module][1] for run in runs)[len(runs) // 2] / 1000:.1f} ms over {args.repeat} runs')
+
+    heavy_modules = [module for module in HEAVY_MODULES if module in best_run]
+    print(f'Heavy modules imported: {", ".join(heavy_modules) or "none"}')
+
+    print(f'Slowest imports (cumulative ms):')
+    for name, (self_time, cumulative_time) in sorted(best_run.items(), key=lambda item: item[1][1], reverse=True)[:args.top]:
+        print(f'{cumulative_time / 1000:>9.1f}  {name}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+""" Benchmark decoding BirthdayCometMonthlyBirthdaysRefetchQuery responses with each available JSON backend
+
+    The January mock response is scaled up to the requested number of friends by cloning its friend edges.
+    Usage: python benchmarks/bench_json_backend.py [friend counts...]
+"""
+
+import os
+import sys
+import copy
+import json
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from fb2cal import json_backend
+from fb2cal.utils import ANTI_HIJACKING_PREFIX, remove_anti_hijacking_protection, remove_anti_hijacking_protection_bytes
+
+from mocks.birthday_comet_root_mocks import BIRTHDAY_COMET_ROOT_JANUARY_MOCK
+
+DEFAULT_FRIEND_COUNTS = [1000, 5000]
+REPEAT = 5
+
+def scale_mock(friend_count):
+    """ Clone the mock's friend edges (with unique ids) until each month holds its share of friend_count friends """
+    response_json = copy.deepcopy(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+    month_edges = response_json['data']['viewer']['all_friends_by_birthday_month']['edges']
+
+    for month_index, month_edge in enumerate(month_edges):
+        friend_edges = month_edge['node']['friends']['edges']
+        template = friend_edges[0]
+        month_friend_count = friend_count // len(month_edges) + (1 if month_index < friend_count % len(month_edges) else 0)
+
+        friend_edges.clear()
+        for i in range(month_friend_count):
+            friend_edge = copy.deepcopy(template)
+            friend_edge['node']['id'] = f'{month_index}{i:07}'
+            friend_edges.append(friend_edge)
+
+    return (ANTI_HIJACKING_PREFIX + json.dumps(response_json)).encode('utf-8')
+
+def decode_stdlib(content):
+    return json.loads(remove_anti_hijacking_protection(content.decode('utf-8')))
+
+def decode_json_backend(content):
+    return json_backend.loads(remove_anti_hijacking_protection_bytes(content))
+
+def main(friend_counts):
+    print(f'json_backend: {json_backend.JSON_BACKEND}')
+
+    for friend_count in friend_counts:
+        content = scale_mock(friend_count)
+        assert decode_stdlib(content) == decode_json_backend(content)
+
+        for name, decode in [('stdlib (str)', decode_stdlib), (f'{json_backend.JSON_BACKEND} (bytes)', decode_json_backend)]:
+            number = max(1, 20000 // friend_count)
+            best = min(timeit.repeat(lambda: decode(content), number=number, repeat=REPEAT)) / number
+            print(f'{friend_count:>7} friends {len(content) / 1024:>9.0f} KiB  {name:<16} {best * 1000:>9.2f} ms')
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_FRIEND_COUNTS)
@@ -0,0 +1,150 @@
+""" Benchmark Transformer, deduplication into a FriendTable and ICSWriter on synthetic friend lists
+
+    'generate' builds the ics library object model, 'write' streams the native serializer to a file.
+
+    Every stage runs in its own process so peak RSS is not polluted by earlier stages.
+    Wall time and peak RSS are measured on an untraced run, allocations on a separate tracemalloc run.
+    Usage: python benchmarks/bench_pipeline.py [--sizes 1000 10000 100000] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fb2cal.__meta__ import __version__
+from fb2cal.friend_table import FriendTable
+from fb2cal.ics_writer import ICSWriter
+from fb2cal.transformer import Transformer
+
+from synthetic import generate_birthday_comet_monthly_quarters
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+def setup_transform(friend_count):
+    quarters = generate_birthday_comet_monthly_quarters(friend_count)
+    transformer = Transformer()
+    return lambda: [transformer.transform_birthday_comet_monthly_to_birthdays(quarter) for quarter in quarters.values()]
+
+def setup_deduplicate(friend_count):
+    transformer = Transformer()
+    facebook_users_by_quarter = [transformer.transform_birthday_comet_monthly_to_birthdays(quarter) for quarter in generate_birthday_comet_monthly_quarters(friend_count).values()]
+
+    def deduplicate():
+        facebook_users = FriendTable()
+        seen_ids = set()
+        for facebook_users_for_quarter in facebook_users_by_quarter:
+            for facebook_user in facebook_users_for_quarter:
+                if facebook_user.id not in seen_ids:
+                    seen_ids.add(facebook_user.id)
+                    facebook_users.append(facebook_user)
+        return facebook_users
+
+    return deduplicate
+
+def setup_generate(friend_count):
+    transformer = Transformer()
+    facebook_users = FriendTable()
+    seen_ids = set()
+    for quarter in generate_birthday_comet_monthly_quarters(friend_count).values():
+        for facebook_user in transformer.transform_birthday_comet_monthly_to_birthdays(quarter):
+            if facebook_user.id not in seen_ids:
+                seen_ids.add(facebook_user.id)
+                facebook_users.append(facebook_user)
+    return ICSWriter(facebook_users).generate
+
+def setup_write(friend_count):
+    ics_writer = setup_generate(friend_count).__self__
+    ics_file_path = os.path.join(tempfile.mkdtemp(), 'birthdays.ics')
+    return lambda: ics_writer.write(ics_file_path)
+
+STAGES = {
+    'transform': setup_transform,
+    'deduplicate': setup_deduplicate,
+    'generate': setup_generate,
+    'write': setup_write,
+}
+
+def run_stage(stage, friend_count, results):
+    """ Runs in a child process """
+    # Keep fb2cal logging out of the measurements
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    run = STAGES[stage](friend_count)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    run()
+    wall_time = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    run = STAGES[stage](friend_count)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = run()
+    after = tracemalloc.take_snapshot()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    allocated = [stat for stat in after.compare_to(before, 'filename') if stat.size_diff > 0]
+
+    # ru_maxrss is in KiB on Linux
+    results.update({
+        'wall_time_s': wall_time,
+        'peak_rss_kib': peak_rss,
+        'rss_growth_kib': peak_rss - rss_before,
+        'traced_peak_bytes': traced_peak,
+        'allocated_bytes': sum(stat.size_diff for stat in allocated),
+        'allocated_blocks': sum(stat.count_diff for stat in allocated),
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fb2cal stages on synthetic friend lists.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--output', help=f'Results file (default: {DEFAULT_OUTPUT_DIR}/fb2cal-<version>.json)')
+    args = parser.parse_args()
+
+    report = {
+        'fb2cal_version': __version__,
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'results': [],
+    }
+
+    manager = multiprocessing.Manager()
+    for friend_count in args.sizes:
+        for stage in args.stages:
+            results = manager.dict()
+            process = multiprocessing.Process(target=run_stage, args=(stage, friend_count, results))
+            process.start()
+            process.join()
+
+            result = {'stage': stage, 'friends': friend_count, **results}
+            if process.exitcode != 0:
+                result['error'] = f'Exit code {process.exitcode}'
+            report['results'].append(result)
+            print(f'{stage:<12} {friend_count:>7} friends  {result.get("wall_time_s", float("nan")) * 1000:>10.1f} ms  '
+                  f'peak RSS {result.get("peak_rss_kib", 0) / 1024:>8.1f} MiB  allocated {result.get("allocated_bytes", 0) / 1024 / 1024:>8.1f} MiB in {result.get("allocated_blocks", 0)} blocks')
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f'fb2cal-{__version__}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, mode='w', encoding='UTF-8') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f'Saved results to {output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+""" Benchmark the friend extractor in transformer.py, which guards every node against malformed responses, against the unguarded
+    Transformer loop it replaced
+
+    Every variant reads all quarters of a synthetic friend list (see synthetic.py), the best of --repeat runs is reported.
+    Usage: python benchmarks/bench_transformer.py [--sizes 1000 10000 100000] [--repeat 5]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fb2cal.facebook_user import FacebookUser
+from fb2cal.transformer import Transformer, extract_birthday_comet_monthly_friends
+
+from synthetic import generate_birthday_comet_monthly_quarters
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+def loop_facebook_users(birthday_comet_root_json):
+    """ Transformer.transform_birthday_comet_monthly_to_birthdays before malformed nodes were skipped """
+    facebook_users = []
+
+    for all_friends_by_birthday_month_edge in birthday_comet_root_json['data']['viewer']['all_friends_by_birthday_month']['edges']:
+        for friend_edge in all_friends_by_birthday_month_edge['node']['friends']['edges']:
+            friend = friend_edge['node']
+            facebook_users.append(
+                FacebookUser(
+                    friend["id"],
+                    friend["name"],
+                    friend["profile_url"],
+                    friend["profile_picture"]["uri"],
+                    friend["birthdate"]["day"],
+                    friend["birthdate"]["month"],
+                    friend["birthdate"]["year"]
+            ))
+
+    return facebook_users
+
+def loop_records(birthday_comet_root_json):
+    """ The same loop producing tuples, the baseline for the extractor alone """
+    friend_records = []
+
+    for all_friends_by_birthday_month_edge in birthday_comet_root_json['data']['viewer']['all_friends_by_birthday_month']['edges']:
+        for friend_edge in all_friends_by_birthday_month_edge['node']['friends']['edges']:
+            friend = friend_edge['node']
+            friend_records.append((friend["id"], friend["name"], friend["profile_url"], friend["profile_picture"]["uri"], friend["birthdate"]["day"], friend["birthdate"]["month"], friend["birthdate"]["year"]))
+
+    return friend_records
+
+def extractor_records(birthday_comet_root_json):
+    return list(extract_birthday_comet_monthly_friends(birthday_comet_root_json, lambda location, error: None))
+
+def transformer_facebook_users(birthday_comet_root_json):
+    return Transformer().transform_birthday_comet_monthly_to_birthdays(birthday_comet_root_json)
+
+VARIANTS = {
+    'loop_records': loop_records,
+    'extractor_records': extractor_records,
+    'loop_facebook_users': loop_facebook_users,
+    'transformer_facebook_users': transformer_facebook_users,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the friend extractor.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for friend_count in args.sizes:
+        quarters = list(generate_birthday_comet_monthly_quarters(friend_count).values())
+        for variant, transform in VARIANTS.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for quarter in quarters:
+                    transform(quarter)
+                timings.append(time.perf_counter() - start)
+            print(f'{variant:<28} {friend_count:>7} friends  best {min(timings) * 1000:>9.1f} ms  {min(timings) / friend_count * 1e9:>7.0f} ns per friend')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+""" Synthetic BirthdayCometMonthlyBirthdaysRefetchQuery responses of any size for benchmarks
+
+    Friends get Unicode names, roughly a third have no birth year and a fixed share are born on Feb 29.
+"""
+
+import random
+import calendar
+
+FIRST_FRIEND_ID = 100000000000000
+MISSING_YEAR_RATIO = 0.3
+LEAP_DAY_RATIO = 0.01
+OFFSET_MONTHS = [0, 3, 6, 9]
+
+NAMES = [
+    'John Smith',
+    'Laura Daisy',
+    'Bob Jones',
+    '韩忠清',
+    'حكيم هديّة',
+    'Mónica Bellucci',
+    'Łukasz Żółć',
+    'Σωκράτης Παπαδόπουλος',
+    'Иван Петров',
+    'सुरेश कुमार',
+    'Ærø Ødegård',
+    'James',
+]
+
+PROFILE_PICTURE_URI_TEMPLATE = 'https://scontent-syd2-1.xx.fbcdn.net/v/t1.30497-1/c29.0.100.100a/p100x100/{id}_189132118950875_4138507100605120512_n.jpg?_nc_cat=1&ccb=2&_nc_sid=7206a8&_nc_ohc=NcxDdcCWF5IAX9uLSTe&_nc_ht=scontent-syd2-1.xx&tp=27&oh=75cf4f4372f5eca63c50b94ca6d4949d&oe=5FD42D1E'
+
+def generate_friend_nodes(friend_count, seed=0):
+    """ Generate friend_count friend nodes as returned inside friends.edges[].node """
+    rng = random.Random(seed)
+    friend_nodes = []
+
+    for i in range(friend_count):
+        friend_id = str(FIRST_FRIEND_ID + i)
+
+        if rng.random() < LEAP_DAY_RATIO:
+            day, month = 29, 2
+            year = None if rng.random() < MISSING_YEAR_RATIO else rng.choice([year for year in range(1932, 2008) if calendar.isleap(year)])
+        else:
+            month = rng.randint(1, 12)
+            day = rng.randint(1, calendar.monthrange(2001, month)[1])
+            year = None if rng.random() < MISSING_YEAR_RATIO else rng.randint(1930, 2008)
+
+        friend_nodes.append({
+            '__typename': 'User',
+            'id': friend_id,
+            '__isActor': 'User',
+            '__isEntity': 'User',
+            'profile_url': f'https://www.facebook.com/friend.{friend_id}',
+            'url': f'https://www.facebook.com/friend.{friend_id}',
+            'name': rng.choice(NAMES),
+            'profile_picture': {
+                'uri': PROFILE_PICTURE_URI_TEMPLATE.format(id=friend_id),
+                'width': 60,
+                'height': 60,
+                'scale': 1,
+            },
+            'birthdate': {
+                'day': day,
+                'month': month,
+                'year': year,
+            },
+        })
+
+    return friend_nodes
+
+def generate_birthday_comet_monthly(friend_nodes, offset_month):
+    """ Response for offset_month (relative to January) holding the friends born in that month and the following 2 months """
+    months = [(offset_month + i) % 12 + 1 for i in range(3)]
+
+    month_edges = []
+    for month in months:
+        month_edges.append({
+            'node': {
+                'month_name_in_iso8601': calendar.month_name[month],
+                'friends': {
+                    'edges': [{'node': friend_node} for friend_node in friend_nodes if friend_node['birthdate']['month'] == month],
+                },
+                '__typename': 'FriendsByBirthdayMonth',
+            },
+            'cursor': str(month - 1),
+        })
+
+    return {
+        'data': {
+            'viewer': {
+                'all_friends_by_birthday_month': {
+                    'page_info': {
+                        'has_next_page': True,
+                        'end_cursor': str(months[-1] - 1),
+                    },
+                    'edges': month_edges,
+                },
+            },
+        },
+        'extensions': {
+            'is_final': True,
+        },
+    }
+
+def generate_birthday_comet_monthly_quarters(friend_count, seed=0):
+    """ Responses for every offset month needed to cover a full year, keyed by offset month """
+    friend_nodes = generate_friend_nodes(friend_count, seed)
+    return {offset_month: generate_birthday_comet_monthly(friend_nodes, offset_month) for offset_month in OFFSET_MONTHS}
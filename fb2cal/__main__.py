@@ -18,79 +18,193 @@
 
 import os
 import sys
+import signal
 import logging
+import argparse
+import threading
 
 from .ics_writer import ICSWriter
 from .logger import Logger
 from .config import Config
-from .facebook_browser import FacebookBrowser
-from .transformer import Transformer
-from .utils import strtobool
+from .metrics import Metrics
+from .pipeline import create_facebook_browser, login, load_cached_facebook_users, fetch_facebook_users, save_ics_file, save_metrics
+from .scheduler import RefreshScheduler
 
 from .__init__ import __version__, __status__, __github_short_url__, __license__
 
-# Set CWD to script directory
-os.chdir(sys.path[0])
-
 # Init logger
 logger = Logger('fb2cal').getLogger()
-logger.info(f'Starting fb2cal v{__version__} ({__status__}) [{__github_short_url__}]')
-logger.info(f'This project is released under the {__license__} license.')
 
-try:
-    # Read config
-    logger.info(f'Attemping to parse config file...')
-    config = Config().getConfig()
-    logger.info('Config successfully loaded.')
+def parse_args():
+    parser = argparse.ArgumentParser(prog='fb2cal', description='Facebook Birthday Events to ICS file converter.')
+    parser.add_argument('--offline', action='store_true', help='Generate the calendar from the friend cache without contacting Facebook')
+    parser.add_argument('--max-age', type=int, metavar='SECONDS', help='Use the friend cache instead of Facebook while it is younger than this (with upcoming_days, fetch the full year once it is older), overrides [CACHE] max_age')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('run', help='Fetch birthdays once and save the ICS file (default)')
+    subparsers.add_parser('batch', help='Fetch birthdays and save the ICS file for every [ACCOUNT <name>] section')
+    subparsers.add_parser('daemon', help='Stay resident and refresh the ICS file on a schedule')
+    serve_parser = subparsers.add_parser('serve', help='Stay resident, refresh on a schedule and serve the calendar over HTTP')
+    serve_parser.add_argument('--host', help='Address to listen on, overrides [SERVER] host')
+    serve_parser.add_argument('--port', type=int, help='Port to listen on, overrides [SERVER] port')
+    return parser.parse_args()
+
+def start_server(config, args):
+    """ Serve the calendar over HTTP from a background thread """
+    from .calendar_server import CalendarServer
+
+    host = args.host or config.get('SERVER', 'host', fallback='127.0.0.1')
+    port = args.port or int(config.get('SERVER', 'port', fallback='8080'))
+    server = CalendarServer((host, port), config.get('SERVER', 'path', fallback='/birthdays.ics'))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    logger.info(f'Serving calendar at {server.url}.')
+    return server
+
+def run_resident(config, args, facebook_browser, ics_writer):
+    """ Stay resident, refreshing birthdays on a schedule with the same (already authenticated) Facebook browser
+        The ICS file and served calendar are only regenerated when the fetched birthdays changed """
+    server = start_server(config, args) if args.command == 'serve' else None
+    if server:
+        server.update(''.join(ics_writer.serialize()).encode('utf-8'))
+
+    last_fingerprint = ics_writer.get_fingerprint()
+
+    def refresh():
+        metrics = facebook_browser.metrics
+        metrics.reset()
+
+        try:
+            update(metrics)
+        except Exception:
+            save_metrics(config, metrics, False)
+            raise
+        save_metrics(config, metrics, True)
+
+    def update(metrics):
+        nonlocal last_fingerprint
+
+        # The session may have expired since the last refresh
+        with metrics.time_stage('login'):
+            if not facebook_browser.is_authenticated():
+                logger.info('Facebook session expired.')
+                login(config, facebook_browser)
+
+        ics_writer = ICSWriter(fetch_facebook_users(config, facebook_browser, args.max_age))
+
+        fingerprint = ics_writer.get_fingerprint()
+        if fingerprint == last_fingerprint:
+            logger.info('Birthdays are unchanged since the last refresh.')
+            return
+
+        save_ics_file(config, ics_writer, metrics)
+        if server:
+            server.update(''.join(ics_writer.serialize()).encode('utf-8'))
+        last_fingerprint = fingerprint
+
+    scheduler = RefreshScheduler(
+        refresh,
+        int(config.get('DAEMON', 'refresh_interval', fallback='43200')),
+        int(config.get('DAEMON', 'refresh_jitter', fallback='900')),
+        int(config.get('DAEMON', 'retry_interval', fallback='900')),
+    )
+
+    # Stop cleanly when a service manager asks us to
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+
+    logger.info('Running in the background. Press Ctrl+C to stop.')
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info('Stopping.')
+        if server:
+            server.shutdown()
+            server.server_close()
+
+def main():
+    args = parse_args()
+
+    # Set CWD to script directory
+    os.chdir(sys.path[0])
+
+    logger.info(f'Starting fb2cal v{__version__} ({__status__}) [{__github_short_url__}]')
+    logger.info(f'This project is released under the {__license__} license.')
+
+    recorder = None
+    metrics = Metrics()
 
-    # Set logging level based on config
     try:
-        logger.setLevel(getattr(logging, config['LOGGING']['level']))
-        logging.getLogger().setLevel(logger.level) # Also set root logger level
-    except AttributeError:
-        logger.error(f'Invalid logging level specified. Level: {config["LOGGING"]["level"]}')
-        raise SystemError
-    
-    logger.info(f'Logging level set to: {logging.getLevelName(logger.level)}')
-
-    # Init Facebook browser
-    facebook_browser = FacebookBrowser()
-
-    # Attempt login
-    logger.info('Attemping to authenticate with Facebook...')
-    facebook_browser.authenticate(config['AUTH']['FB_EMAIL'], config['AUTH']['FB_PASS'])
-    logger.info('Successfully authenticated with Facebook.')
-
-    # Fetch birthdays for a full calendar year and transform them 
-    facebook_users = set()
-    transformer = Transformer()
-
-    # Endpoint will return all birthdays for offset_month plus the following 2 consecutive months.
-    logger.info('Fetching all Birthdays via BirthdayCometRootQuery endpoint...')
-    for offset_month in [0, 3, 6, 9]:
-        birthday_comet_monthly_json = facebook_browser.query_graph_ql_birthday_comet_monthly(offset_month)
-        facebook_users_for_quarter = transformer.transform_birthday_comet_monthly_to_birthdays(birthday_comet_monthly_json)
-        facebook_users.update(facebook_users_for_quarter)
-
-    if len(facebook_users) == 0:
-        logger.warning(f'Facebook user set is empty. Failed to fetch any birthdays.')
-        raise SystemError
-
-    logger.info(f'A total of {len(facebook_users)} birthdays were found.')
-
-    # Generate ICS
-    ics_writer = ICSWriter(facebook_users)
-    logger.info('Creating birthday ICS file...')
-    ics_writer.generate()
-    logger.info('ICS file created successfully.')
-
-    # Save to file system
-    if strtobool(config['FILESYSTEM']['SAVE_TO_FILE']):
-        ics_writer.write(config['FILESYSTEM']['ICS_FILE_PATH'])
-
-    logger.info('Done! Terminating gracefully.')
-except SystemExit:
-    logger.critical(f'Critical error encountered. Terminating.')
-    sys.exit()
-finally:
-    logging.shutdown()
+        # Read config
+        logger.info(f'Attemping to parse config file...')
+        with metrics.time_stage('config'):
+            config = Config().getConfig()
+        logger.info('Config successfully loaded.')
+
+        # Set logging level based on config
+        try:
+            logger.setLevel(getattr(logging, config['LOGGING']['level']))
+            logging.getLogger().setLevel(logger.level) # Also set root logger level
+        except AttributeError:
+            logger.error(f'Invalid logging level specified. Level: {config["LOGGING"]["level"]}')
+            raise SystemError
+
+        logger.info(f'Logging level set to: {logging.getLevelName(logger.level)}')
+
+        # Modules only needed by some commands are imported when they start to keep startup fast
+        if args.command == 'batch':
+            from .batch import run_batch
+            run_batch(config, args.offline, args.max_age)
+            logger.info('Done! Terminating gracefully.')
+            return
+
+        if args.offline and args.command in ('serve', 'daemon'):
+            logger.error(f'The {args.command} command refreshes birthdays from Facebook and cannot run offline.')
+            raise SystemError
+
+        try:
+            # A fresh enough friend cache replaces logging in and fetching
+            facebook_users = load_cached_facebook_users(config, args.offline, args.max_age, metrics)
+        except Exception:
+            save_metrics(config, metrics, False)
+            raise
+
+        if not args.offline:
+            # Init Facebook browser
+            facebook_browser = create_facebook_browser(config, metrics=metrics)
+
+            # Record all exchanges with Facebook so they can be replayed offline later
+            record_cassette_path = config.get('DEVELOPMENT', 'record_cassette_path', fallback=None)
+            if record_cassette_path:
+                logger.info(f'Recording exchanges with Facebook to {record_cassette_path}.')
+                from .replay import Recorder
+                recorder = Recorder(facebook_browser.browser.session)
+
+        try:
+            if facebook_users is None:
+                with metrics.time_stage('login'):
+                    login(config, facebook_browser)
+                facebook_users = fetch_facebook_users(config, facebook_browser, args.max_age)
+
+            # Generate ICS and stream it to the file system
+            ics_writer = ICSWriter(facebook_users)
+            save_ics_file(config, ics_writer, metrics)
+        except Exception:
+            save_metrics(config, metrics, False)
+            raise
+        save_metrics(config, metrics, True)
+
+        if args.command in ('serve', 'daemon'):
+            run_resident(config, args, facebook_browser, ics_writer)
+
+        logger.info('Done! Terminating gracefully.')
+    except SystemExit:
+        logger.critical(f'Critical error encountered. Terminating.')
+        sys.exit()
+    finally:
+        if recorder:
+            recorder.save(record_cassette_path)
+        logging.shutdown()
+
+if __name__ == '__main__':
+    main()
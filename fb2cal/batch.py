@@ -0,0 +1,156 @@
+""" Run fb2cal for many Facebook accounts from a single config file
+
+    Every [ACCOUNT <name>] section describes one account:
+        [ACCOUNT alice]
+        fb_email = alice@example.com
+        fb_pass = hunter2
+        ics_file_path = ./out/alice.ics
+
+    All other sections are shared by every account. Accounts get their own Facebook browser, session file, token cache,
+    friend cache and ICS file and are spread over a pool of [BATCH] max_workers processes, which also limits how many accounts are
+    fetched at the same time.
+"""
+
+import os
+import time
+import json
+import logging
+import configparser
+from concurrent.futures import ProcessPoolExecutor
+
+from .logger import Logger
+from .ics_writer import ICSWriter
+from .metrics import Metrics
+from .pipeline import create_rate_limiter, create_facebook_browser, login, load_cached_facebook_users, fetch_facebook_users, save_ics_file
+
+ACCOUNT_SECTION_PREFIX = 'ACCOUNT '
+
+# Keys of an account section and the section they override
+ACCOUNT_KEYS = {
+    'fb_email': 'AUTH',
+    'fb_pass': 'AUTH',
+    'ics_file_path': 'FILESYSTEM',
+    'session_file_path': 'SESSION',
+    'token_cache_file_path': 'SESSION',
+    'friend_cache_file_path': 'CACHE',
+}
+
+logger = Logger('fb2cal').getLogger()
+
+# Rate limiter shared by all accounts processed by a worker process
+worker_rate_limiter = None
+
+def get_account_names(config):
+    return [section[len(ACCOUNT_SECTION_PREFIX):].strip() for section in config.sections() if section.startswith(ACCOUNT_SECTION_PREFIX)]
+
+def get_account_config(config, account_name):
+    """ Config for a single account: the shared sections with the account section applied on top
+        Paths that are not set for the account default to per account paths so accounts never share files """
+    account_section = config[f'{ACCOUNT_SECTION_PREFIX}{account_name}']
+
+    account_config = configparser.RawConfigParser()
+    for section in config.sections():
+        if not section.startswith(ACCOUNT_SECTION_PREFIX):
+            account_config[section] = config[section]
+
+    for section in set(ACCOUNT_KEYS.values()):
+        if not account_config.has_section(section):
+            account_config.add_section(section)
+
+    account_config['FILESYSTEM']['ics_file_path'] = f'./out/{account_name}.ics'
+    account_config['SESSION']['session_file_path'] = f'./cache/{account_name}/session.bin'
+    account_config['SESSION']['token_cache_file_path'] = f'./cache/{account_name}/tokens.json'
+    account_config['CACHE']['friend_cache_file_path'] = f'./cache/{account_name}/friends.json.gz'
+
+    for key, value in account_section.items():
+        if key not in ACCOUNT_KEYS:
+            logger.warning(f'Ignoring unknown key {key} for account {account_name}.')
+            continue
+        account_config[ACCOUNT_KEYS[key]][key] = value
+
+    return account_config
+
+def _config_to_dict(config):
+    """ Plain dict version of config that can be sent to worker processes """
+    return {section: dict(config[section]) for section in config.sections()}
+
+def _init_worker(logging_level, config):
+    global worker_rate_limiter
+
+    logger.setLevel(logging_level)
+    logging.getLogger().setLevel(logging_level)
+
+    rate_limiter_config = configparser.RawConfigParser()
+    rate_limiter_config.read_dict(config)
+    worker_rate_limiter = create_rate_limiter(rate_limiter_config)
+
+def run_account(account_name, account_config, offline=False, max_age=None):
+    """ Fetch birthdays (or load them from the friend cache) and save the ICS file for one account, returns a result for the batch report """
+    config = configparser.RawConfigParser()
+    config.read_dict(account_config)
+
+    result = {'account': account_name, 'succeeded': False, 'birthdays': None, 'written': False, 'error': None}
+    start_time = time.perf_counter()
+    metrics = Metrics()
+
+    try:
+        logger.info(f'Processing account {account_name}...')
+        facebook_users = load_cached_facebook_users(config, offline, max_age, metrics)
+        if facebook_users is None:
+            facebook_browser = create_facebook_browser(config, worker_rate_limiter, metrics)
+            with metrics.time_stage('login'):
+                login(config, facebook_browser)
+            facebook_users = fetch_facebook_users(config, facebook_browser, max_age)
+        result['birthdays'] = len(facebook_users)
+        result['written'] = save_ics_file(config, ICSWriter(facebook_users), metrics)
+        result['succeeded'] = True
+    except Exception as e:
+        logger.exception(f'Failed to process account {account_name}.')
+        result['error'] = f'{type(e).__name__}: {e}'
+
+    result['duration'] = round(time.perf_counter() - start_time, 3)
+    result['stages'] = {stage: round(seconds, 3) for stage, seconds in metrics.stages.items()}
+    return result
+
+def run_batch(config, offline=False, max_age=None):
+    """ Process every account in config and report the results
+        offline and max_age control the use of each account's friend cache, see load_cached_facebook_users
+        Returns the list of per account results """
+    account_names = get_account_names(config)
+    if not account_names:
+        logger.error(f'No accounts found. Add one [{ACCOUNT_SECTION_PREFIX}<name>] section per account to the config file.')
+        raise SystemError
+
+    max_workers = min(int(config.get('BATCH', 'max_workers', fallback='4')), len(account_names))
+    logger.info(f'Processing {len(account_names)} accounts with {max_workers} workers...')
+
+    account_configs = {account_name: _config_to_dict(get_account_config(config, account_name)) for account_name in account_names}
+
+    # The host rate limit applies per process, split it between the workers so the total stays within the limit
+    shared_config = _config_to_dict(config)
+    if 'host_rate' in shared_config.get('RATE_LIMIT', {}):
+        shared_config['RATE_LIMIT']['host_rate'] = str(float(shared_config['RATE_LIMIT']['host_rate']) / max_workers)
+
+    results = []
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(logger.level, shared_config)) as executor:
+        futures = [executor.submit(run_account, account_name, account_configs[account_name], offline, max_age) for account_name in account_names]
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            if result['succeeded']:
+                logger.info(f'Account {result["account"]}: {result["birthdays"]} birthdays, ICS file {"written" if result["written"] else "unchanged"} ({result["duration"]}s).')
+            else:
+                logger.error(f'Account {result["account"]}: failed with {result["error"]} ({result["duration"]}s).')
+
+    succeeded = sum(result['succeeded'] for result in results)
+    logger.info(f'Batch finished: {succeeded} succeeded, {len(results) - succeeded} failed.')
+
+    report_path = config.get('BATCH', 'report_path', fallback=None)
+    if report_path:
+        if os.path.dirname(report_path):
+            os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        with open(report_path, mode='w', encoding='UTF-8') as report_file:
+            json.dump(results, report_file, indent=2)
+        logger.info(f'Saved batch report to {os.path.abspath(report_path)}')
+
+    return results
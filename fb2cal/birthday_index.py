@@ -0,0 +1,56 @@
+import calendar
+from array import array
+from datetime import date, timedelta
+
+from .facebook_user import BaseFacebookUser
+
+# Days are numbered as in a leap year so Feb 29 birthdays get their own day
+INDEX_YEAR = 2000
+DAYS_IN_INDEX_YEAR = 366
+FEB_29_DAY_OF_YEAR = 59
+
+# Zero based day of the year of a birthday, numbered as in a leap year
+def get_day_of_year(month, day):
+    return date(INDEX_YEAR, month, day).timetuple().tm_yday - 1
+
+""" Facebook users sorted by birthday with the position of every day of the year precomputed
+    Answers who has a birthday in a range of days by slicing, in time proportional to the number of birthdays found """
+class BirthdayIndex:
+
+    def __init__(self, facebook_users):
+        # Users without a known birthday can never be found
+        self.facebook_users = sorted((facebook_user for facebook_user in facebook_users if facebook_user.birthday_month and facebook_user.birthday_day), key=BaseFacebookUser.get_sort_key)
+
+        # offsets[day] is the position of the first user with a birthday on day of the year day or later
+        birthdays_per_day = [0] * DAYS_IN_INDEX_YEAR
+        for facebook_user in self.facebook_users:
+            birthdays_per_day[get_day_of_year(facebook_user.birthday_month, facebook_user.birthday_day)] += 1
+
+        self.offsets = array('l', [0])
+        for birthdays in birthdays_per_day:
+            self.offsets.append(self.offsets[-1] + birthdays)
+
+    def __len__(self):
+        return len(self.facebook_users)
+
+    def get_upcoming(self, days, start_date=None):
+        """ Users with a birthday in the days days starting at start_date (default today), in birthday order
+            Feb 29 birthdays are celebrated on Feb 28 in common years, the same as in the ICS calendar """
+        if days <= 0:
+            return []
+        if days >= DAYS_IN_INDEX_YEAR:
+            return list(self.facebook_users)
+
+        start_date = start_date or date.today()
+        end_date = start_date + timedelta(days=days - 1)
+
+        start = get_day_of_year(start_date.month, start_date.day)
+        end = get_day_of_year(end_date.month, end_date.day) + 1
+        if end == FEB_29_DAY_OF_YEAR and not calendar.isleap(end_date.year):
+            end += 1
+
+        if start < end:
+            return self.facebook_users[self.offsets[start]:self.offsets[end]]
+
+        # The range continues into the next year
+        return self.facebook_users[self.offsets[start]:] + self.facebook_users[:self.offsets[end]]
@@ -0,0 +1,171 @@
+""" Serve the latest generated calendar over HTTP
+
+    The calendar is held in memory together with pre-compressed gzip (and brotli if installed) variants.
+    Every variant has a strong ETag derived from the content hash so polling calendar clients get cheap 304 responses.
+"""
+
+import re
+import gzip
+import hashlib
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from .logger import Logger
+from .ics_writer import ICS_PUBLISHED_TTL
+
+ICS_CONTENT_TYPE = 'text/calendar; charset=utf-8'
+ISO8601_DURATION_REGEXP = re.compile(r'^P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+# Number of seconds in an RFC 5545 duration such as PT12H
+def parse_duration_seconds(duration):
+    match = ISO8601_DURATION_REGEXP.match(duration)
+    if not match:
+        raise ValueError(f'Invalid duration: {duration}')
+
+    weeks, days, hours, minutes, seconds = (int(value or 0) for value in match.groups())
+    return (((weeks * 7 + days) * 24 + hours) * 60 + minutes) * 60 + seconds
+
+# Content codings the client accepts, ignoring those explicitly refused with q=0
+def parse_accept_encoding(accept_encoding):
+    codings = set()
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.strip().partition(';')
+        quality = re.search(r'q=([0-9.]+)', params)
+        if name and not (quality and float(quality[1]) == 0):
+            codings.add(name.strip().lower())
+    return codings
+
+""" Immutable snapshot of a calendar and its compressed variants """
+class CalendarRepresentation:
+
+    def __init__(self, content, last_modified):
+        self.digest = hashlib.sha256(content).hexdigest()
+        self.last_modified = formatdate(last_modified, usegmt=True)
+
+        # content coding -> (ETag, body)
+        # Strong ETags must differ between encodings of the same content
+        self.variants = {
+            'identity': (f'"{self.digest}"', content),
+            'gzip': (f'"{self.digest}-gzip"', gzip.compress(content, mtime=0)),
+        }
+        if brotli:
+            self.variants['br'] = (f'"{self.digest}-br"', brotli.compress(content))
+
+    def get_variant(self, accept_encoding):
+        """ Smallest variant the client accepts """
+        accepted_codings = parse_accept_encoding(accept_encoding)
+        for coding in ('br', 'gzip'):
+            if coding in self.variants and (coding in accepted_codings or '*' in accepted_codings):
+                return coding, *self.variants[coding]
+        return 'identity', *self.variants['identity']
+
+    def matches(self, if_none_match):
+        """ If any ETag in an If-None-Match header refers to this calendar """
+        etags = {etag for etag, _ in self.variants.values()}
+        for etag in (if_none_match or '').split(','):
+            etag = etag.strip()
+            if etag == '*' or etag.removeprefix('W/') in etags:
+                return True
+        return False
+
+""" HTTP server for the latest calendar passed to update() """
+class CalendarServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 8080), calendar_path='/birthdays.ics', ttl=ICS_PUBLISHED_TTL):
+        super().__init__(address, CalendarRequestHandler)
+        self.logger = Logger('fb2cal').getLogger()
+        self.calendar_path = calendar_path
+        self.cache_control = f'public, max-age={parse_duration_seconds(ttl)}'
+        self.representation = None
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}{self.calendar_path}'
+
+    def update(self, content, last_modified=None):
+        """ Serve content (the serialized calendar as bytes) from now on
+            Returns False if it is identical to the calendar already being served """
+        current_representation = self.get_representation()
+        if current_representation and current_representation.digest == hashlib.sha256(content).hexdigest():
+            return False
+
+        representation = CalendarRepresentation(content, last_modified)
+        with self.lock:
+            self.representation = representation
+
+        self.logger.info(f'Serving updated calendar ({len(content)} bytes) at {self.url}')
+        return True
+
+    def get_representation(self):
+        with self.lock:
+            return self.representation
+
+class CalendarRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _serve(self, send_body):
+        if urlsplit(self.path).path != self.server.calendar_path:
+            self._send_error(404, 'Not Found')
+            return
+
+        representation = self.server.get_representation()
+        if representation is None:
+            self._send_error(503, 'Calendar has not been generated yet', {'Retry-After': '60'})
+            return
+
+        coding, etag, body = representation.get_variant(self.headers.get('Accept-Encoding'))
+        headers = {
+            'ETag': etag,
+            'Last-Modified': representation.last_modified,
+            'Cache-Control': self.server.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+
+        if representation.matches(self.headers.get('If-None-Match')):
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', ICS_CONTENT_TYPE)
+        if coding != 'identity':
+            self.send_header('Content-Encoding', coding)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        body = message.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(f'Calendar server: {format % args}')
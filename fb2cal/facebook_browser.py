@@ -1,42 +1,87 @@
-import mechanicalsoup
+import io
 import re
-import requests
-import json
-from bs4 import Tag
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urlparse
 
 from .__init__ import __title__, __version__
 from .logger import Logger
-from .utils import remove_anti_hijacking_protection, facebook_web_encrypt_password
+from .form_parser import FormParser
+from . import json_backend
+from .json_stream import is_json_streaming_available, parse_json_subtrees
+from .utils import remove_anti_hijacking_protection_bytes, skip_anti_hijacking_protection, facebook_web_encrypt_password, search_response_stream
+
+FACEBOOK_DATR_TOKEN_REGEXP = re.compile(r'\"_js_datr\",\"(.*?)\"', re.MULTILINE)
+FACEBOOK_PUBKEY_REGEXP = re.compile(r'\"pubKey\":{"publicKey":"(.+?)","keyId":(\d+?)}}', re.MULTILINE)
+FACEBOOK_CHECKPOINT_REGEXP = re.compile(r'<button[^>]*id=["\']checkpointSubmitButton["\']')
+
+# GraphQL error codes returned when the fb_dtsg token is no longer accepted
+FACEBOOK_INVALID_TOKEN_ERROR_CODES = (1357004,)
+
+# GraphQL error codes worth retrying after backing off (temporary service error, rate limit exceeded)
+FACEBOOK_TRANSIENT_ERROR_CODES = (2, 1675004)
+
+# Parts of the BirthdayCometMonthlyBirthdaysRefetchQuery response kept when parsing it incrementally
+BIRTHDAY_COMET_MONTHLY_STREAM_PREFIXES = (
+    'error',
+    'errorSummary',
+    'errorDescription',
+    'data.viewer.all_friends_by_birthday_month.page_info',
+    'data.viewer.all_friends_by_birthday_month.edges.item.node.month_name_in_iso8601',
+    'data.viewer.all_friends_by_birthday_month.edges.item.node.friends.page_info',
+    'data.viewer.all_friends_by_birthday_month.edges.item.node.friends.edges.item.node',
+)
+
+FACEBOOK_BASE_URL = 'https://www.facebook.com'
+FACEBOOK_GRAPHQL_PATH = '/api/graphql/'
 
 class FacebookBrowser:
-    def __init__(self):
-        """ Initialize browser as needed """
+    def __init__(self, token_cache=None, stream_json=False, base_url=FACEBOOK_BASE_URL, rate_limiter=None, metrics=None):
+        """ Initialize browser as needed
+            base_url can point the browser at a stand-in server (such as fb2cal.replay) instead of Facebook
+            rate_limiter (shared between browsers) paces and retries every request made by the browser
+            metrics, if given, collects request timings and response sizes """
         self.logger = Logger('fb2cal').getLogger()
+        self.base_url = base_url.rstrip('/')
+
+        # Cookies we set ourselves must match the host we talk to
+        hostname = urlparse(self.base_url).hostname
+        self.cookie_domain = '.facebook.com' if hostname.endswith('facebook.com') else hostname
+
+        # mechanicalsoup pulls in requests and bs4, only import them once a browser is actually needed
+        import mechanicalsoup
+        from .rate_limiter import RateLimitedAdapter
+
         self.browser = mechanicalsoup.StatefulBrowser()
         self.browser.set_user_agent('{__title__}/{__version__}') # Custom user agent to bypass bot detection / 2FA trigger
+        self.token_cache = token_cache
+
+        self.rate_limiter = rate_limiter
+        if rate_limiter:
+            # Birthday queries only read data and are safe to retry, unlike logging in
+            adapter = RateLimitedAdapter(rate_limiter, lambda: self._get_account_id() or f'anonymous-{id(self)}', (urlparse(f'{self.base_url}{FACEBOOK_GRAPHQL_PATH}').path,))
+            self.browser.session.mount('http://', adapter)
+            self.browser.session.mount('https://', adapter)
+
+        self.metrics = metrics
+        if metrics:
+            metrics.instrument_session(self.browser.session)
+
+        if stream_json and not is_json_streaming_available():
+            self.logger.warning('Incremental JSON parsing requires ijson to be installed. Falling back to parsing full responses.')
+            stream_json = False
+        self.stream_json = stream_json
         self.__cached_token = None
 
-    def _get_datr_token_from_html(self, html):
-        FACEBOOK_DATR_TOKEN_REGEXP = r'\"_js_datr\",\"(.*?)\"'
-        regexp = re.compile(FACEBOOK_DATR_TOKEN_REGEXP, re.MULTILINE)
-
-        matches = regexp.search(html)
-
+    def _get_datr_token_from_matches(self, matches):
         if not matches or len(matches.groups()) != 1:
-            self.logger.debug(html)
             self.logger.error(f'Match failed or unexpected number of regexp matches when trying to get datr token.')
             raise SystemError
         
         return matches[1]
 
-    def _get_pubkey_from_html(self, html):
-        FACEBOOK_PUBKEY_REGEXP = r'\"pubKey\":{"publicKey":"(.+?)","keyId":(\d+?)}}'
-        regexp = re.compile(FACEBOOK_PUBKEY_REGEXP, re.MULTILINE)
-
-        matches = regexp.search(html)
-
+    def _get_pubkey_from_matches(self, matches):
         if not matches or len(matches.groups()) != 2:
-            self.logger.debug(html)
             self.logger.error(f'Match failed or unexpected number of regexp matches when trying to get pubKey.')
             raise SystemError
         
@@ -48,43 +93,53 @@ class FacebookBrowser:
     def authenticate(self, email, password):
         """ Authenticate with Facebook setting up session for further requests """
         
-        FACEBOOK_LOGIN_URL = 'https://www.facebook.com/login'
+        FACEBOOK_LOGIN_URL = f'{self.base_url}/login'
 
-        login_page = self.browser.open(FACEBOOK_LOGIN_URL)
+        # Stream the login page and stop reading once the datr token, public key and login form have all been seen
+        # Only the login form is parsed (event based, no DOM) as it is all we need to submit the login
+        login_page = self.browser.session.get(FACEBOOK_LOGIN_URL, stream=True)
 
         if login_page.status_code != 200:
             self.logger.debug(login_page.text)
             self.logger.error(f'Failed to authenticate with Facebook with email {email}. Stage: Initial Request for datr Token, Status code: {login_page.status_code}.')
             raise SystemError
 
+        login_form = FormParser('login_form')
+        datr_matches, pubkey_matches = search_response_stream(login_page, [FACEBOOK_DATR_TOKEN_REGEXP, FACEBOOK_PUBKEY_REGEXP], parser=login_form)
+
         # Add 'datr' cookie to session for countries adhering to GDPR compliance        
-        _js_datr = self._get_datr_token_from_html(login_page.text)
+        _js_datr = self._get_datr_token_from_matches(datr_matches)
         
-        datr_cookie = requests.cookies.create_cookie(domain='.facebook.com', name='datr', value=_js_datr)
+        from requests.cookies import create_cookie # Already loaded by mechanicalsoup
+
+        datr_cookie = create_cookie(domain=self.cookie_domain, name='datr', value=_js_datr)
         self.browser.get_cookiejar().set_cookie(datr_cookie)
 
-        _js_datr_cookie = requests.cookies.create_cookie(domain='.facebook.com', name='_js_datr', value=_js_datr)
+        _js_datr_cookie = create_cookie(domain=self.cookie_domain, name='_js_datr', value=_js_datr)
         self.browser.get_cookiejar().set_cookie(_js_datr_cookie)
 
         # Prepare to send form
-        login_form = self.browser.select_form("form#login_form")
-        if login_form is None:
+        if not login_form.found:
             self.logger.error("Could not find login form.")
             raise SystemError
         
-        login_form.set("email", email)
+        login_form.fields['email'] = email
 
         # Encrypt password into enc_pass
         # Facebook only accepts encrypted passwords in a specific format
-        public_key, key_id = self._get_pubkey_from_html(login_page.text)
+        public_key, key_id = self._get_pubkey_from_matches(pubkey_matches)
         enc_pass = facebook_web_encrypt_password(key_id, public_key, password)
 
         # enc_pass is typically computed and included in requests pre-flight with javascript
-        # Since we aren't executing javascript we'll just create the input field and include it here so it makes it into our request
-        enc_pass_input = Tag(name="input", attrs={"type": "hidden", "name": "encpass", "value": enc_pass})
-        login_form.form.append(enc_pass_input)
+        # Since we aren't executing javascript we'll just include the field here so it makes it into our request
+        login_form.fields['encpass'] = enc_pass
 
-        login_response = self.browser.submit_selected()
+        login_response = self.browser.session.request(
+            login_form.method,
+            urljoin(login_page.url, login_form.action),
+            data=login_form.fields,
+            headers={'Referer': login_page.url}
+        )
 
         if login_response.status_code != 200:
             self.logger.debug(login_response.text)
@@ -102,44 +157,107 @@ class FacebookBrowser:
             raise SystemError
 
         # Check to see if we hit Facebook security checkpoint
-        if login_response.soup.find('button', {'id': 'checkpointSubmitButton'}):
+        if FACEBOOK_CHECKPOINT_REGEXP.search(login_response.text):
             self.logger.debug(login_response.text)
             self.logger.error(f'Hit Facebook security checkpoint. Please login to Facebook manually and follow prompts to authorize this device.')
             raise SystemError
 
+        # Any token cached for a previous session is tied to that session
+        self.invalidate_token()
+
+    def is_authenticated(self):
+        """ Check if the current session is still logged in using a single cheap request """
+
+        # Logged in sessions are redirected to their profile, logged out sessions to the login page
+        FACEBOOK_SESSION_CHECK_URL = f'{self.base_url}/me'
+
+        c_user = self._get_account_id()
+        if not c_user or not c_user.isnumeric():
+            return False
+
+        response = self.browser.session.get(FACEBOOK_SESSION_CHECK_URL, allow_redirects=False)
+        location = response.headers.get('Location', '')
+        self.logger.debug(f'Session check status code: {response.status_code}, Location: {location}')
+
+        return response.is_redirect and 'login' not in location and 'checkpoint' not in location
+
+    def restore_session(self, session_store):
+        """ Restore cookies saved by a previous run, returns True if the restored session is still authenticated """
+
+        cookiejar = session_store.load()
+        if not cookiejar:
+            return False
+
+        self.browser.get_cookiejar().update(cookiejar)
+
+        if self.is_authenticated():
+            return True
+
+        self.logger.info('Saved Facebook session has expired.')
+        self.browser.get_cookiejar().clear()
+        session_store.clear()
+        return False
+
+    def save_session(self, session_store):
+        """ Save the cookies of the authenticated session so future runs can skip authentication """
+        session_store.save(self.browser.get_cookiejar())
+
     def get_token(self):
         """ Get authorization token (CSRF protection token) that must be included in all requests """
 
         if self.__cached_token:
             return self.__cached_token
 
-        FACEBOOK_BIRTHDAY_EVENT_PAGE_URL = 'https://www.facebook.com/events/birthdays/' # token is present on this page
+        account_id = self._get_account_id()
+        if self.token_cache and account_id:
+            self.__cached_token = self.token_cache.get(account_id)
+            if self.__cached_token:
+                self.logger.debug(f'Using cached token for account {account_id}.')
+                return self.__cached_token
+
+        FACEBOOK_BIRTHDAY_EVENT_PAGE_URL = f'{self.base_url}/events/birthdays/' # token is present on this page
         FACEBOOK_TOKEN_REGEXP_STRING = r'\[\"DTSGInitialData\",\[],{\"token\":\"(.*?)\"'
         regexp = re.compile(FACEBOOK_TOKEN_REGEXP_STRING, re.MULTILINE)
 
-        birthday_event_page = self.browser.get(FACEBOOK_BIRTHDAY_EVENT_PAGE_URL)
+        # Stream the page and stop reading as soon as the token is found rather than downloading and parsing all of it
+        birthday_event_page = self.browser.session.get(FACEBOOK_BIRTHDAY_EVENT_PAGE_URL, stream=True)
         
         if birthday_event_page.status_code != 200:
             self.logger.debug(birthday_event_page.text)
             self.logger.error(f'Failed to retreive birthday event page. Status code: {birthday_event_page.status_code}.')
             raise SystemError
 
-        matches = regexp.search(birthday_event_page.text)
+        matches, = search_response_stream(birthday_event_page, [regexp])
 
         if not matches or len(matches.groups()) != 1:
-            self.logger.debug(birthday_event_page.text)
             self.logger.error(f'Match failed or unexpected number of regexp matches when trying to get async token.')
             raise SystemError
         
         self.__cached_token = matches[1]
+
+        if self.token_cache and account_id:
+            self.token_cache.set(account_id, self.__cached_token)
         
         return self.__cached_token
 
-    def query_graph_ql_birthday_comet_monthly(self, offset_month):
+    def invalidate_token(self):
+        """ Drop the cached token so the next call to get_token fetches a new one """
+        self.__cached_token = None
+
+        account_id = self._get_account_id()
+        if self.token_cache and account_id:
+            self.token_cache.invalidate(account_id)
+
+    def _get_account_id(self):
+        """ Numeric Facebook ID of the authenticated user taken from the c_user cookie """
+        return self.browser.get_cookiejar().get('c_user', default=None)
+
+    def query_graph_ql_birthday_comet_monthly(self, offset_month, cursor=None, retry_invalid_token=True, attempt=0):
         """ Query the GraphQL BirthdayCometMonthlyBirthdaysRefetchQuery endpoint that powers the https://www.facebook.com/events/birthdays page 
-            This endpoint will return all Birthdays for the offset_month plus the following 2 consecutive months. """
+            This endpoint will return all Birthdays for the offset_month plus the following 2 consecutive months.
+            cursor continues the friends of offset_month after the end_cursor of an earlier response. """
 
-        FACEBOOK_GRAPHQL_ENDPOINT = 'https://www.facebook.com/api/graphql/'
+        FACEBOOK_GRAPHQL_ENDPOINT = f'{self.base_url}{FACEBOOK_GRAPHQL_PATH}'
         FACEBOOK_GRAPHQL_API_REQ_FRIENDLY_NAME = 'BirthdayCometMonthlyBirthdaysRefetchQuery'
         DOC_ID = 5347559575302259
 
@@ -147,16 +265,18 @@ class FacebookBrowser:
             'offset_month': offset_month,
             'scale': 1.5
         }
+        if cursor is not None:
+            variables['cursor'] = cursor
 
         payload = {
             'fb_api_req_friendly_name': FACEBOOK_GRAPHQL_API_REQ_FRIENDLY_NAME,
-            'variables': json.dumps(variables),
+            'variables': json_backend.dumps(variables),
             'doc_id': DOC_ID,
             'fb_dtsg': self.get_token(),
             '__a': '1'
         }
 
-        response = self.browser.post(FACEBOOK_GRAPHQL_ENDPOINT, data=payload)
+        response = self.browser.session.post(FACEBOOK_GRAPHQL_ENDPOINT, data=payload, stream=self.stream_json)
 
         # Sanity failsafe, GraphQL relay endpoint will always return 200
         if response.status_code != 200:
@@ -164,13 +284,73 @@ class FacebookBrowser:
             self.logger.error(f'Failed to get {FACEBOOK_GRAPHQL_API_REQ_FRIENDLY_NAME} response. Payload: {payload}. Status code: {response.status_code}.')
             raise SystemError
         
-        trimmed_response = remove_anti_hijacking_protection(response.text)
-        response_json = json.loads(trimmed_response)
+        if self.stream_json:
+            # Parse straight off the socket keeping only the parts of the response we use
+            with response:
+                response.raw.decode_content = True
+                response.raw.auto_close = False # Required to wrap the raw response in a BufferedReader
+                response_stream = skip_anti_hijacking_protection(io.BufferedReader(response.raw))
+                response_json = parse_json_subtrees(response_stream, BIRTHDAY_COMET_MONTHLY_STREAM_PREFIXES)
+        else:
+            # Decode directly from the response bytes rather than building an intermediate str
+            trimmed_response = remove_anti_hijacking_protection_bytes(response.content)
+            response_json = json_backend.loads(trimmed_response)
+
+        # Bytes read from the socket (compressed if the response was) in both modes
+        received_bytes = response.raw.tell()
+
+        if self.metrics:
+            self.metrics.record_graphql_response(offset_month, received_bytes)
 
         # Validate for errors
+        if 'error' in response_json and response_json['error'] in FACEBOOK_INVALID_TOKEN_ERROR_CODES and retry_invalid_token:
+            self.logger.info(f'Token was rejected by {FACEBOOK_GRAPHQL_API_REQ_FRIENDLY_NAME}. Fetching a new token and retrying.')
+            self.invalidate_token()
+            return self.query_graph_ql_birthday_comet_monthly(offset_month, cursor, retry_invalid_token=False)
+
+        if 'error' in response_json and response_json['error'] in FACEBOOK_TRANSIENT_ERROR_CODES and self.rate_limiter and attempt < self.rate_limiter.max_retries:
+            self.rate_limiter.backoff(attempt, f'{FACEBOOK_GRAPHQL_API_REQ_FRIENDLY_NAME} returned transient error {response_json["error"]}')
+            return self.query_graph_ql_birthday_comet_monthly(offset_month, cursor, retry_invalid_token, attempt + 1)
+
         if 'error' in response_json:
-            self.logger.debug(response.text)
+            self.logger.debug(response_json if self.stream_json else response.text)
             self.logger.error(f'Failed to parse {FACEBOOK_GRAPHQL_API_REQ_FRIENDLY_NAME} response. Payload: {payload}. Error: {response_json["errorSummary"]} - {response_json["errorDescription"]}')
             raise SystemError
 
         return response_json
+
+    def query_graph_ql_birthday_comet_monthly_serially(self, offset_months, get_next_pages=None):
+        """ Query the BirthdayCometMonthlyBirthdaysRefetchQuery endpoint for several offset months one after another
+            get_next_pages(offset_month, cursor, response_json), if given, returns further (offset_month, cursor) pages to query.
+            Yields (offset_month, response_json) tuples. """
+
+        pages = deque((offset_month, None) for offset_month in offset_months)
+        while pages:
+            offset_month, cursor = pages.popleft()
+            response_json = self.query_graph_ql_birthday_comet_monthly(offset_month, cursor)
+            if get_next_pages:
+                pages.extend(get_next_pages(offset_month, cursor, response_json))
+            yield offset_month, response_json
+
+    def query_graph_ql_birthday_comet_monthly_concurrently(self, offset_months, max_workers=None, get_next_pages=None):
+        """ Query the BirthdayCometMonthlyBirthdaysRefetchQuery endpoint for several offset months at once over the shared session
+            get_next_pages(offset_month, cursor, response_json), if given, returns further (offset_month, cursor) pages to query.
+            They are queued as soon as the response they follow arrives, so pages of different months are fetched at the same time.
+            Yields (offset_month, response_json) tuples in the order the responses arrive. """
+
+        # Fetch the token up front so worker threads do not all race to scrape it
+        self.get_token()
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(offset_months)) as executor:
+            futures = {executor.submit(self.query_graph_ql_birthday_comet_monthly, offset_month): (offset_month, None) for offset_month in offset_months}
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    # Forget each future once its response is handed out so consumed responses can be freed early
+                    offset_month, cursor = futures.pop(future)
+                    response_json = future.result()
+                    if get_next_pages:
+                        for next_offset_month, next_cursor in get_next_pages(offset_month, cursor, response_json):
+                            futures[executor.submit(self.query_graph_ql_birthday_comet_monthly, next_offset_month, next_cursor)] = (next_offset_month, next_cursor)
+                    yield offset_month, response_json
@@ -1,15 +1,28 @@
+import sys
+
 DATE_SEPERATOR = '/'
 UNKNOWN_CHAR = '?'
 
-class FacebookUser:
-    def __init__(self, id, name, profile_url, profile_picture_uri, birthday_day, birthday_month, birthday_year):
-        self.id = id
-        self.name = name
-        self.profile_url = profile_url
-        self.profile_picture_uri = profile_picture_uri
-        self.birthday_day = birthday_day
-        self.birthday_month = birthday_month
-        self.birthday_year = birthday_year
+# Split a profile picture uri into its prefix (everything up to the file name) and the rest
+# Friends' pictures are served from a handful of CDN paths so the interned prefix is shared between users
+def split_profile_picture_uri(profile_picture_uri):
+    if not profile_picture_uri:
+        return '', profile_picture_uri
+    path_end = profile_picture_uri.find('?')
+    prefix_end = profile_picture_uri.rfind('/', 0, path_end if path_end != -1 else len(profile_picture_uri)) + 1
+    return sys.intern(profile_picture_uri[:prefix_end]), profile_picture_uri[prefix_end:]
+
+""" Behaviour shared by every representation of a Facebook user
+    Subclasses provide id, name, profile_url, _profile_picture_prefix, _profile_picture_name and the birthday fields,
+    this class adds no slots of its own so views such as FriendRow stay as small as possible """
+class BaseFacebookUser:
+    __slots__ = ()
+
+    @property
+    def profile_picture_uri(self):
+        if self._profile_picture_name is None:
+            return None
+        return self._profile_picture_prefix + self._profile_picture_name
 
     def __str__(self):
         day = f'{self.birthday_day:02}' if self.birthday_day else UNKNOWN_CHAR*2
@@ -18,11 +31,31 @@ class FacebookUser:
         formatted_birthday = DATE_SEPERATOR.join(filter(None, (day, month, year)))
         return f'{self.name} ({formatted_birthday})'
 
+    def get_sort_key(self):
+        """ Order by birthday through the year, then name, then id so the order never depends on fetch order """
+        return (self.birthday_month or 0, self.birthday_day or 0, self.name, self.id)
+
     def __lt__(self, other):
-        return (self.birthday_month < other.birthday_month) and (self.birthday_day < other.birthday_month)
+        return self.get_sort_key() < other.get_sort_key()
 
     def __eq__(self, other):
         return self.id == other.id
 
     def __hash__(self):
         return hash(self.id)
+
+class FacebookUser(BaseFacebookUser):
+    __slots__ = ('id', 'name', 'profile_url', '_profile_picture_prefix', '_profile_picture_name', 'birthday_day', 'birthday_month', 'birthday_year')
+
+    def __init__(self, id, name, profile_url, profile_picture_uri, birthday_day, birthday_month, birthday_year):
+        self.id = id
+        self.name = name
+        self.profile_url = profile_url
+        self.profile_picture_uri = profile_picture_uri
+        self.birthday_day = birthday_day
+        self.birthday_month = birthday_month
+        self.birthday_year = birthday_year
+
+    @BaseFacebookUser.profile_picture_uri.setter
+    def profile_picture_uri(self, profile_picture_uri):
+        self._profile_picture_prefix, self._profile_picture_name = split_profile_picture_uri(profile_picture_uri)
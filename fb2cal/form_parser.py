@@ -0,0 +1,59 @@
+from html.parser import HTMLParser
+
+""" Incrementally extract a single form's action, method and submittable fields from HTML without building a DOM """
+class FormParser(HTMLParser):
+
+    def __init__(self, form_id):
+        super().__init__(convert_charrefs=True)
+        self.form_id = form_id
+        self.action = None
+        self.method = 'get'
+        self.fields = {}
+        self.found = False
+        self.complete = False
+        self._in_form = False
+        self._submit_chosen = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.complete:
+            return
+
+        attrs = dict(attrs)
+
+        if tag == 'form':
+            if not self._in_form and attrs.get('id') == self.form_id:
+                self._in_form = True
+                self.found = True
+                self.action = attrs.get('action') or ''
+                self.method = (attrs.get('method') or 'get').lower()
+            return
+
+        if not self._in_form or tag not in ('input', 'button'):
+            return
+
+        name = attrs.get('name')
+        if not name or 'disabled' in attrs:
+            return
+
+        input_type = (attrs.get('type') or ('submit' if tag == 'button' else 'text')).lower()
+        value = attrs.get('value') or ''
+
+        # Like a browser, only the first submit element is sent along with the form
+        if input_type in ('submit', 'image'):
+            if not self._submit_chosen:
+                self._submit_chosen = True
+                self.fields[name] = value
+            return
+
+        if input_type in ('button', 'reset', 'file'):
+            return
+
+        if input_type in ('checkbox', 'radio') and 'checked' not in attrs:
+            return
+
+        self.fields[name] = value
+
+    def handle_endtag(self, tag):
+        if tag == 'form' and self._in_form:
+            self._in_form = False
+            self.complete = True
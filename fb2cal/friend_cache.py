@@ -0,0 +1,94 @@
+import os
+import gzip
+import time
+import tempfile
+from collections import defaultdict
+
+from .logger import Logger
+from . import json_backend
+from .friend_table import FriendTable
+
+# Bump when the cached records change shape
+FRIEND_CACHE_VERSION = 2
+
+""" Cache the normalized friend records of every birthday month on disk as gzip compressed JSON
+    so calendars can be generated again without logging in to Facebook
+    Friends are kept under the calendar month of their birthday with the time that month was last fetched,
+    so fetching only some months can replace them in place """
+class FriendCache:
+
+    def __init__(self, friend_cache_file_path):
+        self.logger = Logger('fb2cal').getLogger()
+        self.friend_cache_file_path = friend_cache_file_path
+
+    def load(self):
+        """ Returns the cached months ({calendar month: {'fetched_at', 'friends'}}) or None if there is no usable cache """
+        if not os.path.exists(self.friend_cache_file_path):
+            return None
+
+        try:
+            with gzip.open(self.friend_cache_file_path, mode='rb') as friend_cache_file:
+                cache = json_backend.loads(friend_cache_file.read())
+        except (OSError, EOFError, ValueError) as e:
+            self.logger.warning(f'Ignoring unreadable friend cache at {self.friend_cache_file_path}: {e}')
+            return None
+
+        if cache.get('version') != FRIEND_CACHE_VERSION or not cache.get('months'):
+            self.logger.warning(f'Ignoring friend cache at {self.friend_cache_file_path} written by an incompatible version.')
+            return None
+
+        return cache['months']
+
+    def get_age(self, months):
+        """ Seconds since the least recently fetched cached month was fetched """
+        return time.time() - min(month['fetched_at'] for month in months.values())
+
+    def get_facebook_users(self, months):
+        """ FriendTable of every cached friend """
+        facebook_users = FriendTable()
+        seen_ids = set()
+
+        for month in sorted(months, key=int):
+            for friend_record in months[month]['friends']:
+                if friend_record[0] not in seen_ids:
+                    seen_ids.add(friend_record[0])
+                    facebook_users.add(*friend_record)
+
+        return facebook_users
+
+    def save(self, facebook_users, fetched_at):
+        """ Save every row of facebook_users (a FriendTable) under its birthday month
+            fetched_at holds the time each calendar month (1-12) was last fetched, rows of other months are left out """
+        friend_records = defaultdict(list)
+        for facebook_user in facebook_users:
+            friend_records[facebook_user.birthday_month].append([
+                facebook_user.id,
+                facebook_user.name,
+                facebook_user.profile_url,
+                facebook_user.profile_picture_uri,
+                facebook_user.birthday_day,
+                facebook_user.birthday_month,
+                facebook_user.birthday_year,
+            ])
+
+        cache = {
+            'version': FRIEND_CACHE_VERSION,
+            'months': {str(month): {'fetched_at': fetched_at[month], 'friends': friend_records[month]} for month in sorted(fetched_at)},
+        }
+
+        friend_cache_dir = os.path.dirname(self.friend_cache_file_path)
+        if friend_cache_dir:
+            os.makedirs(friend_cache_dir, exist_ok=True)
+
+        # Replace the cache atomically so an interrupted run never leaves a truncated cache behind, mkstemp creates it readable by us only
+        fd, temp_path = tempfile.mkstemp(dir=friend_cache_dir or '.', prefix=f'.{os.path.basename(self.friend_cache_file_path)}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, mode='wb') as temp_file:
+                with gzip.GzipFile(fileobj=temp_file, mode='wb', mtime=0) as friend_cache_file:
+                    friend_cache_file.write(json_backend.dumps(cache).encode('utf-8'))
+            os.replace(temp_path, self.friend_cache_file_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        self.logger.debug(f'Saved {sum(len(friend_records[month]) for month in fetched_at)} friends to friend cache at {os.path.abspath(self.friend_cache_file_path)}')
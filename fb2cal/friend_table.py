@@ -0,0 +1,109 @@
+from array import array
+
+from .facebook_user import BaseFacebookUser, split_profile_picture_uri
+
+# Stored in place of an unknown day, month or year
+UNKNOWN_DATE_COMPONENT = 0
+
+""" Columnar storage for many Facebook users
+    Birthday components are kept in compact arrays instead of one Python int object per user and field,
+    rows are read back as FacebookUser views """
+class FriendTable:
+
+    def __init__(self, facebook_users=()):
+        self.ids = []
+        self.names = []
+        self.profile_urls = []
+        self.profile_picture_prefixes = []
+        self.profile_picture_names = []
+        self.birthday_days = array('b')
+        self.birthday_months = array('b')
+        self.birthday_years = array('h')
+
+        self.extend(facebook_users)
+
+    def add(self, id, name, profile_url, profile_picture_uri, birthday_day, birthday_month, birthday_year):
+        self._add(id, name, profile_url, *split_profile_picture_uri(profile_picture_uri), birthday_day, birthday_month, birthday_year)
+
+    def append(self, facebook_user):
+        # Reuse the already split profile picture uri instead of joining and splitting it again
+        self._add(
+            facebook_user.id,
+            facebook_user.name,
+            facebook_user.profile_url,
+            facebook_user._profile_picture_prefix,
+            facebook_user._profile_picture_name,
+            facebook_user.birthday_day,
+            facebook_user.birthday_month,
+            facebook_user.birthday_year,
+        )
+
+    def extend(self, facebook_users):
+        """ Append every Facebook user from an iterable, which is consumed one user at a time """
+        for facebook_user in facebook_users:
+            self.append(facebook_user)
+
+    def _add(self, id, name, profile_url, profile_picture_prefix, profile_picture_name, birthday_day, birthday_month, birthday_year):
+        self.ids.append(id)
+        self.names.append(name)
+        self.profile_urls.append(profile_url)
+        self.profile_picture_prefixes.append(profile_picture_prefix)
+        self.profile_picture_names.append(profile_picture_name)
+        self.birthday_days.append(birthday_day or UNKNOWN_DATE_COMPONENT)
+        self.birthday_months.append(birthday_month or UNKNOWN_DATE_COMPONENT)
+        self.birthday_years.append(birthday_year or UNKNOWN_DATE_COMPONENT)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('FriendTable index out of range')
+        return FriendRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield FriendRow(self, index)
+
+""" Facebook user view of a single FriendTable row, reads its fields from the table on access
+    Only holds the table and index, the FacebookUser slots are not inherited """
+class FriendRow(BaseFacebookUser):
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def id(self):
+        return self.table.ids[self.index]
+
+    @property
+    def name(self):
+        return self.table.names[self.index]
+
+    @property
+    def profile_url(self):
+        return self.table.profile_urls[self.index]
+
+    @property
+    def _profile_picture_prefix(self):
+        return self.table.profile_picture_prefixes[self.index]
+
+    @property
+    def _profile_picture_name(self):
+        return self.table.profile_picture_names[self.index]
+
+    @property
+    def birthday_day(self):
+        return self.table.birthday_days[self.index] or None
+
+    @property
+    def birthday_month(self):
+        return self.table.birthday_months[self.index] or None
+
+    @property
+    def birthday_year(self):
+        return self.table.birthday_years[self.index] or None
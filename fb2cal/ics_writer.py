@@ -1,14 +1,55 @@
 import os
-from ics import Calendar, Event
-from ics.grammar.parse import ContentLine
+import re
+import json
+import stat
+import hashlib
+import tempfile
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
 import calendar
 
 from .logger import Logger
+from .facebook_user import BaseFacebookUser
 from .utils import generate_facebook_profile_url_permalink
 from .__init__ import __version__, __status__, __github_short_url__
 
+ICS_CALENDAR_NAME = 'Facebook Birthdays (fb2cal)'
+ICS_PUBLISHED_TTL = 'PT12H'
+ICS_ORIGINAL_URL = '/events/birthdays/'
+ICS_LINE_ENDING = '\r\n'
+ICS_MAX_LINE_OCTETS = 75
+RENDER_CACHE_SUFFIX = '.cache.json'
+DIGEST_SUFFIX = '.sha256'
+
+# DTSTAMP lines of serialized content, left out of the digest as a full render stamps every event with the current time
+DTSTAMP_LINE_PATTERN = re.compile(rb'^DTSTAMP:[^\r\n]*\r\n', re.MULTILINE)
+
+# Escape a TEXT property value (RFC 5545 3.3.11) the same way the ics library does
+def escape_text(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n').replace('\r', '\\r')
+
+# Fold a content line longer than 75 octets (RFC 5545 3.1) without splitting multi-byte UTF-8 characters
+def fold_line(line):
+    if len(line) * 4 <= ICS_MAX_LINE_OCTETS or len(line.encode('utf-8')) <= ICS_MAX_LINE_OCTETS:
+        return line
+
+    folded_lines = []
+    current_line = []
+    current_octets = 0
+    max_octets = ICS_MAX_LINE_OCTETS
+
+    for char in line:
+        char_octets = len(char.encode('utf-8'))
+        if current_octets + char_octets > max_octets:
+            folded_lines.append(''.join(current_line))
+            current_line = []
+            current_octets = 0
+            max_octets = ICS_MAX_LINE_OCTETS - 1 # Continuation lines start with a space
+        current_line.append(char)
+        current_octets += char_octets
+
+    folded_lines.append(''.join(current_line))
+    return f'{ICS_LINE_ENDING} '.join(folded_lines)
+
 """ Write Birthdays to an ICS file """
 class ICSWriter:
 
@@ -16,40 +57,72 @@ class ICSWriter:
         self.logger = Logger('fb2cal').getLogger()
         self.facebook_users = facebook_users
 
+    def _get_event_year(self, facebook_user, cur_date):
+        """ Year of the first occurence of the birthday event """
+
+        # The birth year may not be visible due to privacy settings
+        # In this case, calculate the year as this year or next year based on if its past current month or not
+        if facebook_user.birthday_year is None:
+            return cur_date.year if facebook_user.birthday_month >= cur_date.month else cur_date.year + 1
+
+        return facebook_user.birthday_year
+
+    def _get_event_fingerprint(self, facebook_user, cur_date):
+        """ Everything the rendered event for facebook_user depends on """
+        return [
+            facebook_user.name,
+            facebook_user.birthday_day,
+            facebook_user.birthday_month,
+            facebook_user.birthday_year,
+            facebook_user.profile_url,
+            self._get_event_year(facebook_user, cur_date),
+        ]
+
+    def get_fingerprint(self):
+        """ Digest of everything the calendar events depend on, equal digests produce the same events """
+        cur_date = datetime.now()
+        event_fingerprints = sorted([facebook_user.id, self._get_event_fingerprint(facebook_user, cur_date)] for facebook_user in self.facebook_users)
+        return hashlib.sha256(json.dumps(event_fingerprints, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _get_event_details(self, facebook_user, cur_date):
+        """ Returns the summary, start date (year, month, day) and description of the birthday event for facebook_user """
+
+        # Don't add extra 's' if name already ends with 's'
+        formatted_username = f"{facebook_user.name}'s" if facebook_user.name[-1] != 's' else f"{facebook_user.name}'"
+        formatted_username = f'{formatted_username} Birthday'
+
+        # Set date components
+        day = facebook_user.birthday_day
+        month = facebook_user.birthday_month
+        year = self._get_event_year(facebook_user, cur_date)
+
+        # Feb 29 special case:
+        # If event year is not a leap year, use Feb 28 as birthday date instead
+        if facebook_user.birthday_month == 2 and facebook_user.birthday_day == 29 and not calendar.isleap(year):
+            day = 28
+
+        description = f'{facebook_user}\n{generate_facebook_profile_url_permalink(facebook_user)}'
+
+        return formatted_username, year, month, day, description
+
     def generate(self):
+        """ Build the calendar using the ics library object model, see get_birthday_calendar """
+        # ics is slow to import and write() does not need it
+        from ics import Calendar, Event
+        from ics.grammar.parse import ContentLine
+
         c = Calendar()
         c.scale = 'GREGORIAN'
         c.method = 'PUBLISH'
         c.creator = f'fb2cal v{__version__} ({__status__}) [{__github_short_url__}]'
-        c.extra.append(ContentLine(name='X-WR-CALNAME', value='Facebook Birthdays (fb2cal)'))
-        c.extra.append(ContentLine(name='X-PUBLISHED-TTL', value='PT12H'))
-        c.extra.append(ContentLine(name='X-ORIGINAL-URL', value='/events/birthdays/'))
+        c.extra.append(ContentLine(name='X-WR-CALNAME', value=ICS_CALENDAR_NAME))
+        c.extra.append(ContentLine(name='X-PUBLISHED-TTL', value=ICS_PUBLISHED_TTL))
+        c.extra.append(ContentLine(name='X-ORIGINAL-URL', value=ICS_ORIGINAL_URL))
 
         cur_date = datetime.now()
 
         for facebook_user in self.facebook_users:
-            # Don't add extra 's' if name already ends with 's'
-            formatted_username = f"{facebook_user.name}'s" if facebook_user.name[-1] != 's' else f"{facebook_user.name}'"
-            formatted_username = f'{formatted_username} Birthday'
-
-            # Set date components
-            day = facebook_user.birthday_day
-            month = facebook_user.birthday_month
-            year = facebook_user.birthday_year
-
-            # Feb 29 special case:
-            # If event year is not a leap year, use Feb 28 as birthday date instead
-            if facebook_user.birthday_month == 2 and facebook_user.birthday_day == 29 and not calendar.isleap(year):
-                day = 28
-
-            # The birth year may not be visible due to privacy settings
-            # In this case, calculate the year as this year or next year based on if its past current month or not
-            if year is None:
-                year = cur_date.year if facebook_user.birthday_month >= cur_date.month else (cur_date + relativedelta(years=1)).year
-
-            # Format date components as needed
-            month = f'{month:02}'
-            day = f'{day:02}'
+            formatted_username, year, month, day, description = self._get_event_details(facebook_user, cur_date)
 
             # Event meta data
             e = Event()
@@ -57,8 +130,8 @@ class ICSWriter:
             e.uid = facebook_user.id
             e.name = formatted_username
             e.created = cur_date
-            e.description = f'{facebook_user}\n{generate_facebook_profile_url_permalink(facebook_user)}'
-            e.begin = f'{year}-{month}-{day} 00:00:00'
+            e.description = description
+            e.begin = f'{year}-{month:02}-{day:02} 00:00:00'
             e.make_all_day()
             e.duration = timedelta(days=1)
             e.extra.append(ContentLine(name='RRULE', value='FREQ=YEARLY'))
@@ -67,19 +140,197 @@ class ICSWriter:
 
         self.birthday_calendar = c
 
-    def write(self, ics_file_path):
-        # Remove blank lines
-        ics_str = ''.join([line.rstrip('\n') for line in self.birthday_calendar])
-        self.logger.debug(f'ics_str: {ics_str}')
+    def _render_event(self, facebook_user, cur_date, dtstamp):
+        """ Render the VEVENT block for facebook_user """
+        formatted_username, year, month, day, description = self._get_event_details(facebook_user, cur_date)
+
+        return (
+            f'BEGIN:VEVENT{ICS_LINE_ENDING}'
+            f'RRULE:FREQ=YEARLY{ICS_LINE_ENDING}'
+            f'DTSTART;VALUE=DATE:{year:04}{month:02}{day:02}{ICS_LINE_ENDING}'
+            f'DTSTAMP:{dtstamp}{ICS_LINE_ENDING}'
+            f'{fold_line(f"DESCRIPTION:{escape_text(description)}")}{ICS_LINE_ENDING}'
+            f'DURATION:P1D{ICS_LINE_ENDING}'
+            f'{fold_line(f"SUMMARY:{escape_text(formatted_username)}")}{ICS_LINE_ENDING}'
+            f'{fold_line(f"UID:{escape_text(facebook_user.id)}")}{ICS_LINE_ENDING}'
+            f'END:VEVENT{ICS_LINE_ENDING}'
+        )
+
+    def serialize(self, render_cache=None):
+        """ Yield the calendar as RFC 5545 content lines (folded and CRLF terminated) straight from the Facebook users
+            Produces the same properties in the same order as generate() without building the ics object model
+            If a render_cache (uid -> [fingerprint, vevent]) is given, events whose fingerprint is unchanged are reused from it
+            and the cache is updated in place to hold exactly the events that were written """
 
+        cur_date = datetime.now()
+        dtstamp = cur_date.strftime('%Y%m%dT%H%M%SZ')
+        self.render_stats = {'reused': 0, 'rendered': 0, 'removed': 0}
+        rendered_uids = set()
+
+        yield from (f'{line}{ICS_LINE_ENDING}' for line in [
+            'BEGIN:VCALENDAR',
+            f'X-WR-CALNAME:{ICS_CALENDAR_NAME}',
+            f'X-PUBLISHED-TTL:{ICS_PUBLISHED_TTL}',
+            f'X-ORIGINAL-URL:{ICS_ORIGINAL_URL}',
+            'VERSION:2.0',
+            fold_line(f'PRODID:fb2cal v{__version__} ({__status__}) [{__github_short_url__}]'),
+            'CALSCALE:GREGORIAN',
+        ])
+
+        # Events are written in birthday order (see BaseFacebookUser.get_sort_key) so unchanged birthdays produce byte identical files
+        for facebook_user in sorted(self.facebook_users, key=BaseFacebookUser.get_sort_key):
+            if render_cache is None:
+                yield self._render_event(facebook_user, cur_date, dtstamp)
+                continue
+
+            # Unchanged events keep their cached text (including their original DTSTAMP)
+            fingerprint = self._get_event_fingerprint(facebook_user, cur_date)
+            cached_event = render_cache.get(facebook_user.id)
+
+            if cached_event and cached_event[0] == fingerprint:
+                self.render_stats['reused'] += 1
+            else:
+                cached_event = render_cache[facebook_user.id] = [fingerprint, self._render_event(facebook_user, cur_date, dtstamp)]
+                self.render_stats['rendered'] += 1
+
+            rendered_uids.add(facebook_user.id)
+            yield cached_event[1]
+
+        if render_cache is not None:
+            for uid in render_cache.keys() - rendered_uids:
+                del render_cache[uid]
+                self.render_stats['removed'] += 1
+
+        yield f'METHOD:PUBLISH{ICS_LINE_ENDING}'
+        yield f'END:VCALENDAR{ICS_LINE_ENDING}'
+
+    def _load_render_cache(self, render_cache_path):
+        if not os.path.exists(render_cache_path):
+            return {}
+
+        try:
+            with open(render_cache_path, mode='r', encoding='UTF-8') as render_cache_file:
+                cache = json.load(render_cache_file)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Ignoring unreadable render cache at {render_cache_path}: {e}')
+            return {}
+
+        # Rendering may change between versions so start over after an upgrade
+        if cache.get('version') != __version__:
+            return {}
+
+        return cache['events']
+
+    def _save_render_cache(self, render_cache_path, render_cache):
+        # Replace the cache atomically so a crash while saving never leaves a truncated cache behind
+        render_cache_dir = os.path.dirname(render_cache_path)
+        temp_file_descriptor, temp_file_path = tempfile.mkstemp(dir=render_cache_dir or '.', prefix=f'.{os.path.basename(render_cache_path)}.', suffix='.tmp')
+        try:
+            with os.fdopen(temp_file_descriptor, mode='w', encoding='UTF-8') as temp_file:
+                json.dump({'version': __version__, 'events': render_cache}, temp_file, ensure_ascii=False)
+            os.replace(temp_file_path, render_cache_path)
+        except BaseException:
+            os.remove(temp_file_path)
+            raise
+
+    def _read_digest(self, digest_path):
+        """ Digest of the last written ICS file or None if unknown """
+        try:
+            with open(digest_path, mode='r', encoding='UTF-8') as digest_file:
+                return digest_file.read().split()[0]
+        except (OSError, IndexError):
+            return None
+
+    def _write_digest(self, digest_path, digest):
+        with open(digest_path, mode='w', encoding='UTF-8') as digest_file:
+            digest_file.write(f'{digest}\n')
+
+    def _get_file_mode(self, ics_file_path):
+        """ Permissions to give the written ICS file, an existing file keeps its own """
+        try:
+            return stat.S_IMODE(os.stat(ics_file_path).st_mode)
+        except FileNotFoundError:
+            # mkstemp creates files only readable by us, give a new ICS file the usual permissions for a new file
+            return 0o666 & ~self._get_umask()
+
+    def _write_contents(self, ics_file_path, contents):
+        """ Write the encoded contents to a temporary file in the same directory which then atomically replaces ics_file_path """
+        ics_file_dir = os.path.dirname(ics_file_path)
+        temp_file_descriptor, temp_file_path = tempfile.mkstemp(dir=ics_file_dir or '.', prefix=f'.{os.path.basename(ics_file_path)}.', suffix='.tmp')
+        try:
+            self.ics_size = 0
+            with os.fdopen(temp_file_descriptor, mode='wb') as temp_file:
+                for content in contents:
+                    self.ics_size += len(content)
+                    temp_file.write(content)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+
+            os.chmod(temp_file_path, self._get_file_mode(ics_file_path))
+            os.replace(temp_file_path, ics_file_path)
+        except BaseException:
+            os.remove(temp_file_path)
+            raise
+
+    def write(self, ics_file_path, incremental=False, skip_unchanged=False):
+        """ Stream the serialized calendar to ics_file_path
+            The calendar is written to a temporary file in the same directory which then atomically replaces ics_file_path,
+            so readers never see a truncated or partially written file
+            If incremental, rendered events are cached next to the ICS file and only added or changed events are rendered again
+            If skip_unchanged, the calendar is serialized into memory and ics_file_path is left untouched, without writing anything,
+            when the calendar is identical to the last written one apart from DTSTAMP. A digest of the written calendar is kept next to it
+            Returns True if ics_file_path was written, False if it was unchanged """
         self.logger.info(f'Saving ICS file to local file system...')
 
-        if not os.path.exists(os.path.dirname(ics_file_path)):
-            os.makedirs(os.path.dirname(ics_file_path), exist_ok=True)
+        ics_file_dir = os.path.dirname(ics_file_path)
+        if ics_file_dir and not os.path.exists(ics_file_dir):
+            os.makedirs(ics_file_dir, exist_ok=True)
+
+        render_cache_path = f'{ics_file_path}{RENDER_CACHE_SUFFIX}'
+        render_cache = self._load_render_cache(render_cache_path) if incremental else None
+        digest_path = f'{ics_file_path}{DIGEST_SUFFIX}'
+
+        # Encoding ourselves keeps the CRLF line endings required by RFC 5545 on every platform
+        contents = (content.encode('utf-8') for content in self.serialize(render_cache))
+        unchanged = False
+
+        if skip_unchanged:
+            # The calendar is serialized into memory and compared with the last written one first, so an unchanged calendar
+            # costs no disk writes at all
+            contents = list(contents)
+            content_hash = hashlib.sha256()
+            for content in contents:
+                content_hash.update(DTSTAMP_LINE_PATTERN.sub(b'', content))
+            digest = content_hash.hexdigest()
+            unchanged = os.path.exists(ics_file_path) and self._read_digest(digest_path) == digest
+
+        if unchanged:
+            self.ics_size = sum(len(content) for content in contents)
+        else:
+            self._write_contents(ics_file_path, contents)
+            if skip_unchanged:
+                self._write_digest(digest_path, digest)
+            elif os.path.exists(digest_path):
+                # A digest left by an earlier run no longer matches the file
+                os.remove(digest_path)
+
+        if incremental:
+            # The render cache only changes when events were rendered or removed
+            if self.render_stats['rendered'] or self.render_stats['removed']:
+                self._save_render_cache(render_cache_path, render_cache)
+            self.logger.debug(f'Incremental render: {self.render_stats["reused"]} reused, {self.render_stats["rendered"]} rendered, {self.render_stats["removed"]} removed.')
+
+        if unchanged:
+            self.logger.info(f'ICS file at {os.path.abspath(ics_file_path)} is unchanged, skipped writing it.')
+            return False
 
-        with open(ics_file_path, mode='w', encoding="UTF-8") as ics_file:
-            ics_file.write(ics_str)
         self.logger.info(f'Successfully saved ICS file to {os.path.abspath(ics_file_path)}')
+        return True
+
+    def _get_umask(self):
+        umask = os.umask(0)
+        os.umask(umask)
+        return umask
 
     def get_birthday_calendar(self):
         return self.birthday_calendar
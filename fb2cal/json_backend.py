@@ -0,0 +1,26 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Use orjson when it is installed as it is considerably faster than the standard library json module
+JSON_BACKEND = 'orjson' if orjson else 'json'
+
+# Decode JSON from str, bytes or memoryview
+# orjson decodes bytes directly so no intermediate str is ever created
+def loads(data):
+    if orjson:
+        return orjson.loads(data)
+
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+# Encode obj as a JSON str
+def dumps(obj):
+    if orjson:
+        return orjson.dumps(obj).decode('utf-8')
+
+    return json.dumps(obj)
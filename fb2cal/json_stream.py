@@ -0,0 +1,74 @@
+import importlib.util
+
+# Incremental JSON parsing is optional as it requires ijson to be installed
+# ijson itself is only imported once a response is parsed incrementally
+def is_json_streaming_available():
+    return importlib.util.find_spec('ijson') is not None
+
+# Parse a JSON document from a binary file-like object keeping only the subtrees at keep_prefixes
+# Prefixes use ijson notation (dot separated keys, 'item' for array elements)
+# Containers on the way to a kept subtree are recreated so the result has the same shape as the full document
+# Everything else is skipped as it is parsed so it never needs to be held in memory
+def parse_json_subtrees(file, keep_prefixes):
+    import ijson
+
+    keep_prefixes = set(keep_prefixes)
+    ancestor_prefixes = {''}
+    for keep_prefix in keep_prefixes:
+        keys = keep_prefix.split('.')
+        ancestor_prefixes.update('.'.join(keys[:i]) for i in range(1, len(keys)))
+
+    result = None
+    containers = [] # Stack of recreated containers
+    keys = [] # Current key of each recreated container (None for arrays)
+    builder = None # Builds a kept subtree
+    builder_depth = 0
+
+    def attach(value):
+        nonlocal result
+        if not containers:
+            result = value
+        elif isinstance(containers[-1], dict):
+            containers[-1][keys[-1]] = value
+        else:
+            containers[-1].append(value)
+
+    for prefix, event, value in ijson.parse(file, use_float=True):
+        if builder:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                builder_depth += 1
+            elif event in ('end_map', 'end_array'):
+                builder_depth -= 1
+
+            if builder_depth == 0:
+                attach(builder.value)
+                builder = None
+            continue
+
+        if prefix in keep_prefixes and event != 'map_key':
+            if event in ('start_map', 'start_array'):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                builder_depth = 1
+            else:
+                attach(value)
+            continue
+
+        if prefix not in ancestor_prefixes:
+            continue
+
+        if event == 'map_key':
+            keys[-1] = value
+        elif event in ('start_map', 'start_array'):
+            container = {} if event == 'start_map' else []
+            attach(container)
+            containers.append(container)
+            keys.append(None)
+        elif event in ('end_map', 'end_array'):
+            containers.pop()
+            keys.pop()
+        else:
+            attach(value)
+
+    return result
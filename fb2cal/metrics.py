@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from .logger import Logger
+
+PROMETHEUS_METRIC_PREFIX = 'fb2cal'
+
+# Values set with Metrics.set_value that are exported to Prometheus
+PROMETHEUS_VALUE_METRICS = (
+    ('birthdays', 'Birthdays found in the last run.'),
+    ('upcoming_birthdays', 'Birthdays in the next [FETCH] upcoming_days days found in the last run.'),
+    ('malformed_nodes', 'Malformed nodes skipped in birthday query responses.'),
+    ('ics_bytes', 'Size of the generated ICS calendar.'),
+    ('success', 'If the last run succeeded.'),
+)
+
+# Marks the end of an iterable timed by Metrics.time_iteration
+_EXHAUSTED = object()
+
+# Escape a Prometheus label value
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()) + '}'
+
+# Write content to path through a temporary file in the same directory so readers never see a partial file
+def _write_atomically(path, content):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory or '.', prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode='w', encoding='UTF-8') as temp_file:
+            temp_file.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+""" Timings, sizes and counts collected during a single fb2cal run """
+class Metrics:
+
+    def __init__(self):
+        self.logger = Logger('fb2cal').getLogger()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Start collecting a new run, long running modes call this before every refresh """
+        with self.lock:
+            self.started_at = time.time()
+            self.stages = {} # stage -> seconds
+            self.requests = {} # (method, path, status) -> {'count', 'seconds', 'max_seconds'}
+            self.graphql_response_bytes = {} # offset month -> bytes received over the network, before decompression
+            self.quarter_birthdays = {} # offset month -> birthdays
+            self.values = {} # Other values such as total birthdays and ICS size
+
+    @contextmanager
+    def time_stage(self, stage):
+        """ Add the time spent in the with block to stage, a stage timed more than once adds up """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            with self.lock:
+                self.stages[stage] = self.stages.get(stage, 0) + elapsed
+
+    def time_iteration(self, stage, iterable):
+        """ Yield the items of iterable adding only the time spent waiting for each item to stage,
+            so work done with an item by the caller can be timed as a stage of its own """
+        iterator = iter(iterable)
+        while True:
+            with self.time_stage(stage):
+                item = next(iterator, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                return
+            yield item
+
+    def instrument_session(self, session):
+        """ Time every request made through a requests session """
+        session.hooks['response'].append(self._record_request)
+
+    def _record_request(self, response, *args, **kwargs):
+        # elapsed is the time until the response headers were parsed, reading the body is part of the stage timers
+        seconds = response.elapsed.total_seconds()
+        key = (response.request.method, urlsplit(response.request.url).path, response.status_code)
+
+        with self.lock:
+            request = self.requests.setdefault(key, {'count': 0, 'seconds': 0, 'max_seconds': 0})
+            request['count'] += 1
+            request['seconds'] += seconds
+            request['max_seconds'] = max(request['max_seconds'], seconds)
+
+    def record_graphql_response(self, offset_month, received_bytes):
+        with self.lock:
+            self.graphql_response_bytes[offset_month] = self.graphql_response_bytes.get(offset_month, 0) + received_bytes
+
+    def record_quarter_birthdays(self, offset_month, birthdays):
+        """ Further pages of an offset month add up """
+        with self.lock:
+            self.quarter_birthdays[offset_month] = self.quarter_birthdays.get(offset_month, 0) + birthdays
+
+    def set_value(self, name, value):
+        with self.lock:
+            self.values[name] = value
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'started_at': self.started_at,
+                'stages': dict(self.stages),
+                'requests': [{'method': method, 'path': path, 'status': status, **request} for (method, path, status), request in self.requests.items()],
+                'graphql_response_bytes': {str(offset_month): received_bytes for offset_month, received_bytes in self.graphql_response_bytes.items()},
+                'quarter_birthdays': {str(offset_month): birthdays for offset_month, birthdays in self.quarter_birthdays.items()},
+                **self.values,
+            }
+
+    def to_prometheus(self):
+        """ Metrics in the Prometheus text exposition format """
+        metrics = self.to_dict()
+        lines = []
+
+        def add(name, help_text, samples):
+            lines.append(f'# HELP {PROMETHEUS_METRIC_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PROMETHEUS_METRIC_PREFIX}_{name} gauge')
+            for labels, value in samples:
+                lines.append(f'{PROMETHEUS_METRIC_PREFIX}_{name}{_format_labels(labels)} {value}')
+
+        add('last_run_timestamp_seconds', 'Time the last run started.', [(None, metrics['started_at'])])
+        add('stage_duration_seconds', 'Time spent in each stage of the last run.', [({'stage': stage}, seconds) for stage, seconds in metrics['stages'].items()])
+        add('http_requests', 'Requests sent in the last run.', [({'method': request['method'], 'path': request['path'], 'status': request['status']}, request['count']) for request in metrics['requests']])
+        add('http_request_duration_seconds_sum', 'Total time until response headers were received.', [({'method': request['method'], 'path': request['path'], 'status': request['status']}, request['seconds']) for request in metrics['requests']])
+        add('http_request_duration_seconds_max', 'Longest time until response headers were received.', [({'method': request['method'], 'path': request['path'], 'status': request['status']}, request['max_seconds']) for request in metrics['requests']])
+        add('graphql_response_bytes', 'Bytes received over the network for each birthday query, before decompression.', [({'offset_month': offset_month}, received_bytes) for offset_month, received_bytes in metrics['graphql_response_bytes'].items()])
+        add('quarter_birthdays', 'Birthdays fetched for each birthday query.', [({'offset_month': offset_month}, birthdays) for offset_month, birthdays in metrics['quarter_birthdays'].items()])
+
+        for name, help_text in PROMETHEUS_VALUE_METRICS:
+            if name in metrics:
+                add(name, help_text, [(None, int(metrics[name]))])
+
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        _write_atomically(path, json.dumps(self.to_dict(), indent=2))
+        self.logger.debug(f'Saved metrics to {os.path.abspath(path)}')
+
+    def write_prometheus_textfile(self, path):
+        """ Save metrics for the node_exporter textfile collector, which requires the file to be replaced atomically """
+        _write_atomically(path, self.to_prometheus())
+        self.logger.debug(f'Saved Prometheus metrics to {os.path.abspath(path)}')
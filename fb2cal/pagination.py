@@ -0,0 +1,66 @@
+from .logger import Logger
+
+# Pages of a single month's friends followed at most, guards against a cursor that never runs out
+DEFAULT_MAX_PAGES = 20
+
+""" Decide which further BirthdayCometMonthlyBirthdaysRefetchQuery pages to fetch for months with more friends than fit in one response
+    A month i months after the month requested with offset_month (get_expected_month(offset_month), see
+    Transformer.get_birthday_comet_monthly_month_offsets) is continued by querying (offset_month + i) % 12 with the month's friends
+    end_cursor, the month being paged is then the requested month of every following page
+    Months are counted from the requested month rather than the first month of the response, which may have been left out """
+class FriendsPagination:
+
+    def __init__(self, transformer, max_pages=DEFAULT_MAX_PAGES, get_expected_month=None):
+        self.logger = Logger('fb2cal').getLogger()
+        self.transformer = transformer
+        self.max_pages = max_pages
+        self.get_expected_month = get_expected_month # offset month -> calendar month (1-12), see OffsetMonthPlanner.get_expected_month
+        self.page_counts = {} # calendar month offset (0-11) -> pages fetched
+        self.cursors = {} # calendar month offset (0-11) -> cursors already queried
+
+    def get_next_pages(self, offset_month, cursor, response_json):
+        """ Returns the (offset_month, cursor) pages to query after receiving response_json for offset_month and cursor """
+        expected_month = self.get_expected_month(offset_month) if self.get_expected_month else None
+        next_cursors = self.transformer.get_birthday_comet_monthly_next_cursors(response_json, expected_month)
+        if not next_cursors:
+            return []
+
+        # Without the requested month there is no telling which offset month continues a month
+        if expected_month is None:
+            self.logger.warning(f'Month requested with offset month {offset_month} is unknown. Not paging its friends, some birthdays may be missing.')
+            return []
+        if None in next_cursors:
+            self.logger.warning(f'Month without a known name in the response for offset month {offset_month} has more friends. Not paging it, some birthdays may be missing.')
+            del next_cursors[None]
+
+        if cursor is None:
+            months = [(offset_month + month_offset, next_cursor) for month_offset, next_cursor in next_cursors.items()]
+        else:
+            # Other months in a page were already seen in full responses of their own
+            months = [(offset_month, next_cursors[0])] if 0 in next_cursors else []
+
+        next_pages = []
+        for month_offset, next_cursor in months:
+            month = month_offset % 12
+
+            # Quarters may overlap, each month is paged once
+            if cursor is None and month in self.page_counts:
+                continue
+
+            page_count = self.page_counts.get(month, 1)
+            cursors = self.cursors.setdefault(month, set())
+
+            if next_cursor in cursors:
+                self.logger.warning(f'Friends cursor for offset month {month_offset} did not advance. Stopped paging.')
+                continue
+            if page_count >= self.max_pages:
+                self.logger.warning(f'Stopped paging friends for offset month {month_offset} after {self.max_pages} pages. Some birthdays may be missing.')
+                continue
+
+            self.page_counts[month] = page_count + 1
+            cursors.add(next_cursor)
+            next_pages.append((month, next_cursor))
+
+        if next_pages:
+            self.logger.debug(f'Fetching further friends pages: {next_pages}.')
+        return next_pages
@@ -0,0 +1,224 @@
+import os
+import time
+
+from .logger import Logger
+from .metrics import Metrics
+from .birthday_index import BirthdayIndex
+from .facebook_browser import FacebookBrowser, FACEBOOK_BASE_URL
+from .friend_cache import FriendCache
+from .friend_table import FriendTable
+from .pagination import FriendsPagination, DEFAULT_MAX_PAGES
+from .planner import OffsetMonthPlanner, MONTHS_IN_YEAR, get_upcoming_offset_months, get_upcoming_months
+from .session_store import SessionStore
+from .token_cache import TokenCache
+from .transformer import Transformer
+from .utils import strtobool
+
+logger = Logger('fb2cal').getLogger()
+
+def create_rate_limiter(config):
+    """ Rate limiter to share between every Facebook browser in this process """
+    from .rate_limiter import RateLimiter # Imports requests
+
+    return RateLimiter(
+        float(config.get('RATE_LIMIT', 'host_rate', fallback='0')),
+        int(config.get('RATE_LIMIT', 'host_burst', fallback='1')),
+        float(config.get('RATE_LIMIT', 'account_rate', fallback='0')),
+        int(config.get('RATE_LIMIT', 'account_burst', fallback='1')),
+        int(config.get('RATE_LIMIT', 'max_retries', fallback='0')),
+        float(config.get('RATE_LIMIT', 'backoff_base', fallback='1')),
+        float(config.get('RATE_LIMIT', 'backoff_max', fallback='60')),
+    )
+
+def create_facebook_browser(config, rate_limiter=None, metrics=None):
+    token_cache = None
+    if strtobool(config.get('SESSION', 'cache_token', fallback='False')):
+        token_cache = TokenCache(config.get('SESSION', 'token_cache_file_path', fallback='./cache/tokens.json'), int(config.get('SESSION', 'token_ttl', fallback='43200')))
+
+    return FacebookBrowser(token_cache, strtobool(config.get('FETCH', 'stream_json', fallback='False')), config.get('DEVELOPMENT', 'facebook_base_url', fallback=None) or FACEBOOK_BASE_URL, rate_limiter or create_rate_limiter(config), metrics)
+
+def login(config, facebook_browser):
+    """ Reuse a saved session if we have one, otherwise attempt login """
+    session_store = None
+    if strtobool(config.get('SESSION', 'persist_session', fallback='False')):
+        session_store = SessionStore(config.get('SESSION', 'session_file_path', fallback='./cache/session.bin'), f"{config['AUTH']['FB_EMAIL']}:{config['AUTH']['FB_PASS']}")
+
+    if session_store and facebook_browser.restore_session(session_store):
+        logger.info('Successfully restored saved Facebook session.')
+    else:
+        logger.info('Attemping to authenticate with Facebook...')
+        facebook_browser.authenticate(config['AUTH']['FB_EMAIL'], config['AUTH']['FB_PASS'])
+        logger.info('Successfully authenticated with Facebook.')
+
+        if session_store:
+            facebook_browser.save_session(session_store)
+
+def create_friend_cache(config):
+    return FriendCache(config.get('CACHE', 'friend_cache_file_path', fallback='./cache/friends.json.gz'))
+
+def load_cached_facebook_users(config, offline=False, max_age=None, metrics=None):
+    """ Friends from the friend cache instead of Facebook
+        Offline the cache is used whatever its age, otherwise only while it is younger than max_age seconds
+        (default [CACHE] max_age, 0 never uses it). Offline without a cache raises SystemError.
+        Returns a FriendTable, or None if the cache should not be used """
+    if max_age is None:
+        max_age = int(config.get('CACHE', 'max_age', fallback='0'))
+    if not offline and max_age <= 0:
+        return None
+
+    metrics = metrics or Metrics()
+    friend_cache = create_friend_cache(config)
+
+    with metrics.time_stage('load_cache'):
+        months = friend_cache.load()
+        if months is None:
+            if offline:
+                logger.error(f'No friend cache found at {os.path.abspath(friend_cache.friend_cache_file_path)}. Run fb2cal online with [CACHE] cache_friends enabled first.')
+                raise SystemError
+            return None
+
+        age = friend_cache.get_age(months)
+        if max_age > 0 and age > max_age:
+            if not offline:
+                logger.info(f'Friend cache is {age:.0f} seconds old, older than the maximum age of {max_age} seconds. Fetching birthdays from Facebook.')
+                return None
+            logger.warning(f'Friend cache is {age:.0f} seconds old, older than the maximum age of {max_age} seconds. Using it anyway as running offline.')
+
+        facebook_users = friend_cache.get_facebook_users(months)
+
+    logger.info(f'Loaded {len(facebook_users)} birthdays from the friend cache ({age:.0f} seconds old).')
+    metrics.set_value('birthdays', len(facebook_users))
+    return facebook_users
+
+def fetch_facebook_users(config, facebook_browser, max_age=None):
+    """ Fetch birthdays for a full calendar year and transform them
+        With [FETCH] upcoming_days only the months of the birthdays in the next upcoming_days days are fetched, the rest of the year
+        is taken from the friend cache and the fetched months are written back to it. The full year is fetched instead without
+        a friend cache, or once the friend cache is older than max_age seconds (default [CACHE] max_age, 0 never).
+        Returns a FriendTable with one row per friend """
+    facebook_users = FriendTable()
+    seen_ids = set()
+    transformer = Transformer()
+    metrics = facebook_browser.metrics or Metrics()
+    cache_friends = strtobool(config.get('CACHE', 'cache_friends', fallback='False'))
+    if max_age is None:
+        max_age = int(config.get('CACHE', 'max_age', fallback='0'))
+
+    upcoming_days = int(config.get('FETCH', 'upcoming_days', fallback='0'))
+    friend_cache = create_friend_cache(config)
+    cached_months = None
+    if upcoming_days > 0:
+        cached_months = friend_cache.load() if cache_friends else None
+        if not cached_months:
+            logger.info('Fetching the full year as upcoming_days needs the friend cache of an earlier full fetch ([CACHE] cache_friends).')
+            upcoming_days = 0
+        elif max_age > 0 and friend_cache.get_age(cached_months) > max_age:
+            logger.info(f'Fetching the full year as the friend cache is {friend_cache.get_age(cached_months):.0f} seconds old, older than the maximum age of {max_age} seconds.')
+            upcoming_days = 0
+
+    # Fetched months are cached as of the start of the fetch, friends changed while it runs are picked up by the next one
+    fetch_started_at = time.time()
+
+    # Endpoint will return all birthdays for offset_month plus the following 2 consecutive months.
+    # Rather than relying on that, further offset months are planned from the months present in each response.
+    if upcoming_days > 0:
+        logger.info(f'Fetching Birthdays in the next {upcoming_days} days via BirthdayCometRootQuery endpoint...')
+        offset_month_planner = OffsetMonthPlanner(transformer, get_upcoming_offset_months(upcoming_days))
+    else:
+        logger.info('Fetching all Birthdays via BirthdayCometRootQuery endpoint...')
+        offset_month_planner = OffsetMonthPlanner(transformer)
+
+    # Months with more friends than fit in one response are paged through by cursor
+    friends_pagination = FriendsPagination(transformer, int(config.get('FETCH', 'max_pages', fallback=str(DEFAULT_MAX_PAGES))), offset_month_planner.get_expected_month)
+
+    def get_next_pages(offset_month, cursor, response_json):
+        return offset_month_planner.get_next_pages(offset_month, cursor, response_json) + friends_pagination.get_next_pages(offset_month, cursor, response_json)
+
+    offset_months = offset_month_planner.get_initial_offset_months()
+    if strtobool(config.get('FETCH', 'concurrent', fallback='False')):
+        max_workers = int(config.get('FETCH', 'max_workers', fallback='4'))
+        logger.debug(f'Fetching concurrently with {max_workers} workers.')
+        birthday_comet_monthly_responses = facebook_browser.query_graph_ql_birthday_comet_monthly_concurrently(offset_months, max_workers, get_next_pages)
+    else:
+        birthday_comet_monthly_responses = facebook_browser.query_graph_ql_birthday_comet_monthly_serially(offset_months, get_next_pages)
+
+    # Stream each quarter or page into the table as soon as it arrives, only one response and no per quarter list of users is kept in memory
+    # Only waiting for responses is timed as fetching, transforming them and saving the cache are stages of their own
+    for offset_month, birthday_comet_monthly_json in metrics.time_iteration('fetch', birthday_comet_monthly_responses):
+        with metrics.time_stage('transform'):
+            quarter_birthdays = 0
+            for friend_record in transformer.iter_birthday_comet_monthly_friend_records(birthday_comet_monthly_json):
+                quarter_birthdays += 1
+                # Responses for overlapping months contain the same friends, keep the first one
+                if friend_record[0] not in seen_ids:
+                    seen_ids.add(friend_record[0])
+                    facebook_users.add(*friend_record)
+            logger.debug(f'Fetched {quarter_birthdays} birthdays for offset month {offset_month}.')
+        del birthday_comet_monthly_json
+        metrics.record_quarter_birthdays(offset_month, quarter_birthdays)
+
+    if upcoming_days > 0:
+        # Cached friends of the fetched months were fetched again, friends missing from the fetch are no longer friends
+        upcoming_months = get_upcoming_months(upcoming_days)
+        cached_facebook_users = friend_cache.get_facebook_users(cached_months)
+        facebook_users.extend(facebook_user for facebook_user in cached_facebook_users if facebook_user.id not in seen_ids and facebook_user.birthday_month not in upcoming_months)
+        logger.debug(f'Merged {len(cached_facebook_users)} cached birthdays outside months {sorted(upcoming_months)}.')
+
+        # Only the fetched months are fresh, other months keep the time they were last fetched
+        fetched_at = {int(month): cached_month['fetched_at'] for month, cached_month in cached_months.items()}
+        fetched_at.update(dict.fromkeys(upcoming_months, fetch_started_at))
+
+        upcoming_facebook_users = BirthdayIndex(facebook_users).get_upcoming(upcoming_days)
+        logger.info(f'{len(upcoming_facebook_users)} birthdays in the next {upcoming_days} days.')
+        logger.debug(f'Upcoming birthdays: {", ".join(str(facebook_user) for facebook_user in upcoming_facebook_users)}')
+        metrics.set_value('upcoming_birthdays', len(upcoming_facebook_users))
+    else:
+        fetched_at = dict.fromkeys(range(1, MONTHS_IN_YEAR + 1), fetch_started_at)
+
+    if len(facebook_users) == 0:
+        logger.warning(f'Facebook user table is empty. Failed to fetch any birthdays.')
+        raise SystemError
+
+    if cache_friends:
+        with metrics.time_stage('save_cache'):
+            friend_cache.save(facebook_users, fetched_at)
+
+    logger.info(f'A total of {len(facebook_users)} birthdays were found.')
+    metrics.set_value('birthdays', len(facebook_users))
+    metrics.set_value('malformed_nodes', transformer.malformed_nodes)
+    if facebook_browser.rate_limiter:
+        logger.debug(f'Request counters: {facebook_browser.rate_limiter.get_counters()}')
+    return facebook_users
+
+def save_ics_file(config, ics_writer, metrics=None):
+    """ Stream the ICS to the file system if enabled
+        Returns True if the ICS file was written """
+    if not strtobool(config['FILESYSTEM']['SAVE_TO_FILE']):
+        return False
+
+    metrics = metrics or Metrics()
+
+    logger.info('Creating birthday ICS file...')
+    with metrics.time_stage('write'):
+        written = ics_writer.write(config['FILESYSTEM']['ICS_FILE_PATH'], strtobool(config.get('FILESYSTEM', 'incremental', fallback='False')), strtobool(config.get('FILESYSTEM', 'skip_unchanged', fallback='False')))
+    metrics.set_value('ics_bytes', ics_writer.ics_size)
+
+    if written:
+        logger.info('ICS file created successfully.')
+    else:
+        logger.info('Birthdays are unchanged, kept existing ICS file.')
+    return written
+
+def save_metrics(config, metrics, succeeded):
+    """ Save metrics of the run to the files enabled in config """
+    metrics.set_value('success', succeeded)
+
+    logger.debug(f'Stage durations: {", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in metrics.stages.items())}')
+
+    json_path = config.get('METRICS', 'json_path', fallback=None)
+    if json_path:
+        metrics.write_json(json_path)
+
+    prometheus_textfile_path = config.get('METRICS', 'prometheus_textfile_path', fallback=None)
+    if prometheus_textfile_path:
+        metrics.write_prometheus_textfile(prometheus_textfile_path)
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+
+from .logger import Logger
+
+MONTHS_IN_YEAR = 12
+
+# Months Facebook returns per response, the offset month plus the following 2 months
+DEFAULT_WINDOW = 3
+
+def get_upcoming_offset_months(days, start_date=None):
+    """ Offset months spanned by the days days starting at start_date (default today) """
+    start_date = start_date or date.today()
+    end_date = start_date + timedelta(days=max(days, 1) - 1)
+    months_ahead = (end_date.year - start_date.year) * MONTHS_IN_YEAR + end_date.month - start_date.month
+    return range(min(months_ahead, MONTHS_IN_YEAR - 1) + 1)
+
+def get_upcoming_months(days, start_date=None):
+    """ Calendar months (1-12) spanned by the days days starting at start_date (default today) """
+    start_date = start_date or date.today()
+    return {get_offset_month_month(offset_month, start_date) for offset_month in get_upcoming_offset_months(days, start_date)}
+
+def get_offset_month_month(offset_month, start_date=None):
+    """ Calendar month (1-12) offset_month months after the month of start_date (default today) """
+    start_date = start_date or date.today()
+    return (start_date.month - 1 + offset_month) % MONTHS_IN_YEAR + 1
+
+""" Plan which offset_month BirthdayCometMonthlyBirthdaysRefetchQuery queries to send
+    Starts with the queries needed if every response covers DEFAULT_WINDOW months, so they can all be sent at once, then
+    uses the months present in each response to query any offset months left uncovered """
+class OffsetMonthPlanner:
+
+    def __init__(self, transformer, offset_months=range(MONTHS_IN_YEAR), start_date=None):
+        self.logger = Logger('fb2cal').getLogger()
+        self.transformer = transformer
+        self.start_date = start_date or date.today() # Offset month 0 is the month of start_date
+        self.wanted = set(offset_months)
+        self.covered = set()
+        self.expected = {} # queried offset month -> offset months its response is expected to cover
+        self.window = DEFAULT_WINDOW # Months per response, learned from the responses
+
+    def get_expected_month(self, offset_month):
+        """ Calendar month (1-12) the response for offset_month is requested for and should start at """
+        return get_offset_month_month(offset_month, self.start_date)
+
+    def get_initial_offset_months(self):
+        return self._plan(set(self.wanted))
+
+    def _plan(self, pending):
+        """ Offset months to query so every pending offset month is expected to be covered, assuming window months per response """
+        offset_months = []
+        for offset_month in sorted(pending):
+            if offset_month in pending:
+                self.expected[offset_month] = {(offset_month + i) % MONTHS_IN_YEAR for i in range(self.window)}
+                pending -= self.expected[offset_month]
+                offset_months.append(offset_month)
+        return offset_months
+
+    def get_covered_offset_months(self, offset_month, response_json):
+        """ Offset months present in the response for offset_month, see Transformer.get_birthday_comet_monthly_month_offsets
+            If the first month itself was left out the months after it are placed too early, which can only cause an extra query """
+        covered = {offset_month}
+        covered.update((offset_month + month_offset) % MONTHS_IN_YEAR for month_offset in self.transformer.get_birthday_comet_monthly_month_offsets(response_json) if month_offset is not None)
+        return covered
+
+    def get_next_pages(self, offset_month, cursor, response_json):
+        """ Returns the (offset_month, None) queries needed after receiving response_json for offset_month
+            Further pages of a month (cursor is not None) do not change the plan """
+        if cursor is not None or offset_month not in self.expected:
+            return []
+
+        covered = self.get_covered_offset_months(offset_month, response_json)
+        del self.expected[offset_month]
+        self.covered.update(covered)
+        self.window = max((covered_offset_month - offset_month) % MONTHS_IN_YEAR for covered_offset_month in covered) + 1
+
+        # Offset months still expected from queries in flight are not queried again
+        next_offset_months = self._plan(self.wanted - self.covered - set().union(*self.expected.values()))
+
+        if next_offset_months:
+            self.logger.debug(f'Response for offset month {offset_month} covered offset months {sorted(covered)}. Querying offset months {next_offset_months}.')
+        return [(next_offset_month, None) for next_offset_month in next_offset_months]
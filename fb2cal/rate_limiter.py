@@ -0,0 +1,142 @@
+import time
+import random
+import threading
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+from .logger import Logger
+
+# Responses worth retrying after backing off
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Methods that can be sent again without side effects (RFC 7231 4.2.2)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE')
+
+""" Allow rate requests per second on average with bursts of up to capacity requests """
+class TokenBucket:
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """ Take a token and return the number of seconds to wait before it may be used """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+""" Token bucket rate limits per host and per account plus jittered exponential backoff, shared by every request made """
+class RateLimiter:
+
+    def __init__(self, host_rate=0, host_burst=1, account_rate=0, account_burst=1, max_retries=0, backoff_base=1, backoff_max=60):
+        """ Rates are in requests per second, a rate of 0 disables that limit """
+        self.logger = Logger('fb2cal').getLogger()
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.buckets = {}
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def _get_bucket(self, key, rate, burst):
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(rate, burst)
+            return self.buckets[key]
+
+    def acquire(self, host, account=None):
+        """ Block until a request to host on behalf of account is allowed """
+        delay = 0
+        if self.host_rate:
+            delay = max(delay, self._get_bucket(('host', host), self.host_rate, self.host_burst).reserve())
+        if self.account_rate and account:
+            delay = max(delay, self._get_bucket(('account', account), self.account_rate, self.account_burst).reserve())
+
+        self.count('requests')
+        if delay > 0:
+            self.count('throttled')
+            self.count('throttled_seconds', delay)
+            time.sleep(delay)
+
+    def get_backoff_delay(self, attempt, retry_after=None):
+        """ Seconds to wait before retry number attempt (starting at 0)
+            Full jitter keeps clients that failed at the same time from retrying in lockstep """
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def backoff(self, attempt, reason, retry_after=None):
+        delay = self.get_backoff_delay(attempt, retry_after)
+        self.logger.info(f'{reason}. Retrying in {delay:.1f} seconds (attempt {attempt + 1} of {self.max_retries}).')
+        self.count('retries')
+        self.count('backoff_seconds', delay)
+        time.sleep(delay)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def get_counters(self):
+        """ Snapshot of the counters: requests, throttled, throttled_seconds, retries, backoff_seconds and responses_<status> """
+        with self.lock:
+            return dict(self.counters)
+
+# Seconds from a Retry-After header (delta seconds or HTTP date), None if missing or invalid
+def parse_retry_after(retry_after):
+    if not retry_after:
+        return None
+
+    try:
+        return max(0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        return max(0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+""" requests transport adapter that sends every request through a RateLimiter and retries throttled or failed requests
+    Only idempotent requests and POSTs to retry_post_paths (such as read only queries) are retried, other requests like a login
+    are returned as they are """
+class RateLimitedAdapter(HTTPAdapter):
+
+    def __init__(self, rate_limiter, get_account=None, retry_post_paths=(), **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limiter = rate_limiter
+        self.get_account = get_account or (lambda: None)
+        self.retry_post_paths = retry_post_paths
+
+    def is_retryable(self, request):
+        return request.method in IDEMPOTENT_METHODS or (request.method == 'POST' and urlparse(request.url).path in self.retry_post_paths)
+
+    def send(self, request, **kwargs):
+        host = urlparse(request.url).hostname
+        max_retries = self.rate_limiter.max_retries if self.is_retryable(request) else 0
+        attempt = 0
+
+        while True:
+            self.rate_limiter.acquire(host, self.get_account())
+            response = super().send(request, **kwargs)
+            self.rate_limiter.count(f'responses_{response.status_code}')
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                return response
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            response.close()
+            self.rate_limiter.backoff(attempt, f'Got status code {response.status_code} from {host}', retry_after)
+            attempt += 1
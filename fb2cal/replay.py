@@ -0,0 +1,260 @@
+""" Record exchanges with Facebook and replay them from a local stand-in server
+
+    Record a cassette by setting [DEVELOPMENT] record_cassette_path and running fb2cal as usual.
+    Secrets (cookies, email, password, tokens) are scrubbed before the cassette is saved.
+
+    Serve a cassette with:
+        python -m fb2cal.replay CASSETTE [--port 8080] [--latency 0.2] [--jitter 0.05] [--payload-scale 10]
+    and point fb2cal at it by setting [DEVELOPMENT] facebook_base_url = http://127.0.0.1:8080
+"""
+
+import io
+import re
+import copy
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, quote_plus
+
+from .logger import Logger
+from .utils import ANTI_HIJACKING_PREFIX
+
+CASSETTE_VERSION = 1
+RECORDED_RESPONSE_HEADERS = ('Content-Type', 'Location', 'Set-Cookie')
+
+# Request fields that must never end up in a cassette
+SECRET_REQUEST_FIELDS = ('email', 'pass', 'encpass', 'fb_dtsg')
+
+# Scrubbed stand-in for the c_user cookie, it must stay numeric for the login check to pass
+SCRUBBED_ACCOUNT_ID = '100000000000000'
+
+# Values shorter than this (such as the 'dpr' or 'wd' cookies) are not worth scrubbing and would corrupt unrelated text
+MIN_SECRET_LENGTH = 8
+
+def _exchange_key(method, url, request_body):
+    """ Key used to match a replayed request against the recorded exchanges """
+    fields = parse_qs(request_body or '')
+    friendly_name = fields.get('fb_api_req_friendly_name', [None])[0]
+    variables = fields.get('variables', [None])[0]
+    if variables:
+        variables = json.dumps(json.loads(variables), sort_keys=True)
+
+    return (method.upper(), urlsplit(url).path, friendly_name, variables)
+
+def load_cassette(cassette_path):
+    with open(cassette_path, mode='r', encoding='UTF-8') as cassette_file:
+        cassette = json.load(cassette_file)
+
+    if cassette.get('version') != CASSETTE_VERSION:
+        raise ValueError(f'Unsupported cassette version: {cassette.get("version")}')
+
+    return cassette
+
+""" Record every exchange made through a requests session """
+class Recorder:
+
+    def __init__(self, session):
+        self.logger = Logger('fb2cal').getLogger()
+        self.session = session
+        self.exchanges = []
+        self.lock = threading.Lock()
+        session.hooks['response'].append(self._record)
+
+    def _record(self, response, *args, **kwargs):
+        if hasattr(response.raw, 'headers') and hasattr(response.raw.headers, 'getlist'):
+            raw_headers = response.raw.headers
+        else:
+            raw_headers = None
+
+        # Read the body now so it can be recorded, then hand a fresh copy to anyone streaming the response
+        # requests still needs the original response to extract cookies after this hook runs
+        raw = response.raw
+        content = response.content
+        response.raw = io.BytesIO(content)
+        response.raw._original_response = getattr(raw, '_original_response', None)
+        if hasattr(raw, 'release_conn'):
+            raw.release_conn()
+
+        headers = {}
+        for name in RECORDED_RESPONSE_HEADERS:
+            values = raw_headers.getlist(name) if raw_headers is not None else ([response.headers[name]] if name in response.headers else [])
+            if values:
+                headers[name] = values
+
+        request_body = response.request.body
+        if isinstance(request_body, bytes):
+            request_body = request_body.decode('utf-8', errors='replace')
+
+        with self.lock:
+            self.exchanges.append({
+                'method': response.request.method,
+                'url': response.request.url,
+                'request_body': request_body,
+                'status': response.status_code,
+                'headers': headers,
+                'body': content.decode('utf-8', errors='replace'),
+            })
+
+    def _get_secrets(self):
+        """ Map of secret values to their scrubbed placeholders """
+        secrets = {}
+
+        for cookie in self.session.cookies:
+            secrets[cookie.value] = SCRUBBED_ACCOUNT_ID if cookie.name == 'c_user' else f'SCRUBBED_{cookie.name.upper()}'
+
+        for exchange in self.exchanges:
+            fields = parse_qs(exchange['request_body'] or '')
+            for name in SECRET_REQUEST_FIELDS:
+                for value in fields.get(name, []):
+                    secrets[value] = f'SCRUBBED_{name.upper()}'
+
+        # Secrets also appear url encoded in request bodies and urls
+        for secret, placeholder in list(secrets.items()):
+            secrets[quote_plus(secret)] = placeholder
+
+        return {secret: placeholder for secret, placeholder in secrets.items() if len(secret) >= MIN_SECRET_LENGTH}
+
+    def save(self, cassette_path):
+        """ Save all recorded exchanges with secrets scrubbed """
+        secrets = self._get_secrets()
+        regexp = re.compile('|'.join(re.escape(secret) for secret in sorted(secrets, key=len, reverse=True))) if secrets else None
+
+        def scrub(value):
+            if isinstance(value, str) and regexp:
+                return regexp.sub(lambda match: secrets[match[0]], value)
+            if isinstance(value, list):
+                return [scrub(item) for item in value]
+            if isinstance(value, dict):
+                return {key: scrub(item) for key, item in value.items()}
+            return value
+
+        with self.lock:
+            cassette = {'version': CASSETTE_VERSION, 'exchanges': scrub(self.exchanges)}
+
+        with open(cassette_path, mode='w', encoding='UTF-8') as cassette_file:
+            json.dump(cassette, cassette_file, indent=1, ensure_ascii=False)
+
+        self.logger.info(f'Saved {len(cassette["exchanges"])} recorded exchanges to {cassette_path}')
+
+""" Answer requests with the exchanges in a cassette, optionally simulating latency and larger friend lists """
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cassette, address=('127.0.0.1', 0), latency=0, jitter=0, payload_scale=1):
+        super().__init__(address, ReplayRequestHandler)
+        self.logger = Logger('fb2cal').getLogger()
+        self.latency = latency
+        self.jitter = jitter
+
+        # Later exchanges win if the same request was recorded more than once
+        self.exchanges = {}
+        for exchange in cassette['exchanges']:
+            if payload_scale > 1:
+                exchange = self._scale_payload(exchange, payload_scale)
+            self.exchanges[_exchange_key(exchange['method'], exchange['url'], exchange['request_body'])] = exchange
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _scale_payload(self, exchange, payload_scale):
+        """ Clone every friend in a BirthdayComet response payload_scale times (with unique ids) """
+        if not exchange['body'].startswith(ANTI_HIJACKING_PREFIX):
+            return exchange
+
+        try:
+            response_json = json.loads(exchange['body'][len(ANTI_HIJACKING_PREFIX):])
+            month_edges = response_json['data']['viewer']['all_friends_by_birthday_month']['edges']
+        except (ValueError, KeyError, TypeError):
+            return exchange
+
+        for month_edge in month_edges:
+            friend_edges = month_edge['node']['friends']['edges']
+            scaled_friend_edges = []
+            for i in range(payload_scale):
+                for friend_edge in friend_edges:
+                    friend_edge = copy.deepcopy(friend_edge)
+                    friend_edge['node']['id'] = f'{friend_edge["node"]["id"]}{i:04}'
+                    scaled_friend_edges.append(friend_edge)
+            month_edge['node']['friends']['edges'] = scaled_friend_edges
+
+        return {**exchange, 'body': ANTI_HIJACKING_PREFIX + json.dumps(response_json)}
+
+    def get_exchange(self, method, url, request_body):
+        return self.exchanges.get(_exchange_key(method, url, request_body))
+
+    def simulate_latency(self):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._replay()
+
+    def do_POST(self):
+        self._replay()
+
+    def _replay(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        request_body = self.rfile.read(content_length).decode('utf-8') if content_length else None
+
+        exchange = self.server.get_exchange(self.command, self.path, request_body)
+        self.server.simulate_latency()
+
+        if not exchange:
+            self._send(404, {'Content-Type': ['text/plain']}, f'No recorded exchange for {self.command} {self.path}')
+            return
+
+        self._send(exchange['status'], exchange['headers'], exchange['body'])
+
+    def _send(self, status, headers, body):
+        body = body.encode('utf-8')
+        self.send_response(status)
+
+        for name, values in headers.items():
+            for value in values:
+                if name == 'Location':
+                    # Keep redirects on the stand-in server
+                    location = urlsplit(value)
+                    value = location.path + (f'?{location.query}' if location.query else '') if location.netloc.endswith('facebook.com') else value
+                elif name == 'Set-Cookie':
+                    # Cookies were issued for facebook.com over https, make them stick to the stand-in server
+                    value = re.sub(r';\s*(domain=[^;]*|secure|samesite=[^;]*)(?=;|$)', '', value, flags=re.IGNORECASE)
+                self.send_header(name, value)
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(f'Replay server: {format % args}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded fb2cal cassette from a local Facebook stand-in server.')
+    parser.add_argument('cassette', help='Path to a cassette recorded with [DEVELOPMENT] record_cassette_path')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0, help='Seconds to wait before answering each request')
+    parser.add_argument('--jitter', type=float, default=0, help='Maximum random seconds added to or removed from the latency')
+    parser.add_argument('--payload-scale', type=int, default=1, help='Clone every friend in birthday responses this many times')
+    args = parser.parse_args()
+
+    server = ReplayServer(load_cassette(args.cassette), (args.host, args.port), args.latency, args.jitter, args.payload_scale)
+    print(f'Replaying {len(server.exchanges)} exchanges from {args.cassette} on {server.base_url}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
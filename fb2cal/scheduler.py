@@ -0,0 +1,41 @@
+import random
+import threading
+
+from .logger import Logger
+
+""" Repeatedly call refresh on an interval with random jitter until stopped """
+class RefreshScheduler:
+
+    def __init__(self, refresh, interval, jitter=0, retry_interval=None):
+        self.logger = Logger('fb2cal').getLogger()
+        self.refresh = refresh
+        self.interval = interval
+        self.jitter = jitter
+        self.retry_interval = retry_interval if retry_interval is not None else interval
+        self.stop_event = threading.Event()
+
+    def get_delay(self, succeeded=True):
+        """ Seconds to wait before the next refresh
+            Jitter spreads refreshes out so they do not always hit Facebook at the same time of day """
+        interval = self.interval if succeeded else self.retry_interval
+        return max(0, interval + random.uniform(-self.jitter, self.jitter))
+
+    def run(self):
+        """ Block until stop() is called, refreshing after every delay
+            A failed refresh is logged and retried after retry_interval instead of ending the loop """
+        succeeded = True
+        while True:
+            delay = self.get_delay(succeeded)
+            self.logger.info(f'Next refresh in {delay:.0f} seconds.')
+            if self.stop_event.wait(delay):
+                return
+
+            try:
+                self.refresh()
+                succeeded = True
+            except Exception:
+                self.logger.exception('Refresh failed.')
+                succeeded = False
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,100 @@
+import os
+import json
+
+from .logger import Logger
+
+SESSION_STORE_VERSION = 1
+SALT_LENGTH = 16
+NONCE_LENGTH = 12
+TAG_LENGTH = 16
+KEY_LENGTH = 32
+
+# scrypt cost parameters used to derive the encryption key from the secret
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+""" Persist authenticated session cookies to disk encrypted with a key derived from a secret """
+class SessionStore:
+
+    def __init__(self, session_file_path, secret):
+        self.logger = Logger('fb2cal').getLogger()
+        self.session_file_path = session_file_path
+        self.secret = secret
+
+    def _derive_key(self, salt):
+        from Cryptodome.Protocol.KDF import scrypt
+        return scrypt(self.secret.encode('utf-8'), salt, KEY_LENGTH, N=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+
+    def save(self, cookiejar):
+        """ Encrypt and save all cookies in cookiejar """
+
+        cookies = [{
+            'name': cookie.name,
+            'value': cookie.value,
+            'domain': cookie.domain,
+            'path': cookie.path,
+            'expires': cookie.expires,
+            'secure': cookie.secure,
+            'rest': cookie._rest,
+        } for cookie in cookiejar]
+
+        from Cryptodome import Random
+        from Cryptodome.Cipher import AES
+
+        salt = Random.get_random_bytes(SALT_LENGTH)
+        nonce = Random.get_random_bytes(NONCE_LENGTH)
+        aes = AES.new(self._derive_key(salt), AES.MODE_GCM, nonce=nonce, mac_len=TAG_LENGTH)
+        ciphertext, tag = aes.encrypt_and_digest(json.dumps(cookies).encode('utf-8'))
+
+        if os.path.dirname(self.session_file_path) and not os.path.exists(os.path.dirname(self.session_file_path)):
+            os.makedirs(os.path.dirname(self.session_file_path), exist_ok=True)
+
+        # Session cookies are as good as a password so keep the file private to the current user
+        fd = os.open(self.session_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, mode='wb') as session_file:
+            session_file.write(bytes([SESSION_STORE_VERSION]) + salt + nonce + tag + ciphertext)
+
+        self.logger.debug(f'Saved {len(cookies)} session cookies to {os.path.abspath(self.session_file_path)}')
+
+    def load(self):
+        """ Load and decrypt saved cookies, returns None if there is no usable saved session """
+
+        if not os.path.exists(self.session_file_path):
+            return None
+
+        with open(self.session_file_path, mode='rb') as session_file:
+            data = session_file.read()
+
+        header_length = 1 + SALT_LENGTH + NONCE_LENGTH + TAG_LENGTH
+        if len(data) < header_length or data[0] != SESSION_STORE_VERSION:
+            self.logger.warning(f'Ignoring saved session with unknown format at {self.session_file_path}.')
+            return None
+
+        from Cryptodome.Cipher import AES
+        import requests
+
+        salt = data[1:1 + SALT_LENGTH]
+        nonce = data[1 + SALT_LENGTH:1 + SALT_LENGTH + NONCE_LENGTH]
+        tag = data[1 + SALT_LENGTH + NONCE_LENGTH:header_length]
+        ciphertext = data[header_length:]
+
+        try:
+            aes = AES.new(self._derive_key(salt), AES.MODE_GCM, nonce=nonce, mac_len=TAG_LENGTH)
+            cookies = json.loads(aes.decrypt_and_verify(ciphertext, tag))
+        except ValueError:
+            self.logger.warning(f'Failed to decrypt saved session at {self.session_file_path}. Credentials may have changed.')
+            return None
+
+        cookiejar = requests.cookies.RequestsCookieJar()
+        for cookie in cookies:
+            cookie = requests.cookies.create_cookie(**cookie)
+            if not cookie.is_expired():
+                cookiejar.set_cookie(cookie)
+
+        return cookiejar
+
+    def clear(self):
+        """ Remove the saved session """
+        if os.path.exists(self.session_file_path):
+            os.remove(self.session_file_path)
@@ -0,0 +1,56 @@
+import os
+import json
+import time
+import threading
+
+from .logger import Logger
+
+""" Cache fb_dtsg tokens on disk per Facebook account so they survive restarts """
+class TokenCache:
+
+    def __init__(self, token_cache_file_path, ttl):
+        self.logger = Logger('fb2cal').getLogger()
+        self.token_cache_file_path = token_cache_file_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.token_cache_file_path):
+            return {}
+
+        try:
+            with open(self.token_cache_file_path, mode='r', encoding='UTF-8') as token_cache_file:
+                return json.load(token_cache_file)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Ignoring unreadable token cache at {self.token_cache_file_path}: {e}')
+            return {}
+
+    def _write(self, tokens):
+        if os.path.dirname(self.token_cache_file_path) and not os.path.exists(os.path.dirname(self.token_cache_file_path)):
+            os.makedirs(os.path.dirname(self.token_cache_file_path), exist_ok=True)
+
+        fd = os.open(self.token_cache_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, mode='w', encoding='UTF-8') as token_cache_file:
+            json.dump(tokens, token_cache_file)
+
+    def get(self, account_id):
+        """ Get the cached token for account_id, returns None if there is none or it is older than the TTL """
+        with self.lock:
+            entry = self._read().get(account_id)
+
+        if not entry or time.time() - entry['fetched_at'] > self.ttl:
+            return None
+
+        return entry['token']
+
+    def set(self, account_id, token):
+        with self.lock:
+            tokens = self._read()
+            tokens[account_id] = {'token': token, 'fetched_at': time.time()}
+            self._write(tokens)
+
+    def invalidate(self, account_id):
+        with self.lock:
+            tokens = self._read()
+            if tokens.pop(account_id, None) is not None:
+                self._write(tokens)
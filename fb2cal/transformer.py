@@ -1,26 +1,110 @@
+from .logger import Logger
 from .facebook_user import FacebookUser
 
+# Errors raised by subscripting a node that does not have the expected shape
+MALFORMED_NODE_ERRORS = (LookupError, TypeError, AttributeError)
+
+# Locations of BirthdayCometMonthlyBirthdaysRefetchQuery nodes reported for malformed nodes
+BIRTHDAY_COMET_MONTHLY_MONTH_LOCATION = 'data.viewer.all_friends_by_birthday_month.edges[]'
+BIRTHDAY_COMET_MONTHLY_FRIEND_LOCATION = 'data.viewer.all_friends_by_birthday_month.edges[].node.friends.edges[]'
+
+def extract_birthday_comet_monthly_friends(birthday_comet_root_json, skip):
+    """ Yields (id, name, profile_url, profile_picture_uri, birthday_day, birthday_month, birthday_year) for every friend
+        in a BirthdayCometMonthlyBirthdaysRefetchQuery response, birthday_year is None when it is not visible
+        Month and friend nodes that do not have the expected shape are left out and reported with skip(location, error),
+        a response without the list of months raises one of MALFORMED_NODE_ERRORS """
+    for month_edge in birthday_comet_root_json['data']['viewer']['all_friends_by_birthday_month']['edges']:
+        try:
+            friend_edges = iter(month_edge['node']['friends']['edges'])
+        except MALFORMED_NODE_ERRORS as e:
+            skip(BIRTHDAY_COMET_MONTHLY_MONTH_LOCATION, e)
+            continue
+
+        for friend_edge in friend_edges:
+            try:
+                friend = friend_edge['node']
+                birthdate = friend['birthdate']
+                friend_record = (friend['id'], friend['name'], friend['profile_url'], friend['profile_picture']['uri'], birthdate['day'], birthdate['month'], birthdate.get('year'))
+            except MALFORMED_NODE_ERRORS as e:
+                skip(BIRTHDAY_COMET_MONTHLY_FRIEND_LOCATION, e)
+                continue
+            yield friend_record
+
+# month_name_in_iso8601 values in calendar order
+MONTH_NAMES = ('January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December')
+
 class Transformer:
 
+    def __init__(self):
+        self.logger = Logger('fb2cal').getLogger()
+        self.malformed_nodes = 0
+
     def transform_birthday_comet_monthly_to_birthdays(self, birthday_comet_root_json):
         """ Transforms outfrom from BirthdayCometMonthlyBirthdaysRefetchQuery to list of Birthdays """
+        return list(self.iter_birthday_comet_monthly_birthdays(birthday_comet_root_json))
 
-        facebook_users = []
+    def iter_birthday_comet_monthly_birthdays(self, birthday_comet_root_json):
+        """ Yields the Birthdays in output from BirthdayCometMonthlyBirthdaysRefetchQuery one at a time without building a list """
+        for friend_record in self.iter_birthday_comet_monthly_friend_records(birthday_comet_root_json):
+            yield FacebookUser(*friend_record)
 
-        for all_friends_by_birthday_month_edge in birthday_comet_root_json['data']['viewer']['all_friends_by_birthday_month']['edges']:
-            for friend_edge in all_friends_by_birthday_month_edge['node']['friends']['edges']:
-                friend = friend_edge['node']
-                
-                # Create Birthday object
-                facebook_users.append(
-                    FacebookUser(
-                        friend["id"],
-                        friend["name"],
-                        friend["profile_url"],
-                        friend["profile_picture"]["uri"],
-                        friend["birthdate"]["day"],
-                        friend["birthdate"]["month"],
-                        friend["birthdate"]["year"]
-                ))
-                
-        return facebook_users
\ No newline at end of file
+    def iter_birthday_comet_monthly_friend_records(self, birthday_comet_root_json):
+        """ Yields (id, name, profile_url, profile_picture_uri, birthday_day, birthday_month, birthday_year) for every friend
+            in output from BirthdayCometMonthlyBirthdaysRefetchQuery, see extract_birthday_comet_monthly_friends
+            Malformed month and friend nodes are skipped with a warning and counted in malformed_nodes """
+        skipped = []
+
+        try:
+            yield from extract_birthday_comet_monthly_friends(birthday_comet_root_json, lambda location, error: skipped.append((location, error)))
+        except MALFORMED_NODE_ERRORS as e:
+            self.logger.error(f'Unexpected BirthdayCometMonthlyBirthdaysRefetchQuery response without a list of months ({type(e).__name__}: {e}).')
+            raise SystemError
+
+        if skipped:
+            self.malformed_nodes += len(skipped)
+            location, error = skipped[0]
+            self.logger.warning(f'Skipped {len(skipped)} malformed nodes in BirthdayCometMonthlyBirthdaysRefetchQuery response, first at {location} ({type(error).__name__}: {error}).')
+
+    def _get_birthday_comet_monthly_month_edges(self, birthday_comet_root_json):
+        try:
+            return birthday_comet_root_json['data']['viewer']['all_friends_by_birthday_month']['edges']
+        except MALFORMED_NODE_ERRORS:
+            return []
+
+    def get_birthday_comet_monthly_month_offsets(self, birthday_comet_root_json, first_month=None):
+        """ Returns how many months each month in output from BirthdayCometMonthlyBirthdaysRefetchQuery comes after first_month (1-12),
+            by default the first month of the response, in response order
+            Months are placed by their month_name_in_iso8601 rather than their position, as months may be left out of a response
+            (such as months without birthdays). Months without a known name are None """
+        month_offsets = []
+        first_month_index = first_month - 1 if first_month is not None else None
+
+        for month_edge in self._get_birthday_comet_monthly_month_edges(birthday_comet_root_json):
+            try:
+                month_index = MONTH_NAMES.index(month_edge['node']['month_name_in_iso8601'])
+            except (ValueError, *MALFORMED_NODE_ERRORS):
+                month_offsets.append(None)
+                continue
+
+            if first_month_index is None:
+                first_month_index = month_index
+            month_offsets.append((month_index - first_month_index) % len(MONTH_NAMES))
+
+        return month_offsets
+
+    def get_birthday_comet_monthly_next_cursors(self, birthday_comet_root_json, first_month=None):
+        """ Returns {month offset: end_cursor} for every month in output from BirthdayCometMonthlyBirthdaysRefetchQuery
+            whose friends did not all fit in the response, see get_birthday_comet_monthly_month_offsets
+            Such a month without a known name is under None """
+        next_cursors = {}
+        month_edges = self._get_birthday_comet_monthly_month_edges(birthday_comet_root_json)
+
+        for month_offset, month_edge in zip(self.get_birthday_comet_monthly_month_offsets(birthday_comet_root_json, first_month), month_edges):
+            try:
+                page_info = month_edge['node']['friends']['page_info']
+                if page_info['has_next_page'] and page_info['end_cursor']:
+                    next_cursors[month_offset] = page_info['end_cursor']
+            except MALFORMED_NODE_ERRORS:
+                continue
+
+        return next_cursors
@@ -1,11 +1,9 @@
+import io
 import base64
 import struct
 import datetime
 import binascii
-
-from Cryptodome import Random
-from Cryptodome.Cipher import AES
-from nacl.public import PublicKey, SealedBox
+import codecs
 
 from .facebook_user import FacebookUser
 
@@ -16,8 +14,58 @@ def generate_facebook_profile_url_permalink(facebook_user: FacebookUser):
 
 # Facebook prepends an infinite while loop to their API responses as anti hijacking protection
 # It must be stripped away before parsing a response as JSON
+ANTI_HIJACKING_PREFIX = 'for (;;);'
+
 def remove_anti_hijacking_protection(text: str):
-    return text.removeprefix("for (;;);")
+    return text.removeprefix(ANTI_HIJACKING_PREFIX)
+
+# Same as remove_anti_hijacking_protection but for raw response bytes, returns a view so the body is not copied
+def remove_anti_hijacking_protection_bytes(content: bytes):
+    prefix = ANTI_HIJACKING_PREFIX.encode('utf-8')
+    view = memoryview(content)
+    return view[len(prefix):] if content.startswith(prefix) else view
+
+# Same as remove_anti_hijacking_protection but for a buffered binary stream, the prefix is consumed if present
+def skip_anti_hijacking_protection(stream: io.BufferedReader):
+    prefix = ANTI_HIJACKING_PREFIX.encode('utf-8')
+    if stream.peek(len(prefix))[:len(prefix)] == prefix:
+        stream.read(len(prefix))
+    return stream
+
+# Search a streamed HTTP response for each of the given compiled regexps, returning their matches (or None) in order
+# Reading stops and the connection is closed as soon as every regexp has matched so the rest of the body is never downloaded
+# Only the last `overlap` characters of previously read text are kept so matches spanning chunk boundaries are still found
+# If an incremental parser (such as FormParser) is given, the text is also fed to it and reading continues until it is complete
+def search_response_stream(response, regexps, chunk_size=16384, overlap=4096, parser=None):
+    matches = [None] * len(regexps)
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    tail = ''
+
+    def search(decoded):
+        if parser:
+            parser.feed(decoded)
+
+        text = tail + decoded
+        for i, regexp in enumerate(regexps):
+            if matches[i] is None:
+                matches[i] = regexp.search(text)
+
+        return text
+
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            text = search(decoder.decode(chunk))
+
+            if all(matches) and (parser is None or parser.complete):
+                break
+
+            tail = text[-overlap:]
+        else:
+            search(decoder.decode(b'', final=True))
+    finally:
+        response.close()
+
+    return matches
 
 # Encryption used on plain text passwords before they are sent to Facebook.
 # This function uses the #PWD_BROWSER type which is for Facebook Web requests.
@@ -26,6 +74,11 @@ def remove_anti_hijacking_protection(text: str):
 #
 # TODO: Avoid hardcoding the version 5 (instagram has: https://www.instagram.com/data/shared_data/)
 def facebook_web_encrypt_password(key_id, pub_key, password, version=5):
+    # The crypto libraries take a while to import and are only needed when logging in
+    from Cryptodome import Random
+    from Cryptodome.Cipher import AES
+    from nacl.public import PublicKey, SealedBox
+
     key = Random.get_random_bytes(32)
     iv = bytes([0] * 12)
 
@@ -39,6 +39,11 @@ setup(
         'pycryptodomex',
         'PyNaCl',
     ],
+    extras_require={
+        'streaming': ['ijson>=3.1'],
+        'fast-json': ['orjson'],
+        'brotli': ['brotli'],
+    },
     long_description=read('README.md', __github_url__, __github_assets_absolute_url__),
     long_description_content_type='text/markdown',
     classifiers=[
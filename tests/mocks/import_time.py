@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+import subprocess
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Dependencies that should only be imported once the stage that needs them starts
+HEAVY_MODULES = ('mechanicalsoup', 'bs4', 'requests', 'ics', 'dateutil', 'Cryptodome', 'nacl', 'ijson')
+
+def measure_import_time(code):
+    """ Returns {module: (self microseconds, cumulative microseconds)} for every module imported by running code
+        in a fresh interpreter, as reported by python -X importtime """
+    with tempfile.TemporaryDirectory() as temp_dir: # fb2cal creates its log folder in the working directory
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=temp_dir,
+            env={**os.environ, 'PYTHONPATH': ROOT_DIR},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    import_times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative_time, name = line[len('import time:'):].split('|')
+        import_times[name.strip()] = (int(self_time), int(cumulative_time))
+
+    return import_times
@@ -0,0 +1,87 @@
+import json
+
+from mocks.birthday_comet_root_mocks import BIRTHDAY_COMET_ROOT_JANUARY_MOCK
+
+LOGIN_PAGE_MOCK = """<!DOCTYPE html><html><head><script>
+requireLazy(["ServerJS"],function(s){s.handle({"define":[["_js_datr","Xb8nZm4kQ1dFhM3Y0hBtR9aP",[]]]});});
+</script></head><body>
+<form id="login_form" action="/login/device-based/regular/login/?login_attempt=1&amp;lwv=100" method="post">
+<input type="hidden" name="jazoest" value="2912" autocomplete="off" />
+<input type="hidden" name="lsd" value="AVqgKbu1c5A" autocomplete="off" />
+<input type="text" name="email" id="email" />
+<input type="password" name="pass" id="pass" />
+<button value="1" name="login" id="loginbutton" type="submit">Log In</button>
+</form>
+<script>{"pubKey":{"publicKey":"0aad9e2be883cae2dfaed975610bb81b7e48280b58e73743daaceff080586973","keyId":212}}</script>
+</body></html>"""
+
+BIRTHDAY_EVENT_PAGE_MOCK = """<!DOCTYPE html><html><head><script>
+{"require":[["ServerJS"]],"define":[["DTSGInitialData",[],{"token":"NAcMc0aFGtoKen:17:1700000000"},258]]}
+</script></head><body></body></html>"""
+
+def graph_ql_birthday_comet_monthly_exchange(offset_month, cursor=None, response_json=BIRTHDAY_COMET_ROOT_JANUARY_MOCK):
+    variables = {'offset_month': offset_month, 'scale': 1.5}
+    if cursor is not None:
+        variables['cursor'] = cursor
+
+    return {
+        'method': 'POST',
+        'url': 'https://www.facebook.com/api/graphql/',
+        'request_body': f'fb_api_req_friendly_name=BirthdayCometMonthlyBirthdaysRefetchQuery&variables={json.dumps(variables)}&doc_id=5347559575302259&fb_dtsg=SCRUBBED_FB_DTSG&__a=1',
+        'status': 200,
+        'headers': {'Content-Type': ['text/html; charset="utf-8"']},
+        'body': 'for (;;);' + json.dumps(response_json),
+    }
+
+REPLAY_CASSETTE_MOCK = {
+    'version': 1,
+    'exchanges': [
+        {
+            'method': 'GET',
+            'url': 'https://www.facebook.com/login',
+            'request_body': None,
+            'status': 200,
+            'headers': {'Content-Type': ['text/html; charset="utf-8"']},
+            'body': LOGIN_PAGE_MOCK,
+        },
+        {
+            'method': 'POST',
+            'url': 'https://www.facebook.com/login/device-based/regular/login/?login_attempt=1&lwv=100',
+            'request_body': 'jazoest=2912&lsd=AVqgKbu1c5A&email=SCRUBBED_EMAIL&pass=&login=1&encpass=SCRUBBED_ENCPASS',
+            'status': 302,
+            'headers': {
+                'Location': ['https://www.facebook.com/'],
+                'Set-Cookie': [
+                    'c_user=100000000000000; expires=Sat, 17-Oct-2027 10:00:00 GMT; Max-Age=31536000; path=/; domain=.facebook.com; secure; SameSite=None',
+                    'xs=SCRUBBED_XS; expires=Sat, 17-Oct-2027 10:00:00 GMT; Max-Age=31536000; path=/; domain=.facebook.com; secure; httponly; SameSite=None',
+                ],
+            },
+            'body': '',
+        },
+        {
+            'method': 'GET',
+            'url': 'https://www.facebook.com/',
+            'request_body': None,
+            'status': 200,
+            'headers': {'Content-Type': ['text/html; charset="utf-8"']},
+            'body': '<!DOCTYPE html><html><body>Home</body></html>',
+        },
+        {
+            'method': 'GET',
+            'url': 'https://www.facebook.com/me',
+            'request_body': None,
+            'status': 302,
+            'headers': {'Location': ['https://www.facebook.com/profile.php?id=100000000000000']},
+            'body': '',
+        },
+        {
+            'method': 'GET',
+            'url': 'https://www.facebook.com/events/birthdays/',
+            'request_body': None,
+            'status': 200,
+            'headers': {'Content-Type': ['text/html; charset="utf-8"']},
+            'body': BIRTHDAY_EVENT_PAGE_MOCK,
+        },
+        *[graph_ql_birthday_comet_monthly_exchange(offset_month) for offset_month in [0, 3, 6, 9]],
+    ]
+}
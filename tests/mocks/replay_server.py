@@ -0,0 +1,25 @@
+import threading
+
+from fb2cal.facebook_browser import FacebookBrowser
+from fb2cal.replay import ReplayServer
+
+from mocks.replay_cassette_mocks import REPLAY_CASSETTE_MOCK
+
+""" TestCase mixin for tests that talk to a local ReplayServer instead of Facebook """
+class ReplayServerMixin:
+
+    def start_replay_server(self, cassette=REPLAY_CASSETTE_MOCK):
+        """ Start serving cassette, the server is stopped once the test finishes """
+        server = ReplayServer(cassette)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # Cleanups run last in first out, shutdown stops serve_forever before the socket is closed
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def create_replay_facebook_browser(self, cassette=REPLAY_CASSETTE_MOCK, **kwargs):
+        """ FacebookBrowser authenticated against a new replay server for cassette, kwargs are passed on to FacebookBrowser """
+        server = self.start_replay_server(cassette)
+        facebook_browser = FacebookBrowser(base_url=server.base_url, **kwargs)
+        facebook_browser.authenticate('user@example.com', 'hunter2-password')
+        return facebook_browser
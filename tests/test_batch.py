@@ -0,0 +1,78 @@
+import os
+import json
+import tempfile
+import unittest
+import configparser
+
+from fb2cal.batch import get_account_names, get_account_config, run_batch
+
+from mocks.replay_server import ReplayServerMixin
+
+class TestBatch(ReplayServerMixin, unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config = configparser.RawConfigParser()
+        self.config.read_dict({
+            'SESSION': {'persist_session': 'True', 'cache_token': 'False'},
+            'FILESYSTEM': {'save_to_file': 'True', 'ics_file_path': './out/birthdays.ics'},
+            'BATCH': {'max_workers': '2', 'report_path': os.path.join(self.temp_dir.name, 'report.json')},
+            'ACCOUNT alice': {'fb_email': 'alice@example.com', 'fb_pass': 'alice-password'},
+            'ACCOUNT bob': {'fb_email': 'bob@example.com', 'fb_pass': 'bob-password', 'ics_file_path': os.path.join(self.temp_dir.name, 'bob.ics'), 'session_file_path': os.path.join(self.temp_dir.name, 'bob.bin')},
+        })
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_get_account_names(self):
+        self.assertEqual(get_account_names(self.config), ['alice', 'bob'])
+
+    def test_get_account_config(self):
+        alice_config = get_account_config(self.config, 'alice')
+        bob_config = get_account_config(self.config, 'bob')
+
+        self.assertEqual(alice_config['AUTH']['fb_email'], 'alice@example.com')
+        self.assertEqual(alice_config['FILESYSTEM']['ics_file_path'], './out/alice.ics')
+        self.assertEqual(alice_config['SESSION']['session_file_path'], './cache/alice/session.bin')
+        self.assertEqual(alice_config['SESSION']['token_cache_file_path'], './cache/alice/tokens.json')
+        self.assertEqual(alice_config['SESSION']['persist_session'], 'True')
+        self.assertFalse(any(section.startswith('ACCOUNT') for section in alice_config.sections()))
+
+        self.assertEqual(bob_config['AUTH']['fb_pass'], 'bob-password')
+        self.assertEqual(bob_config['FILESYSTEM']['ics_file_path'], os.path.join(self.temp_dir.name, 'bob.ics'))
+        self.assertEqual(bob_config['SESSION']['session_file_path'], os.path.join(self.temp_dir.name, 'bob.bin'))
+
+        # Shared config is left untouched
+        self.assertEqual(self.config['FILESYSTEM']['ics_file_path'], './out/birthdays.ics')
+
+    def test_run_batch(self):
+        server = self.start_replay_server()
+
+        # The ICS file of carol can not be created as its directory is a file
+        blocking_file_path = os.path.join(self.temp_dir.name, 'blocked')
+        open(blocking_file_path, 'w').close()
+
+        self.config.read_dict({
+            'DEVELOPMENT': {'facebook_base_url': server.base_url},
+            'ACCOUNT alice': {'ics_file_path': os.path.join(self.temp_dir.name, 'alice.ics'), 'session_file_path': os.path.join(self.temp_dir.name, 'alice.bin')},
+            'ACCOUNT carol': {'fb_email': 'carol@example.com', 'fb_pass': 'carol-password', 'ics_file_path': os.path.join(blocking_file_path, 'carol.ics'), 'session_file_path': os.path.join(self.temp_dir.name, 'carol.bin')},
+        })
+
+        results = run_batch(self.config)
+
+        self.assertEqual([result['account'] for result in results], ['alice', 'bob', 'carol'])
+        self.assertEqual([result['succeeded'] for result in results], [True, True, False])
+        self.assertEqual([result['birthdays'] for result in results], [3, 3, 3])
+        self.assertIn('NotADirectoryError', results[2]['error'])
+
+        for account_name in ['alice', 'bob']:
+            self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, f'{account_name}.ics')))
+            self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, f'{account_name}.bin')))
+
+        with open(os.path.join(self.temp_dir.name, 'report.json'), mode='r', encoding='UTF-8') as report_file:
+            self.assertEqual(json.load(report_file), results)
+
+    def test_run_batch_without_accounts(self):
+        self.config.remove_section('ACCOUNT alice')
+        self.config.remove_section('ACCOUNT bob')
+        with self.assertRaises(SystemError):
+            run_batch(self.config)
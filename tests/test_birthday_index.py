@@ -0,0 +1,47 @@
+import unittest
+from datetime import date
+
+from fb2cal.birthday_index import BirthdayIndex
+from fb2cal.facebook_user import FacebookUser
+
+class TestBirthdayIndex(unittest.TestCase):
+    def setUp(self):
+        self.facebook_users = [
+            FacebookUser('1', 'New Year', None, None, 1, 1, None),
+            FacebookUser('2', 'Leap Day', None, None, 29, 2, 1996),
+            FacebookUser('3', 'Bob Jones', None, None, 1, 3, None),
+            FacebookUser('4', 'Alice Jones', None, None, 1, 3, 1980),
+            FacebookUser('5', 'Santa Claus', None, None, 25, 12, None),
+            FacebookUser('6', 'Alice Jones', None, None, 1, 3, None),
+        ]
+        self.birthday_index = BirthdayIndex(self.facebook_users)
+
+    def get_upcoming_ids(self, days, start_date):
+        return [facebook_user.id for facebook_user in self.birthday_index.get_upcoming(days, start_date)]
+
+    def test_sort_order(self):
+        self.assertEqual([facebook_user.id for facebook_user in sorted(self.facebook_users)], ['1', '2', '4', '6', '3', '5'])
+        self.assertLess(self.facebook_users[0], self.facebook_users[4])
+        self.assertFalse(self.facebook_users[4] < self.facebook_users[0])
+
+    def test_get_upcoming(self):
+        self.assertEqual(self.get_upcoming_ids(1, date(2021, 3, 1)), ['4', '6', '3'])
+        self.assertEqual(self.get_upcoming_ids(60, date(2021, 1, 1)), ['1', '2', '4', '6', '3'])
+        self.assertEqual(self.get_upcoming_ids(59, date(2021, 1, 1)), ['1', '2'])
+        self.assertEqual(self.get_upcoming_ids(58, date(2021, 1, 1)), ['1'])
+        self.assertEqual(self.get_upcoming_ids(0, date(2021, 1, 1)), [])
+
+    def test_get_upcoming_leap_year(self):
+        self.assertEqual(self.get_upcoming_ids(59, date(2020, 1, 1)), ['1'])
+        self.assertEqual(self.get_upcoming_ids(60, date(2020, 1, 1)), ['1', '2'])
+        self.assertEqual(self.get_upcoming_ids(1, date(2020, 3, 1)), ['4', '6', '3'])
+
+    def test_get_upcoming_next_year(self):
+        self.assertEqual(self.get_upcoming_ids(10, date(2021, 12, 24)), ['5', '1'])
+        self.assertEqual(self.get_upcoming_ids(365, date(2021, 3, 2)), ['5', '1', '2', '4', '6', '3'])
+        self.assertEqual(self.get_upcoming_ids(366, date(2021, 3, 2)), ['1', '2', '4', '6', '3', '5'])
+
+    def test_unknown_birthday(self):
+        birthday_index = BirthdayIndex([FacebookUser('7', 'Private', None, None, None, None, None)])
+        self.assertEqual(len(birthday_index), 0)
+        self.assertEqual(birthday_index.get_upcoming(366), [])
@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+import threading
+import unittest
+from http.client import HTTPConnection
+
+from fb2cal.calendar_server import CalendarServer, parse_duration_seconds, parse_accept_encoding, brotli
+
+CALENDAR_MOCK = b'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nEND:VCALENDAR\r\n'
+
+class TestCalendarServer(unittest.TestCase):
+    def setUp(self):
+        self.server = CalendarServer(('127.0.0.1', 0))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request(self, method='GET', path='/birthdays.ics', headers=None):
+        connection = HTTPConnection(*self.server.server_address[:2])
+        try:
+            connection.request(method, path, headers=headers or {})
+            response = connection.getresponse()
+            return response, response.read()
+        finally:
+            connection.close()
+
+    def test_parse_duration_seconds(self):
+        self.assertEqual(parse_duration_seconds('PT12H'), 43200)
+        self.assertEqual(parse_duration_seconds('P1DT30M'), 88200)
+        self.assertEqual(parse_duration_seconds('P1W'), 604800)
+        with self.assertRaises(ValueError):
+            parse_duration_seconds('12 hours')
+
+    def test_parse_accept_encoding(self):
+        self.assertEqual(parse_accept_encoding('gzip, deflate;q=0.5, br;q=0'), {'gzip', 'deflate'})
+        self.assertEqual(parse_accept_encoding(None), set())
+
+    def test_not_generated_yet(self):
+        response, _ = self.request()
+        self.assertEqual(response.status, 503)
+
+    def test_not_found(self):
+        self.server.update(CALENDAR_MOCK)
+        response, _ = self.request(path='/other.ics')
+        self.assertEqual(response.status, 404)
+
+    def test_get_and_conditional_get(self):
+        self.assertTrue(self.server.update(CALENDAR_MOCK))
+        self.assertFalse(self.server.update(CALENDAR_MOCK))
+
+        response, body = self.request()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, CALENDAR_MOCK)
+        self.assertEqual(response.getheader('Content-Type'), 'text/calendar; charset=utf-8')
+        self.assertEqual(response.getheader('Cache-Control'), 'public, max-age=43200')
+        self.assertIsNone(response.getheader('Content-Encoding'))
+        etag = response.getheader('ETag')
+        self.assertEqual(etag, f'"{hashlib.sha256(CALENDAR_MOCK).hexdigest()}"')
+
+        response, body = self.request(headers={'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b'')
+        self.assertEqual(response.getheader('ETag'), etag)
+
+        # A new calendar invalidates the old ETag
+        self.server.update(CALENDAR_MOCK.replace(b'2.0', b'2.1'))
+        response, _ = self.request(headers={'If-None-Match': etag})
+        self.assertEqual(response.status, 200)
+
+    def test_gzip(self):
+        self.server.update(CALENDAR_MOCK)
+        response, body = self.request(headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+        self.assertEqual(response.getheader('Vary'), 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body), CALENDAR_MOCK)
+
+        # Each encoding has its own strong ETag, any of them means the client is up to date
+        etag = response.getheader('ETag')
+        self.assertTrue(etag.endswith('-gzip"'))
+        response, _ = self.request(headers={'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+
+    @unittest.skipUnless(brotli, 'brotli is not installed')
+    def test_brotli(self):
+        self.server.update(CALENDAR_MOCK)
+        response, body = self.request(headers={'Accept-Encoding': 'gzip, br'})
+
+        self.assertEqual(response.getheader('Content-Encoding'), 'br')
+        self.assertEqual(brotli.decompress(body), CALENDAR_MOCK)
+
+    def test_head(self):
+        self.server.update(CALENDAR_MOCK)
+        response, body = self.request(method='HEAD')
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Content-Length'), str(len(CALENDAR_MOCK)))
+        self.assertEqual(body, b'')
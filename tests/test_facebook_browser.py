@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from fb2cal.facebook_browser import FacebookBrowser
+from fb2cal.rate_limiter import RateLimiter
+
+class TestFacebookBrowser(unittest.TestCase):
+    def setUp(self):
+        self.facebook_browser = FacebookBrowser()
+
+    def test_query_graph_ql_birthday_comet_monthly_concurrently(self):
+        with patch.object(FacebookBrowser, 'get_token', return_value='token') as get_token, \
+             patch.object(FacebookBrowser, 'query_graph_ql_birthday_comet_monthly', side_effect=lambda offset_month: {'offset_month': offset_month}):
+            responses = dict(self.facebook_browser.query_graph_ql_birthday_comet_monthly_concurrently([0, 3, 6, 9]))
+
+        get_token.assert_called_once()
+        self.assertEqual(sorted(responses), [0, 3, 6, 9])
+        for offset_month, response_json in responses.items():
+            self.assertEqual(response_json['offset_month'], offset_month)
+
+    def test_query_graph_ql_birthday_comet_monthly_retries_invalid_token(self):
+        responses = [
+            Mock(status_code=200, content=b'for (;;);{"error":1357004,"errorSummary":"Sorry, something went wrong","errorDescription":"Please try closing and re-opening your browser window."}'),
+            Mock(status_code=200, content=b'for (;;);{"data":{}}'),
+        ]
+        with patch.object(FacebookBrowser, 'get_token', side_effect=['stale-token', 'fresh-token']), \
+             patch.object(FacebookBrowser, 'invalidate_token') as invalidate_token, \
+             patch.object(self.facebook_browser.browser.session, 'post', side_effect=responses) as post:
+            response_json = self.facebook_browser.query_graph_ql_birthday_comet_monthly(0)
+
+        invalidate_token.assert_called_once()
+        self.assertEqual(post.call_args.kwargs['data']['fb_dtsg'], 'fresh-token')
+        self.assertEqual(response_json, {'data': {}})
+
+    def test_query_graph_ql_birthday_comet_monthly_retries_transient_error(self):
+        facebook_browser = FacebookBrowser(rate_limiter=RateLimiter(max_retries=1))
+        responses = [
+            Mock(status_code=200, content=b'for (;;);{"error":1675004,"errorSummary":"Rate limit exceeded","errorDescription":"Please try again later."}'),
+            Mock(status_code=200, content=b'for (;;);{"error":1675004,"errorSummary":"Rate limit exceeded","errorDescription":"Please try again later."}'),
+        ]
+        with patch.object(FacebookBrowser, 'get_token', return_value='token'), \
+             patch.object(facebook_browser.browser.session, 'post', side_effect=responses) as post, \
+             patch('time.sleep') as sleep:
+            with self.assertRaises(SystemError):
+                facebook_browser.query_graph_ql_birthday_comet_monthly(0)
+
+        self.assertEqual(post.call_count, 2)
+        sleep.assert_called_once()
+        self.assertEqual(facebook_browser.rate_limiter.get_counters()['retries'], 1)
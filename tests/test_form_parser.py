@@ -0,0 +1,55 @@
+import unittest
+
+from fb2cal.form_parser import FormParser
+
+LOGIN_PAGE_HTML = """<html><body>
+<form id="search_form" action="/search/"><input name="q" value="ignored"></form>
+<form id="login_form" action="/login/device-based/regular/login/?login_attempt=1&amp;lwv=100" method="post">
+<input type="hidden" name="jazoest" value="2912" autocomplete="off" />
+<input type="hidden" name="lsd" value="AVqgKbu1" autocomplete="off">
+<input type="text" class="inputtext" name="email" id="email" />
+<input type="password" name="pass" id="pass" />
+<input type="checkbox" name="persistent" value="1" />
+<input type="checkbox" name="default_persistent" value="0" checked />
+<button value="1" name="login" id="loginbutton" type="submit">Log In</button>
+<input type="submit" name="other_submit" value="Other" />
+<input type="button" name="button" value="Button" />
+</form>
+<form id="signup_form"><input name="firstname"></form>
+</body></html>"""
+
+class TestFormParser(unittest.TestCase):
+    def setUp(self):
+        self.form_parser = FormParser('login_form')
+
+    def test_parse(self):
+        self.form_parser.feed(LOGIN_PAGE_HTML)
+        self.assertTrue(self.form_parser.found)
+        self.assertTrue(self.form_parser.complete)
+        self.assertEqual(self.form_parser.action, '/login/device-based/regular/login/?login_attempt=1&lwv=100')
+        self.assertEqual(self.form_parser.method, 'post')
+        self.assertEqual(self.form_parser.fields, {
+            'jazoest': '2912',
+            'lsd': 'AVqgKbu1',
+            'email': '',
+            'pass': '',
+            'default_persistent': '0',
+            'login': '1',
+        })
+
+    def test_parse_incrementally(self):
+        for i in range(0, len(LOGIN_PAGE_HTML), 7):
+            self.form_parser.feed(LOGIN_PAGE_HTML[i:i + 7])
+        self.assertEqual(self.form_parser.fields['lsd'], 'AVqgKbu1')
+        self.assertEqual(self.form_parser.fields['login'], '1')
+
+    def test_incomplete(self):
+        self.form_parser.feed(LOGIN_PAGE_HTML[:LOGIN_PAGE_HTML.index('<button')])
+        self.assertTrue(self.form_parser.found)
+        self.assertFalse(self.form_parser.complete)
+
+    def test_not_found(self):
+        form_parser = FormParser('missing_form')
+        form_parser.feed(LOGIN_PAGE_HTML)
+        self.assertFalse(form_parser.found)
+        self.assertFalse(form_parser.complete)
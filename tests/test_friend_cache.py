@@ -0,0 +1,83 @@
+import os
+import time
+import tempfile
+import unittest
+import configparser
+from unittest.mock import patch
+
+from fb2cal.friend_cache import FriendCache
+from fb2cal.friend_table import FriendTable
+from fb2cal.pipeline import fetch_facebook_users, load_cached_facebook_users
+from fb2cal.transformer import Transformer
+
+from mocks.birthday_comet_root_mocks import BIRTHDAY_COMET_ROOT_JANUARY_MOCK
+from mocks.replay_server import ReplayServerMixin
+
+class TestFriendCache(ReplayServerMixin, unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.friend_cache_file_path = os.path.join(self.temp_dir.name, 'cache', 'friends.json.gz')
+        self.friend_cache = FriendCache(self.friend_cache_file_path)
+        self.facebook_users = FriendTable(Transformer().transform_birthday_comet_monthly_to_birthdays(BIRTHDAY_COMET_ROOT_JANUARY_MOCK))
+
+        self.config = configparser.RawConfigParser()
+        self.config.read_dict({'CACHE': {'friend_cache_file_path': self.friend_cache_file_path}})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def save(self, fetched_at):
+        self.friend_cache.save(self.facebook_users, {11: fetched_at, 12: fetched_at + 1, 1: fetched_at + 1})
+
+    def test_save_and_load(self):
+        self.save(1000)
+
+        with open(self.friend_cache_file_path, mode='rb') as friend_cache_file:
+            self.assertEqual(friend_cache_file.read(2), b'\x1f\x8b') # gzip magic number
+        self.assertEqual(os.listdir(os.path.dirname(self.friend_cache_file_path)), ['friends.json.gz'])
+
+        months = self.friend_cache.load()
+        self.assertEqual(sorted(months, key=int), ['1', '11', '12'])
+        self.assertEqual(len(months['12']['friends']), 1)
+
+        with patch('time.time', return_value=1500):
+            self.assertEqual(self.friend_cache.get_age(months), 500)
+
+        # Friends come back in calendar month order rather than the order they were saved in
+        cached_facebook_users = sorted(self.friend_cache.get_facebook_users(months), key=lambda facebook_user: facebook_user.id)
+        facebook_users = sorted(self.facebook_users, key=lambda facebook_user: facebook_user.id)
+        self.assertEqual([str(facebook_user) for facebook_user in cached_facebook_users], [str(facebook_user) for facebook_user in facebook_users])
+        self.assertEqual([facebook_user.profile_picture_uri for facebook_user in cached_facebook_users], [facebook_user.profile_picture_uri for facebook_user in facebook_users])
+
+    def test_unreadable_cache(self):
+        os.makedirs(os.path.dirname(self.friend_cache_file_path))
+        with open(self.friend_cache_file_path, mode='wb') as friend_cache_file:
+            friend_cache_file.write(b'not gzip')
+
+        with self.assertLogs('fb2cal', level='WARNING'):
+            self.assertIsNone(self.friend_cache.load())
+
+    def test_load_cached_facebook_users(self):
+        # Never used without a maximum age unless offline
+        self.assertIsNone(load_cached_facebook_users(self.config))
+
+        with self.assertLogs('fb2cal', level='ERROR'):
+            with self.assertRaises(SystemError):
+                load_cached_facebook_users(self.config, offline=True)
+
+        self.save(time.time() - 100)
+        self.assertEqual(len(load_cached_facebook_users(self.config, max_age=3600)), 3)
+        self.assertIsNone(load_cached_facebook_users(self.config, max_age=10))
+
+        with self.assertLogs('fb2cal', level='WARNING'):
+            self.assertEqual(len(load_cached_facebook_users(self.config, offline=True, max_age=10)), 3)
+
+    def test_fetch_saves_cache(self):
+        self.config.read_dict({'CACHE': {'cache_friends': 'True'}})
+        facebook_users = fetch_facebook_users(self.config, self.create_replay_facebook_browser())
+
+        # Every month of a full fetch is cached, the mock only holds friends in November, December and January
+        months = self.friend_cache.load()
+        self.assertEqual(sorted(months, key=int), [str(month) for month in range(1, 13)])
+        self.assertEqual({month: len(months[month]['friends']) for month in months if months[month]['friends']}, {'11': 1, '12': 1, '1': 1})
+        self.assertEqual(len(load_cached_facebook_users(self.config, offline=True)), len(facebook_users))
@@ -0,0 +1,59 @@
+import sys
+import unittest
+
+from fb2cal.facebook_user import FacebookUser
+from fb2cal.friend_table import FriendTable, FriendRow
+from fb2cal.ics_writer import ICSWriter
+from fb2cal.transformer import Transformer
+
+from mocks.birthday_comet_root_mocks import BIRTHDAY_COMET_ROOT_JANUARY_MOCK
+
+class TestFriendTable(unittest.TestCase):
+    def setUp(self):
+        self.facebook_users = Transformer().transform_birthday_comet_monthly_to_birthdays(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+        self.friend_table = FriendTable(self.facebook_users)
+
+    def test_facebook_user_slots(self):
+        with self.assertRaises(AttributeError):
+            self.facebook_users[0].nickname = 'Pete'
+
+    def test_friend_row_slots(self):
+        self.assertEqual(FriendRow.__slots__, ('table', 'index'))
+        self.assertFalse(hasattr(self.friend_table[0], '__dict__'))
+        self.assertLess(sys.getsizeof(self.friend_table[0]), sys.getsizeof(self.facebook_users[0]))
+
+    def test_profile_picture_prefix_interned(self):
+        self.assertIs(self.facebook_users[0]._profile_picture_prefix, self.facebook_users[1]._profile_picture_prefix)
+        self.assertEqual(self.facebook_users[0]._profile_picture_prefix, 'https://scontent-syd2-1.xx.fbcdn.net/v/t1.0-1/cp0/p60x60/')
+
+    def test_profile_picture_uri_missing(self):
+        self.assertEqual(FacebookUser('1', 'John', None, None, 1, 1, None).profile_picture_uri, None)
+        self.assertEqual(FacebookUser('1', 'John', None, '', 1, 1, None).profile_picture_uri, '')
+
+    def test_rows(self):
+        self.assertEqual(len(self.friend_table), 3)
+
+        for facebook_user, friend_row in zip(self.facebook_users, self.friend_table):
+            self.assertEqual(friend_row, facebook_user)
+            self.assertEqual(str(friend_row), str(facebook_user))
+            self.assertEqual(friend_row.profile_url, facebook_user.profile_url)
+            self.assertEqual(friend_row.profile_picture_uri, facebook_user.profile_picture_uri)
+
+        self.assertEqual(self.friend_table[1].birthday_day, 25)
+        self.assertEqual(self.friend_table[1].birthday_month, 12)
+        self.assertEqual(self.friend_table[1].birthday_year, None)
+        self.assertEqual(self.friend_table[-1].id, '198041065')
+
+        with self.assertRaises(IndexError):
+            self.friend_table[3]
+
+    def test_add(self):
+        friend_table = FriendTable()
+        friend_table.add('1', 'John', 'https://www.facebook.com/john', None, 29, 2, 1996)
+
+        self.assertEqual(str(friend_table[0]), 'John (29/02/1996)')
+        self.assertEqual(friend_table[0].profile_picture_uri, None)
+        self.assertEqual(friend_table.birthday_years.itemsize, 2)
+
+    def test_ics_writer(self):
+        self.assertEqual(ICSWriter(self.friend_table).get_fingerprint(), ICSWriter(self.facebook_users).get_fingerprint())
@@ -1,8 +1,13 @@
+import os
+import stat
+import hashlib
 import unittest
+import tempfile
+from unittest.mock import patch
 from ics import Calendar
 from freezegun import freeze_time
 
-from fb2cal.ics_writer import ICSWriter
+from fb2cal.ics_writer import ICSWriter, fold_line
 from fb2cal.facebook_user import FacebookUser
 
 class TestICSWriter(unittest.TestCase):
@@ -161,3 +166,190 @@ END:VCALENDAR
             self.assertEqual(actual.begin, expected.begin)
             self.assertEqual(actual.duration, expected.duration)
             self.assertEqual(actual.description, expected.description)
+
+    @freeze_time("2021-01-01")
+    def test_leap_day_without_year(self):
+        ics_writer = ICSWriter([
+            FacebookUser(
+                '100000007',
+                'Leap Day',
+                'https://www.facebook.com/leap.day',
+                'https://scontent-syd2-1.xx.fbcdn.net/v/t1.0-1/cp0/p60x60/00000007_10161077510019848_299841799451806933_o.jpg',
+                29,
+                2,
+                None
+            ),
+        ])
+        ics_writer.generate()
+        event, = ics_writer.get_birthday_calendar().events
+        self.assertEqual(event.begin.strftime('%Y-%m-%d'), '2021-02-28')
+
+    @freeze_time("2020-12-01")
+    def test_serialize_equivalence(self):
+        self.ics_writer.generate()
+        ics_lib_lines = ''.join(self.ics_writer.get_birthday_calendar()).rstrip('\r\n').split('\r\n')
+        serialized_lines = ''.join(self.ics_writer.serialize()).replace('\r\n ', '').rstrip('\r\n').split('\r\n')
+
+        # Once unfolded: same properties in the same order, events may be in any order in the ics library output
+        self.assertEqual(serialized_lines[:7], ics_lib_lines[:7])
+        self.assertEqual(serialized_lines[-3:], ics_lib_lines[-3:])
+        self.assertEqual(sorted(serialized_lines), sorted(ics_lib_lines))
+
+    def test_serialize_order(self):
+        serialized_uids = [line[len('UID:'):] for line in ''.join(ICSWriter(list(reversed(self.facebook_users))).serialize()).split('\r\n') if line.startswith('UID:')]
+
+        # Birthday order regardless of the order users were fetched in
+        self.assertEqual(serialized_uids, ['100000000', '100000004', '100000001', '100000006', '100000002', '100000003', '100000005'])
+
+    @freeze_time("2020-12-01")
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ics_file_path = os.path.join(temp_dir, 'out', 'birthdays.ics')
+            self.ics_writer.write(ics_file_path)
+            with open(ics_file_path, mode='rb') as ics_file:
+                content = ics_file.read()
+
+        self.assertTrue(content.startswith(b'BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(content.endswith(b'END:VCALENDAR\r\n'))
+
+        self.ics_writer.generate()
+        written_calendar = Calendar(content.decode('utf-8'))
+        expected_events = sorted(self.ics_writer.get_birthday_calendar().events, key=lambda event: event.uid)
+        for actual, expected in zip(sorted(written_calendar.events, key=lambda event: event.uid), expected_events):
+            self.assertEqual(actual.uid, expected.uid)
+            self.assertEqual(actual.name, expected.name)
+            self.assertEqual(actual.begin, expected.begin)
+            self.assertEqual(actual.duration, expected.duration)
+            self.assertEqual(actual.description, expected.description)
+
+    def test_fold_line(self):
+        self.assertEqual(fold_line('SUMMARY:short'), 'SUMMARY:short')
+
+        line = 'DESCRIPTION:' + '韩忠清' * 30
+        folded_lines = fold_line(line).split('\r\n')
+        self.assertGreater(len(folded_lines), 1)
+        for i, folded_line in enumerate(folded_lines):
+            self.assertLessEqual(len(folded_line.encode('utf-8')), 75)
+            if i > 0:
+                self.assertTrue(folded_line.startswith(' '))
+        self.assertEqual(''.join(folded_line[1:] if i else folded_line for i, folded_line in enumerate(folded_lines)), line)
+
+    def test_write_incremental(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ics_file_path = os.path.join(temp_dir, 'birthdays.ics')
+
+            with freeze_time("2020-12-01"):
+                ICSWriter(self.facebook_users).write(ics_file_path, incremental=True)
+
+            changed_facebook_users = self.facebook_users[1:] + [FacebookUser('100000008', 'New Friend', 'https://www.facebook.com/new.friend', '', 3, 4, 1990)]
+            changed_facebook_users[0] = FacebookUser('100000001', 'Laura Daisy-Smith', 'https://www.facebook.com/laura.dasy.2', '', 12, 3, 1974)
+
+            with freeze_time("2020-12-02"):
+                ics_writer = ICSWriter(changed_facebook_users)
+                ics_writer.write(ics_file_path, incremental=True)
+                with open(ics_file_path, mode='r', encoding='UTF-8', newline='') as ics_file:
+                    incremental_content = ics_file.read()
+                full_content = ''.join(ICSWriter(changed_facebook_users).serialize())
+
+        self.assertEqual(ics_writer.render_stats, {'reused': 5, 'rendered': 2, 'removed': 1})
+
+        # Only DTSTAMP of reused events differ from a full render
+        self.assertEqual(incremental_content.replace('DTSTAMP:20201201T000000Z', 'DTSTAMP:20201202T000000Z'), full_content)
+        self.assertEqual(incremental_content.count('DTSTAMP:20201202T000000Z'), 2)
+
+    def test_write_skip_unchanged(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ics_file_path = os.path.join(temp_dir, 'birthdays.ics')
+
+            with freeze_time("2020-12-01"):
+                self.assertTrue(ICSWriter(self.facebook_users).write(ics_file_path, incremental=True, skip_unchanged=True))
+            os.utime(ics_file_path, (0, 0))
+
+            # Unchanged events keep their DTSTAMP so the calendar is identical and the file is not touched
+            with freeze_time("2020-12-02"), patch('tempfile.mkstemp') as mkstemp:
+                self.assertFalse(ICSWriter(list(reversed(self.facebook_users))).write(ics_file_path, incremental=True, skip_unchanged=True))
+            mkstemp.assert_not_called()
+            self.assertEqual(os.path.getmtime(ics_file_path), 0)
+
+            with freeze_time("2020-12-03"):
+                self.assertTrue(ICSWriter(self.facebook_users[1:]).write(ics_file_path, incremental=True, skip_unchanged=True))
+            self.assertNotEqual(os.path.getmtime(ics_file_path), 0)
+
+            # The digest leaves out DTSTAMP
+            with open(ics_file_path, mode='rb') as ics_file:
+                content = b''.join(line for line in ics_file if not line.startswith(b'DTSTAMP:'))
+            with open(f'{ics_file_path}.sha256', mode='r', encoding='UTF-8') as digest_file:
+                self.assertEqual(digest_file.read(), f'{hashlib.sha256(content).hexdigest()}\n')
+
+            # No temporary files are left behind
+            self.assertEqual(sorted(os.listdir(temp_dir)), ['birthdays.ics', 'birthdays.ics.cache.json', 'birthdays.ics.sha256'])
+
+    def test_write_skip_unchanged_full_render(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ics_file_path = os.path.join(temp_dir, 'birthdays.ics')
+
+            with freeze_time("2020-12-01"):
+                self.assertTrue(ICSWriter(self.facebook_users).write(ics_file_path, skip_unchanged=True))
+            os.utime(ics_file_path, (0, 0))
+
+            # A full render stamps every event with the current time, which alone does not count as a change
+            # Nothing is written to disk for an unchanged calendar
+            with freeze_time("2020-12-02"), patch('tempfile.mkstemp') as mkstemp, patch('os.fsync') as fsync:
+                self.assertFalse(ICSWriter(self.facebook_users).write(ics_file_path, skip_unchanged=True))
+            mkstemp.assert_not_called()
+            fsync.assert_not_called()
+            self.assertEqual(os.path.getmtime(ics_file_path), 0)
+
+            with freeze_time("2020-12-03"):
+                self.assertTrue(ICSWriter(self.facebook_users[1:]).write(ics_file_path, skip_unchanged=True))
+            with open(ics_file_path, mode='r', encoding='UTF-8', newline='') as ics_file:
+                self.assertIn('DTSTAMP:20201203T000000Z', ics_file.read())
+
+            # Without skip_unchanged the digest would go stale, so it is removed
+            self.assertTrue(ICSWriter(self.facebook_users).write(ics_file_path))
+            self.assertEqual(os.listdir(temp_dir), ['birthdays.ics'])
+
+    def test_render_cache_saved_atomically(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ics_file_path = os.path.join(temp_dir, 'birthdays.ics')
+            ICSWriter(self.facebook_users).write(ics_file_path, incremental=True)
+            with open(f'{ics_file_path}.cache.json', mode='r', encoding='UTF-8') as render_cache_file:
+                render_cache = render_cache_file.read()
+
+            # A failure while saving keeps the previous cache intact and leaves no temporary file behind
+            def partial_dump(obj, fp, **kwargs):
+                fp.write('{"version"')
+                raise OSError('No space left on device')
+
+            with patch('json.dump', side_effect=partial_dump):
+                with self.assertRaises(OSError):
+                    ICSWriter(self.facebook_users[1:]).write(ics_file_path, incremental=True)
+
+            with open(f'{ics_file_path}.cache.json', mode='r', encoding='UTF-8') as render_cache_file:
+                self.assertEqual(render_cache_file.read(), render_cache)
+            self.assertEqual(sorted(os.listdir(temp_dir)), ['birthdays.ics', 'birthdays.ics.cache.json'])
+
+    def test_write_keeps_file_mode(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ics_file_path = os.path.join(temp_dir, 'birthdays.ics')
+
+            self.ics_writer.write(ics_file_path)
+            os.chmod(ics_file_path, 0o640)
+            self.ics_writer.write(ics_file_path)
+
+            self.assertEqual(stat.S_IMODE(os.stat(ics_file_path).st_mode), 0o640)
+
+    def test_get_fingerprint(self):
+        fingerprint = ICSWriter(self.facebook_users).get_fingerprint()
+
+        self.assertEqual(ICSWriter(list(reversed(self.facebook_users))).get_fingerprint(), fingerprint)
+        self.assertNotEqual(ICSWriter(self.facebook_users[1:]).get_fingerprint(), fingerprint)
+
+        # Profile pictures are not part of the calendar
+        changed_facebook_users = list(self.facebook_users)
+        facebook_user = changed_facebook_users[0]
+        changed_facebook_users[0] = FacebookUser(facebook_user.id, facebook_user.name, facebook_user.profile_url, 'https://scontent.xx.fbcdn.net/other.jpg', facebook_user.birthday_day, facebook_user.birthday_month, facebook_user.birthday_year)
+        self.assertEqual(ICSWriter(changed_facebook_users).get_fingerprint(), fingerprint)
+
+        changed_facebook_users[0] = FacebookUser(facebook_user.id, 'Renamed', facebook_user.profile_url, '', facebook_user.birthday_day, facebook_user.birthday_month, facebook_user.birthday_year)
+        self.assertNotEqual(ICSWriter(changed_facebook_users).get_fingerprint(), fingerprint)
@@ -0,0 +1,24 @@
+import unittest
+
+from mocks.import_time import HEAVY_MODULES, measure_import_time
+
+class TestImportTime(unittest.TestCase):
+
+    def get_imported_modules(self, code):
+        """ Names of all modules imported by running code in a fresh interpreter """
+        return set(measure_import_time(code))
+
+    def test_main_does_not_import_heavy_modules(self):
+        imported_modules = self.get_imported_modules('import fb2cal.__main__')
+
+        self.assertIn('fb2cal.__main__', imported_modules)
+        self.assertEqual([module for module in HEAVY_MODULES if module in imported_modules], [])
+
+    def test_stages_import_what_they_need(self):
+        imported_modules = self.get_imported_modules('from fb2cal.facebook_browser import FacebookBrowser; FacebookBrowser()')
+        self.assertIn('mechanicalsoup', imported_modules)
+        self.assertNotIn('ics', imported_modules)
+
+        imported_modules = self.get_imported_modules('from fb2cal.ics_writer import ICSWriter; ICSWriter([]).generate()')
+        self.assertIn('ics', imported_modules)
+        self.assertNotIn('mechanicalsoup', imported_modules)
@@ -0,0 +1,26 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from fb2cal import json_backend
+from fb2cal.utils import remove_anti_hijacking_protection_bytes
+
+from mocks.birthday_comet_root_mocks import BIRTHDAY_COMET_ROOT_JANUARY_MOCK
+
+class TestJsonBackend(unittest.TestCase):
+    def setUp(self):
+        self.content = ('for (;;);' + json.dumps(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)).encode('utf-8')
+
+    def test_loads_from_bytes(self):
+        self.assertEqual(json_backend.loads(remove_anti_hijacking_protection_bytes(self.content)), BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+
+    def test_loads_stdlib_fallback(self):
+        with patch.object(json_backend, 'orjson', None):
+            self.assertEqual(json_backend.loads(remove_anti_hijacking_protection_bytes(self.content)), BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+            self.assertEqual(json.loads(json_backend.dumps({'offset_month': 3, 'scale': 1.5})), {'offset_month': 3, 'scale': 1.5})
+
+    def test_dumps(self):
+        self.assertEqual(json.loads(json_backend.dumps({'offset_month': 3, 'scale': 1.5})), {'offset_month': 3, 'scale': 1.5})
+
+    def test_remove_anti_hijacking_protection_bytes_without_prefix(self):
+        self.assertEqual(bytes(remove_anti_hijacking_protection_bytes(b'{"data":{}}')), b'{"data":{}}')
@@ -0,0 +1,44 @@
+import io
+import json
+import unittest
+
+from fb2cal.facebook_browser import BIRTHDAY_COMET_MONTHLY_STREAM_PREFIXES
+from fb2cal.facebook_user import FacebookUser
+from fb2cal.json_stream import is_json_streaming_available, parse_json_subtrees
+from fb2cal.transformer import Transformer
+from fb2cal.utils import skip_anti_hijacking_protection
+
+from mocks.birthday_comet_root_mocks import BIRTHDAY_COMET_ROOT_JANUARY_MOCK
+
+@unittest.skipUnless(is_json_streaming_available(), 'ijson is not installed')
+class TestJsonStream(unittest.TestCase):
+    def setUp(self):
+        response_body = ('for (;;);' + json.dumps(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)).encode('utf-8')
+        response_stream = skip_anti_hijacking_protection(io.BufferedReader(io.BytesIO(response_body)))
+        self.response_json = parse_json_subtrees(response_stream, BIRTHDAY_COMET_MONTHLY_STREAM_PREFIXES)
+
+    def test_same_birthdays(self):
+        transformer = Transformer()
+        expected = transformer.transform_birthday_comet_monthly_to_birthdays(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+        actual = transformer.transform_birthday_comet_monthly_to_birthdays(self.response_json)
+
+        def get_fields(facebook_user):
+            return {field: getattr(facebook_user, field) for field in FacebookUser.__slots__}
+
+        self.assertEqual([get_fields(facebook_user) for facebook_user in actual], [get_fields(facebook_user) for facebook_user in expected])
+
+    def test_unused_data_is_dropped(self):
+        self.assertEqual(list(self.response_json), ['data'])
+        self.assertEqual(list(self.response_json['data']), ['viewer'])
+
+        all_friends_by_birthday_month = self.response_json['data']['viewer']['all_friends_by_birthday_month']
+        self.assertEqual(all_friends_by_birthday_month['page_info'], {'has_next_page': True, 'end_cursor': '2'})
+
+        month_node = all_friends_by_birthday_month['edges'][0]['node']
+        self.assertEqual(month_node['month_name_in_iso8601'], 'November')
+        self.assertNotIn('friends_by_birthday_month_context_sentence', month_node)
+
+    def test_error_response(self):
+        response_stream = io.BufferedReader(io.BytesIO(b'{"error":1357004,"errorSummary":"Summary","errorDescription":"Description","payload":null}'))
+        response_json = parse_json_subtrees(skip_anti_hijacking_protection(response_stream), BIRTHDAY_COMET_MONTHLY_STREAM_PREFIXES)
+        self.assertEqual(response_json, {'error': 1357004, 'errorSummary': 'Summary', 'errorDescription': 'Description'})
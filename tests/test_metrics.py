@@ -0,0 +1,93 @@
+import os
+import json
+import tempfile
+import unittest
+import configparser
+from unittest.mock import patch
+
+from fb2cal.metrics import Metrics
+from fb2cal.pipeline import fetch_facebook_users, save_metrics
+
+from mocks.replay_server import ReplayServerMixin
+
+class TestMetrics(ReplayServerMixin, unittest.TestCase):
+
+    def test_time_stage(self):
+        metrics = Metrics()
+
+        with patch('time.perf_counter', side_effect=[1, 3, 10, 10.5, 20, 21]):
+            with metrics.time_stage('login'):
+                pass
+            with metrics.time_stage('transform'):
+                pass
+            with self.assertRaises(SystemError):
+                with metrics.time_stage('transform'):
+                    raise SystemError
+
+        self.assertEqual(metrics.stages, {'login': 2, 'transform': 1.5})
+
+        metrics.reset()
+        self.assertEqual(metrics.stages, {})
+
+    def test_time_iteration(self):
+        metrics = Metrics()
+
+        # Waiting for each item and for the end is timed, the work done with an item in between is not
+        with patch('time.perf_counter', side_effect=[0, 1, 5, 7, 20, 20.5]):
+            self.assertEqual(list(metrics.time_iteration('fetch', ['a', 'b'])), ['a', 'b'])
+
+        self.assertEqual(metrics.stages, {'fetch': 3.5})
+
+    def test_to_prometheus(self):
+        metrics = Metrics()
+        metrics.stages = {'fetch': 1.5}
+        metrics.record_graphql_response(0, 1024)
+        metrics.record_quarter_birthdays(0, 12)
+        metrics.set_value('success', True)
+
+        prometheus = metrics.to_prometheus()
+
+        self.assertIn('# TYPE fb2cal_stage_duration_seconds gauge\nfb2cal_stage_duration_seconds{stage="fetch"} 1.5\n', prometheus)
+        self.assertIn('fb2cal_graphql_response_bytes{offset_month="0"} 1024\n', prometheus)
+        self.assertIn('fb2cal_quarter_birthdays{offset_month="0"} 12\n', prometheus)
+        self.assertIn('fb2cal_success 1\n', prometheus)
+        self.assertNotIn('fb2cal_ics_bytes', prometheus)
+
+    def test_graphql_response_bytes_stream_json(self):
+        # Both ways of reading responses report the bytes received over the network
+        graphql_response_bytes = []
+        for stream_json in [False, True]:
+            metrics = Metrics()
+            self.create_replay_facebook_browser(stream_json=stream_json, metrics=metrics).query_graph_ql_birthday_comet_monthly(0)
+
+            graphql_response_bytes.append(metrics.graphql_response_bytes)
+
+        self.assertGreater(graphql_response_bytes[0][0], 0)
+        self.assertEqual(graphql_response_bytes[0], graphql_response_bytes[1])
+
+    def test_fetch_metrics(self):
+        config = configparser.RawConfigParser()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config.read_dict({'METRICS': {'json_path': os.path.join(temp_dir, 'metrics.json'), 'prometheus_textfile_path': os.path.join(temp_dir, 'fb2cal.prom')}})
+
+            metrics = Metrics()
+            facebook_users = fetch_facebook_users(config, self.create_replay_facebook_browser(metrics=metrics))
+
+            save_metrics(config, metrics, True)
+
+            with open(os.path.join(temp_dir, 'metrics.json'), mode='r', encoding='UTF-8') as metrics_file:
+                saved_metrics = json.load(metrics_file)
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, 'fb2cal.prom')))
+            self.assertEqual(sorted(os.listdir(temp_dir)), ['fb2cal.prom', 'metrics.json'])
+
+        self.assertEqual(saved_metrics['birthdays'], len(facebook_users))
+        self.assertEqual(saved_metrics['quarter_birthdays'], {'0': 3, '3': 3, '6': 3, '9': 3})
+        self.assertEqual(set(saved_metrics['graphql_response_bytes']), {'0', '3', '6', '9'})
+        self.assertTrue(all(received_bytes > 0 for received_bytes in saved_metrics['graphql_response_bytes'].values()))
+        self.assertIn('transform', saved_metrics['stages'])
+        self.assertIn('fetch', saved_metrics['stages'])
+        self.assertTrue(saved_metrics['success'])
+
+        graphql_requests = [request for request in saved_metrics['requests'] if request['path'] == '/api/graphql/']
+        self.assertEqual(graphql_requests[0]['count'], 4)
+        self.assertEqual(graphql_requests[0]['status'], 200)
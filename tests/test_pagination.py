@@ -0,0 +1,107 @@
+import copy
+import unittest
+import configparser
+from datetime import date
+from freezegun import freeze_time
+
+from fb2cal.pagination import FriendsPagination
+from fb2cal.pipeline import fetch_facebook_users
+from fb2cal.planner import OffsetMonthPlanner
+from fb2cal.transformer import Transformer
+
+from mocks.birthday_comet_root_mocks import BIRTHDAY_COMET_ROOT_JANUARY_MOCK
+from mocks.replay_cassette_mocks import REPLAY_CASSETTE_MOCK, graph_ql_birthday_comet_monthly_exchange
+from mocks.replay_server import ReplayServerMixin
+
+# Response with the friends of its month index month_index continued after end_cursor
+def truncated_response(month_index, end_cursor):
+    response_json = copy.deepcopy(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+    month_node = response_json['data']['viewer']['all_friends_by_birthday_month']['edges'][month_index]['node']
+    month_node['friends']['page_info'] = {'has_next_page': end_cursor is not None, 'end_cursor': end_cursor}
+    return response_json
+
+# Next page of the friends of its month index month_index, holding only that month with a single friend
+def page_response(month_index, friend_id, end_cursor=None):
+    response_json = truncated_response(month_index, end_cursor)
+    month_edges = response_json['data']['viewer']['all_friends_by_birthday_month']['edges']
+    month_edges[:] = [month_edges[month_index]]
+    friend_edges = month_edges[0]['node']['friends']['edges']
+    friend_edges[0]['node']['id'] = friend_id
+    del friend_edges[1:]
+    return response_json
+
+class TestFriendsPagination(ReplayServerMixin, unittest.TestCase):
+    def setUp(self):
+        # Offset month 0 is November, the first month of the mock response
+        offset_month_planner = OffsetMonthPlanner(Transformer(), start_date=date(2020, 11, 1))
+        self.friends_pagination = FriendsPagination(Transformer(), max_pages=3, get_expected_month=offset_month_planner.get_expected_month)
+
+    def test_get_next_pages(self):
+        self.assertEqual(self.friends_pagination.get_next_pages(0, None, BIRTHDAY_COMET_ROOT_JANUARY_MOCK), [])
+        self.assertEqual(self.friends_pagination.get_next_pages(0, None, truncated_response(2, 'a')), [(2, 'a')])
+
+        # Overlapping quarters page each month once
+        self.assertEqual(self.friends_pagination.get_next_pages(1, None, truncated_response(2, 'b')), [])
+
+        # Only the requested month of a page is followed
+        self.assertEqual(self.friends_pagination.get_next_pages(2, 'a', truncated_response(1, 'c')), [])
+        self.assertEqual(self.friends_pagination.get_next_pages(2, 'a', truncated_response(2, 'b')), [(2, 'b')])
+
+    def test_get_next_pages_month_left_out(self):
+        # December is left out of the response, the truncated January is still two months after November
+        response_json = truncated_response(2, 'a')
+        del response_json['data']['viewer']['all_friends_by_birthday_month']['edges'][1]
+
+        self.assertEqual(self.friends_pagination.get_next_pages(0, None, response_json), [(2, 'a')])
+
+    def test_get_next_pages_first_month_left_out(self):
+        # November itself is left out of the response for offset month 0, January is still two months after the requested November
+        response_json = truncated_response(2, 'a')
+        del response_json['data']['viewer']['all_friends_by_birthday_month']['edges'][0]
+
+        self.assertEqual(self.friends_pagination.get_next_pages(0, None, response_json), [(2, 'a')])
+
+    def test_get_next_pages_unknown_month(self):
+        response_json = truncated_response(2, 'a')
+        month_edges = response_json['data']['viewer']['all_friends_by_birthday_month']['edges']
+        month_edges[0]['node']['month_name_in_iso8601'] = 'Smarch'
+        month_edges[0]['node']['friends']['page_info'] = {'has_next_page': True, 'end_cursor': 'b'}
+
+        with self.assertLogs('fb2cal', level='WARNING') as logs:
+            # A month without a known name is not paged, the other months still are
+            self.assertEqual(self.friends_pagination.get_next_pages(0, None, response_json), [(2, 'a')])
+
+            # Without the requested month nothing is paged
+            self.assertEqual(FriendsPagination(Transformer()).get_next_pages(0, None, truncated_response(2, 'c')), [])
+
+        self.assertIn('without a known name', logs.output[0])
+        self.assertIn('offset month 0 is unknown', logs.output[1])
+
+    def test_get_next_pages_stops(self):
+        with self.assertLogs('fb2cal', level='WARNING') as logs:
+            self.assertEqual(self.friends_pagination.get_next_pages(0, None, truncated_response(0, 'a')), [(0, 'a')])
+            self.assertEqual(self.friends_pagination.get_next_pages(0, 'a', truncated_response(0, 'a')), [])
+            self.assertEqual(self.friends_pagination.get_next_pages(0, 'a', truncated_response(0, 'b')), [(0, 'b')])
+            self.assertEqual(self.friends_pagination.get_next_pages(0, 'b', truncated_response(0, 'c')), [])
+
+        self.assertIn('did not advance', logs.output[0])
+        self.assertIn('after 3 pages', logs.output[1])
+
+    @freeze_time('2020-11-01')
+    def test_fetch_all_pages(self):
+        cassette = copy.deepcopy(REPLAY_CASSETTE_MOCK)
+        cassette['exchanges'] += [
+            # December is paged with offset month 1 although it is the second month of the response for offset month 3
+            graph_ql_birthday_comet_monthly_exchange(3, response_json=truncated_response(1, 'page-2')),
+            graph_ql_birthday_comet_monthly_exchange(1, 'page-2', page_response(1, '700000001', 'page-3')),
+            graph_ql_birthday_comet_monthly_exchange(1, 'page-3', page_response(1, '700000002')),
+        ]
+
+        for concurrent in ['False', 'True']:
+            with self.subTest(concurrent=concurrent):
+                config = configparser.RawConfigParser()
+                config.read_dict({'FETCH': {'concurrent': concurrent}})
+
+                facebook_users = fetch_facebook_users(config, self.create_replay_facebook_browser(cassette))
+
+                self.assertEqual(sorted(facebook_user.id for facebook_user in facebook_users), ['1000023', '198041065', '600009847', '700000001', '700000002'])
@@ -0,0 +1,138 @@
+import os
+import copy
+import time
+import tempfile
+import unittest
+import configparser
+from datetime import date
+from freezegun import freeze_time
+
+from fb2cal.facebook_user import FacebookUser
+from fb2cal.friend_cache import FriendCache
+from fb2cal.friend_table import FriendTable
+from fb2cal.metrics import Metrics
+from fb2cal.pipeline import fetch_facebook_users
+from fb2cal.planner import OffsetMonthPlanner, get_upcoming_offset_months, get_upcoming_months
+from fb2cal.transformer import Transformer, MONTH_NAMES
+
+from mocks.birthday_comet_root_mocks import BIRTHDAY_COMET_ROOT_JANUARY_MOCK
+from mocks.replay_cassette_mocks import REPLAY_CASSETTE_MOCK, graph_ql_birthday_comet_monthly_exchange
+from mocks.replay_server import ReplayServerMixin
+
+# Response listing the given months without any friends
+def months_response(*months):
+    return {'data': {'viewer': {'all_friends_by_birthday_month': {'edges': [{'node': {'month_name_in_iso8601': MONTH_NAMES[month], 'friends': {'edges': []}}} for month in months]}}}}
+
+class TestOffsetMonthPlanner(ReplayServerMixin, unittest.TestCase):
+    def plan_year(self, window, offset_months=range(12), skipped_months=()):
+        """ Returns the offset months queried when every response covers window months starting at its offset month (0 is March) """
+        offset_month_planner = OffsetMonthPlanner(Transformer(), offset_months)
+        pages = [(offset_month, None) for offset_month in offset_month_planner.get_initial_offset_months()]
+        queried_offset_months = []
+
+        while pages:
+            offset_month, cursor = pages.pop(0)
+            queried_offset_months.append(offset_month)
+            months = [(2 + offset_month + i) % 12 for i in range(window) if (2 + offset_month + i) % 12 not in skipped_months]
+            pages += offset_month_planner.get_next_pages(offset_month, cursor, months_response(*months))
+
+        return queried_offset_months
+
+    def test_quarters(self):
+        # All quarters are planned up front so they can be sent at once
+        offset_month_planner = OffsetMonthPlanner(Transformer())
+        self.assertEqual(offset_month_planner.get_initial_offset_months(), [0, 3, 6, 9])
+
+        self.assertEqual(self.plan_year(3), [0, 3, 6, 9])
+
+    def test_adapts_to_window(self):
+        # Offset months the planned queries did not cover are queried once their responses arrive
+        self.assertEqual(self.plan_year(1), [0, 3, 6, 9, 1, 2, 4, 5, 7, 8, 10, 11])
+        self.assertEqual(self.plan_year(2), [0, 3, 6, 9, 2, 5, 8, 11])
+        self.assertEqual(self.plan_year(12), [0, 3, 6, 9])
+
+    def test_months_left_out(self):
+        # April (offset month 1) has no birthdays and is missing from responses, so it is queried again on its own, the response
+        # then starts with May which is placed at offset month 1, leading to one redundant query but never to a missed month
+        self.assertEqual(self.plan_year(3, skipped_months=(3,)), [0, 3, 6, 9, 1])
+
+    def test_upcoming_offset_months(self):
+        self.assertEqual(self.plan_year(3, get_upcoming_offset_months(30, date(2021, 3, 15))), [0])
+        self.assertEqual(self.plan_year(3, get_upcoming_offset_months(100, date(2021, 3, 15))), [0, 3])
+        self.assertEqual(get_upcoming_offset_months(30, date(2021, 3, 15)), range(2))
+        self.assertEqual(get_upcoming_offset_months(1, date(2021, 3, 31)), range(1))
+        self.assertEqual(get_upcoming_offset_months(20, date(2021, 12, 20)), range(2))
+        self.assertEqual(get_upcoming_offset_months(400, date(2021, 3, 15)), range(12))
+        self.assertEqual(get_upcoming_months(20, date(2021, 12, 20)), {12, 1})
+
+    def test_pages_do_not_change_plan(self):
+        offset_month_planner = OffsetMonthPlanner(Transformer())
+        offset_month_planner.get_initial_offset_months()
+        self.assertEqual(offset_month_planner.get_next_pages(0, 'cursor', months_response(2)), [])
+
+    def fetch_upcoming_days(self, config, cassette=REPLAY_CASSETTE_MOCK):
+        metrics = Metrics()
+        facebook_users = fetch_facebook_users(config, self.create_replay_facebook_browser(cassette, metrics=metrics))
+
+        self.metrics = metrics
+        return sorted(facebook_user.name for facebook_user in facebook_users), sorted(metrics.graphql_response_bytes)
+
+    @freeze_time('2020-11-01')
+    def test_fetch_upcoming_days(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = configparser.RawConfigParser()
+            config.read_dict({
+                'FETCH': {'upcoming_days': '7'},
+                'CACHE': {'cache_friends': 'True', 'friend_cache_file_path': os.path.join(temp_dir, 'friends.json.gz')},
+            })
+
+            # Without a friend cache the full year is fetched and cached
+            self.assertEqual(self.fetch_upcoming_days(config), (['Albus Dumbledore', 'Pirate Pete', 'Santa Claus'], [0, 3, 6, 9]))
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, 'friends.json.gz')))
+
+            # Otherwise only November is fetched again, the rest of the year is kept from the cache
+            friend_cache = FriendCache(os.path.join(temp_dir, 'friends.json.gz'))
+            friend_cache.save(FriendTable([
+                FacebookUser('1', 'March Friend', 'https://www.facebook.com/march', '', 3, 3, None),
+                FacebookUser('2', 'Former November Friend', 'https://www.facebook.com/november', '', 2, 11, None),
+                FacebookUser('198041065', 'Renamed Albus', 'https://www.facebook.com/prof.albus', '', 17, 1, 1881),
+            ]), dict.fromkeys(range(1, 13), time.time()))
+
+            self.assertEqual(self.fetch_upcoming_days(config), (['Albus Dumbledore', 'March Friend', 'Pirate Pete', 'Santa Claus'], [0]))
+            self.assertEqual(self.metrics.values['upcoming_birthdays'], 1) # Pirate Pete on November 1
+
+    def test_fetch_upcoming_days_across_months(self):
+        # The response for offset month 0 once the window moved on to December, November is left out as it is no longer requested
+        december_response = copy.deepcopy(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+        del december_response['data']['viewer']['all_friends_by_birthday_month']['edges'][0]
+        december_cassette = copy.deepcopy(REPLAY_CASSETTE_MOCK)
+        december_cassette['exchanges'].append(graph_ql_birthday_comet_monthly_exchange(0, response_json=december_response))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = configparser.RawConfigParser()
+            config.read_dict({
+                'FETCH': {'upcoming_days': '2'},
+                'CACHE': {'cache_friends': 'True', 'friend_cache_file_path': os.path.join(temp_dir, 'friends.json.gz')},
+            })
+            friend_cache = FriendCache(os.path.join(temp_dir, 'friends.json.gz'))
+
+            # Full year fetched before Pirate Pete was added as a friend
+            with freeze_time('2020-10-01'):
+                friend_cache.save(FriendTable([
+                    FacebookUser('1', 'March Friend', 'https://www.facebook.com/march', '', 3, 3, None),
+                ]), dict.fromkeys(range(1, 13), time.time()))
+
+            # October and November are fetched, Pirate Pete's November is saved back to the friend cache
+            with freeze_time('2020-10-31'):
+                self.assertEqual(self.fetch_upcoming_days(config), (['Albus Dumbledore', 'March Friend', 'Pirate Pete', 'Santa Claus'], [0]))
+                self.assertEqual(friend_cache.load()['11']['fetched_at'], time.time())
+                self.assertEqual(friend_cache.load()['3']['fetched_at'], time.time() - 30 * 24 * 60 * 60)
+
+            # Once the window moved on to December, Pirate Pete is kept from the friend cache
+            with freeze_time('2020-12-01'):
+                self.assertEqual(self.fetch_upcoming_days(config, december_cassette), (['Albus Dumbledore', 'March Friend', 'Pirate Pete', 'Santa Claus'], [0]))
+
+            # Once a cached month is older than max_age the full year is fetched again
+            config.read_dict({'CACHE': {'max_age': str(7 * 24 * 60 * 60)}})
+            with freeze_time('2020-12-02'):
+                self.assertEqual(self.fetch_upcoming_days(config), (['Albus Dumbledore', 'Pirate Pete', 'Santa Claus'], [0, 3, 6, 9]))
@@ -0,0 +1,121 @@
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+
+import requests
+
+from fb2cal.rate_limiter import TokenBucket, RateLimiter, RateLimitedAdapter, parse_retry_after
+
+class FlakyRequestHandler(BaseHTTPRequestHandler):
+    """ Answers with the next status code in server.status_codes """
+
+    def do_GET(self):
+        status_code = self.server.status_codes.pop(0)
+        self.send_response(status_code)
+        if status_code == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_token_bucket(self):
+        with patch('time.monotonic', return_value=100):
+            token_bucket = TokenBucket(rate=2, capacity=2)
+
+            # Bursts up to capacity are free, after that requests are spaced out at rate
+            self.assertEqual([token_bucket.reserve() for _ in range(4)], [0, 0, 0.5, 1])
+
+        with patch('time.monotonic', return_value=102):
+            self.assertEqual(token_bucket.reserve(), 0)
+
+    def test_acquire(self):
+        rate_limiter = RateLimiter(host_rate=10, host_burst=1, account_rate=1, account_burst=1)
+
+        with patch('time.monotonic', return_value=100), patch('time.sleep') as sleep:
+            rate_limiter.acquire('www.facebook.com', 'alice')
+            rate_limiter.acquire('www.facebook.com', 'bob')
+            rate_limiter.acquire('www.facebook.com', 'alice')
+
+        # bob waits for the host, the second request of alice waits for her account limit
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.1, 1])
+        self.assertEqual(rate_limiter.get_counters(), {'requests': 3, 'throttled': 2, 'throttled_seconds': 1.1})
+
+    def test_unlimited(self):
+        rate_limiter = RateLimiter()
+
+        with patch('time.sleep') as sleep:
+            for _ in range(100):
+                rate_limiter.acquire('www.facebook.com', 'alice')
+
+        sleep.assert_not_called()
+
+    def test_get_backoff_delay(self):
+        rate_limiter = RateLimiter(backoff_base=1, backoff_max=10)
+
+        for attempt in range(6):
+            self.assertTrue(0 <= rate_limiter.get_backoff_delay(attempt) <= min(10, 2 ** attempt))
+        self.assertEqual(rate_limiter.get_backoff_delay(0, retry_after=5), 5)
+        self.assertEqual(rate_limiter.get_backoff_delay(0, retry_after=3600), 10)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_adapter_retries(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}/'
+
+        rate_limiter = RateLimiter(max_retries=2, backoff_base=0.01)
+        session = requests.Session()
+        session.mount('http://', RateLimitedAdapter(rate_limiter, lambda: 'alice'))
+
+        try:
+            server.status_codes = [429, 503, 200]
+            self.assertEqual(session.get(url).status_code, 200)
+
+            # Gives up after max_retries and returns the last response
+            server.status_codes = [500, 502, 504, 200]
+            self.assertEqual(session.get(url).status_code, 504)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        counters = rate_limiter.get_counters()
+        self.assertEqual(counters['requests'], 6)
+        self.assertEqual(counters['retries'], 4)
+        self.assertEqual(counters['responses_200'], 1)
+        self.assertEqual(counters['responses_504'], 1)
+
+    def test_adapter_retries_only_idempotent_requests(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+
+        rate_limiter = RateLimiter(max_retries=2, backoff_base=0.01)
+        session = requests.Session()
+        session.mount('http://', RateLimitedAdapter(rate_limiter, retry_post_paths=('/api/graphql/',)))
+
+        try:
+            # A failed login is returned straight away
+            server.status_codes = [503, 200]
+            self.assertEqual(session.post(f'{url}/login/device-based/regular/login/', data={'email': 'alice'}).status_code, 503)
+            self.assertEqual(rate_limiter.get_counters().get('retries', 0), 0)
+
+            # Queries are retried
+            server.status_codes = [503, 200]
+            self.assertEqual(session.post(f'{url}/api/graphql/', data={'doc_id': '1'}).status_code, 200)
+            self.assertEqual(rate_limiter.get_counters()['retries'], 1)
+        finally:
+            server.shutdown()
+            server.server_close()
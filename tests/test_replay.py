@@ -0,0 +1,72 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from fb2cal.facebook_browser import FacebookBrowser
+from fb2cal.replay import Recorder, ReplayServer, load_cassette
+from fb2cal.transformer import Transformer
+
+from mocks.replay_cassette_mocks import REPLAY_CASSETTE_MOCK
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.temp_dir.cleanup()
+
+    def start_server(self, cassette, **kwargs):
+        server = ReplayServer(cassette, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    def run_pipeline(self, facebook_browser):
+        facebook_browser.authenticate('user@example.com', 'hunter2-password')
+        self.assertTrue(facebook_browser.is_authenticated())
+
+        transformer = Transformer()
+        facebook_users = set()
+        for offset_month in [0, 3, 6, 9]:
+            facebook_users.update(transformer.transform_birthday_comet_monthly_to_birthdays(facebook_browser.query_graph_ql_birthday_comet_monthly(offset_month)))
+        return facebook_users
+
+    def test_end_to_end(self):
+        server = self.start_server(REPLAY_CASSETTE_MOCK)
+        facebook_users = self.run_pipeline(FacebookBrowser(base_url=server.base_url))
+        self.assertEqual(sorted(facebook_user.id for facebook_user in facebook_users), ['1000023', '198041065', '600009847'])
+
+    def test_payload_scale(self):
+        server = self.start_server(REPLAY_CASSETTE_MOCK, payload_scale=10)
+        facebook_users = self.run_pipeline(FacebookBrowser(base_url=server.base_url))
+        self.assertEqual(len(facebook_users), 30)
+
+    def test_record_and_replay(self):
+        server = self.start_server(REPLAY_CASSETTE_MOCK)
+        facebook_browser = FacebookBrowser(base_url=server.base_url)
+        recorder = Recorder(facebook_browser.browser.session)
+        self.run_pipeline(facebook_browser)
+
+        cassette_path = os.path.join(self.temp_dir.name, 'cassette.json')
+        recorder.save(cassette_path)
+
+        with open(cassette_path, encoding='UTF-8') as cassette_file:
+            cassette_text = cassette_file.read()
+        for secret in ['user@example.com', 'user%40example.com', 'NAcMc0aFGtoKen', 'Xb8nZm4kQ1dFhM3Y0hBtR9aP', '#PWD_BROWSER']:
+            self.assertNotIn(secret, cassette_text)
+        self.assertIn('SCRUBBED_FB_DTSG', cassette_text)
+
+        # The recorded cassette can be replayed in turn
+        replay_server = self.start_server(load_cassette(cassette_path))
+        facebook_users = self.run_pipeline(FacebookBrowser(base_url=replay_server.base_url))
+        self.assertEqual(len(facebook_users), 3)
+
+    def test_unknown_request(self):
+        server = self.start_server(REPLAY_CASSETTE_MOCK)
+        facebook_browser = FacebookBrowser(base_url=server.base_url)
+        self.assertEqual(facebook_browser.browser.session.get(f'{server.base_url}/unknown').status_code, 404)
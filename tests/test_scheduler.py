@@ -0,0 +1,43 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+from fb2cal.scheduler import RefreshScheduler
+
+class TestRefreshScheduler(unittest.TestCase):
+
+    def test_get_delay(self):
+        scheduler = RefreshScheduler(lambda: None, 100, jitter=10, retry_interval=5)
+
+        for _ in range(100):
+            self.assertTrue(90 <= scheduler.get_delay() <= 110)
+        self.assertEqual(RefreshScheduler(lambda: None, 100).get_delay(), 100)
+        self.assertGreaterEqual(RefreshScheduler(lambda: None, 1, jitter=10).get_delay(), 0)
+
+        with patch('random.uniform', return_value=0):
+            self.assertEqual(scheduler.get_delay(succeeded=False), 5)
+
+    def test_run_until_stopped(self):
+        refreshes = []
+        delays = []
+
+        def refresh():
+            refreshes.append(len(refreshes))
+            if len(refreshes) == 2:
+                raise SystemError
+            if len(refreshes) == 4:
+                scheduler.stop()
+
+        scheduler = RefreshScheduler(refresh, 0.02, retry_interval=0.01)
+        get_delay = scheduler.get_delay
+        scheduler.get_delay = lambda succeeded=True: delays.append(succeeded) or get_delay(succeeded)
+
+        thread = threading.Thread(target=scheduler.run)
+        thread.start()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(refreshes, [0, 1, 2, 3])
+
+        # A failed refresh does not stop the loop and the next one is scheduled with the retry interval
+        self.assertEqual(delays, [True, True, False, True, True])
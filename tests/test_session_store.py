@@ -0,0 +1,42 @@
+import os
+import unittest
+import tempfile
+import requests
+
+from fb2cal.session_store import SessionStore
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.session_file_path = os.path.join(self.temp_dir.name, 'cache', 'session.bin')
+        self.session_store = SessionStore(self.session_file_path, 'user@example.com:password')
+
+        self.cookiejar = requests.cookies.RequestsCookieJar()
+        self.cookiejar.set('c_user', '100000000', domain='.facebook.com', path='/')
+        self.cookiejar.set('xs', '12%3Aabcdef', domain='.facebook.com', path='/')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_load_missing(self):
+        self.assertIsNone(self.session_store.load())
+
+    def test_round_trip(self):
+        self.session_store.save(self.cookiejar)
+        cookiejar = self.session_store.load()
+        self.assertEqual(cookiejar.get('c_user'), '100000000')
+        self.assertEqual(cookiejar.get('xs'), '12%3Aabcdef')
+
+    def test_file_is_encrypted(self):
+        self.session_store.save(self.cookiejar)
+        with open(self.session_file_path, mode='rb') as session_file:
+            self.assertNotIn(b'100000000', session_file.read())
+
+    def test_wrong_secret(self):
+        self.session_store.save(self.cookiejar)
+        self.assertIsNone(SessionStore(self.session_file_path, 'user@example.com:changed').load())
+
+    def test_clear(self):
+        self.session_store.save(self.cookiejar)
+        self.session_store.clear()
+        self.assertFalse(os.path.exists(self.session_file_path))
@@ -0,0 +1,43 @@
+import os
+import unittest
+import tempfile
+from unittest.mock import patch
+
+from fb2cal.token_cache import TokenCache
+
+class TestTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.token_cache_file_path = os.path.join(self.temp_dir.name, 'cache', 'tokens.json')
+        self.token_cache = TokenCache(self.token_cache_file_path, 60)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_get_missing(self):
+        self.assertIsNone(self.token_cache.get('100000000'))
+
+    def test_survives_restart(self):
+        self.token_cache.set('100000000', 'token-a')
+        self.assertEqual(TokenCache(self.token_cache_file_path, 60).get('100000000'), 'token-a')
+
+    def test_keyed_by_account(self):
+        self.token_cache.set('100000000', 'token-a')
+        self.token_cache.set('100000001', 'token-b')
+        self.assertEqual(self.token_cache.get('100000000'), 'token-a')
+        self.assertEqual(self.token_cache.get('100000001'), 'token-b')
+
+    def test_ttl(self):
+        with patch('fb2cal.token_cache.time.time', return_value=1000):
+            self.token_cache.set('100000000', 'token-a')
+        with patch('fb2cal.token_cache.time.time', return_value=1060):
+            self.assertEqual(self.token_cache.get('100000000'), 'token-a')
+        with patch('fb2cal.token_cache.time.time', return_value=1061):
+            self.assertIsNone(self.token_cache.get('100000000'))
+
+    def test_invalidate(self):
+        self.token_cache.set('100000000', 'token-a')
+        self.token_cache.set('100000001', 'token-b')
+        self.token_cache.invalidate('100000000')
+        self.assertIsNone(self.token_cache.get('100000000'))
+        self.assertEqual(self.token_cache.get('100000001'), 'token-b')
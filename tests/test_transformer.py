@@ -1,3 +1,5 @@
+import copy
+import types
 import unittest
 from fb2cal.transformer import Transformer
 
@@ -40,3 +42,51 @@ class TestTransformer(unittest.TestCase):
         self.assertEqual(friend.birthday_day, 17)
         self.assertEqual(friend.birthday_month, 1)
         self.assertEqual(friend.birthday_year, 1881)
+
+    def test_iter_birthdays(self):
+        facebook_users = self.transformer.iter_birthday_comet_monthly_birthdays(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+        self.assertIsInstance(facebook_users, types.GeneratorType)
+
+        facebook_users = list(facebook_users)
+        self.assertEqual(facebook_users, self.facebook_users)
+        self.assertEqual([str(facebook_user) for facebook_user in facebook_users], [str(facebook_user) for facebook_user in self.facebook_users])
+
+    def test_friend_records(self):
+        friend_records = list(self.transformer.iter_birthday_comet_monthly_friend_records(BIRTHDAY_COMET_ROOT_JANUARY_MOCK))
+        self.assertEqual(friend_records[1][:3], ('1000023', 'Santa Claus', 'https://www.facebook.com/santa'))
+        self.assertEqual(friend_records[1][4:], (25, 12, None))
+        self.assertEqual(self.transformer.malformed_nodes, 0)
+
+    def test_malformed_nodes_skipped(self):
+        birthday_comet_root_json = copy.deepcopy(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+        month_edges = birthday_comet_root_json['data']['viewer']['all_friends_by_birthday_month']['edges']
+        del month_edges[0]['node']['friends']['edges'][0]['node']['birthdate']
+        del month_edges[2]['node']['friends']['edges'][0]['node']['birthdate']['year']
+        month_edges.insert(0, {'node': None})
+
+        with self.assertLogs('fb2cal', level='WARNING') as logs:
+            facebook_users = self.transformer.transform_birthday_comet_monthly_to_birthdays(birthday_comet_root_json)
+
+        self.assertEqual([facebook_user.id for facebook_user in facebook_users], ['1000023', '198041065'])
+        self.assertEqual(facebook_users[1].birthday_year, None)
+        self.assertEqual(self.transformer.malformed_nodes, 2)
+        self.assertIn('Skipped 2 malformed nodes', logs.output[0])
+        self.assertIn('data.viewer.all_friends_by_birthday_month.edges[]', logs.output[0])
+
+    def test_unexpected_response(self):
+        with self.assertLogs('fb2cal', level='ERROR'):
+            with self.assertRaises(SystemError):
+                self.transformer.transform_birthday_comet_monthly_to_birthdays({'data': {'viewer': None}})
+
+    def test_month_offsets(self):
+        self.assertEqual(self.transformer.get_birthday_comet_monthly_month_offsets(BIRTHDAY_COMET_ROOT_JANUARY_MOCK), [0, 1, 2])
+
+        # Offsets counted from a given month instead of the first month of the response
+        self.assertEqual(self.transformer.get_birthday_comet_monthly_month_offsets(BIRTHDAY_COMET_ROOT_JANUARY_MOCK, 10), [1, 2, 3])
+
+        # Months left out of the response are skipped over, months without a known name have no offset
+        birthday_comet_root_json = copy.deepcopy(BIRTHDAY_COMET_ROOT_JANUARY_MOCK)
+        month_edges = birthday_comet_root_json['data']['viewer']['all_friends_by_birthday_month']['edges']
+        del month_edges[1]
+        month_edges.append({'node': {'month_name_in_iso8601': 'Smarch'}})
+        self.assertEqual(self.transformer.get_birthday_comet_monthly_month_offsets(birthday_comet_root_json), [0, 2, None])
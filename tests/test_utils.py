@@ -0,0 +1,50 @@
+import re
+import unittest
+from unittest.mock import Mock
+
+from fb2cal.form_parser import FormParser
+from fb2cal.utils import search_response_stream
+
+class TestUtils(unittest.TestCase):
+    def setUp(self):
+        self.regexp = re.compile(r'\[\"DTSGInitialData\",\[],{\"token\":\"(.*?)\"')
+
+    def mock_response(self, chunks):
+        response = Mock(encoding='utf-8')
+        response.consumed = 0
+
+        def iter_content(chunk_size):
+            for chunk in chunks:
+                response.consumed += 1
+                yield chunk
+
+        response.iter_content = iter_content
+        return response
+
+    def test_search_response_stream_across_chunks(self):
+        response = self.mock_response([b'<html>', b'["DTSGInitialData",[],{"tok', b'en":"abc:123"}]', b'</html>', b'<!-- more -->'])
+        matches, = search_response_stream(response, [self.regexp])
+        self.assertEqual(matches[1], 'abc:123')
+        self.assertEqual(response.consumed, 3)
+        response.close.assert_called_once()
+
+    def test_search_response_stream_multibyte_split(self):
+        body = '["DTSGInitialData",[],{"token":"韩忠清"}]'.encode('utf-8')
+        response = self.mock_response([body[:33], body[33:]])
+        matches, = search_response_stream(response, [self.regexp])
+        self.assertEqual(matches[1], '韩忠清')
+
+    def test_search_response_stream_no_match(self):
+        response = self.mock_response([b'<html>', b'</html>'])
+        matches, other_matches = search_response_stream(response, [self.regexp, re.compile('html')])
+        self.assertIsNone(matches)
+        self.assertIsNotNone(other_matches)
+        response.close.assert_called_once()
+
+    def test_search_response_stream_waits_for_parser(self):
+        response = self.mock_response([b'["DTSGInitialData",[],{"token":"abc:123"}]', b'<form id="login_form" action="/login/">', b'<input name="lsd" value="x"></form>', b'<!-- more -->'])
+        form_parser = FormParser('login_form')
+        matches, = search_response_stream(response, [self.regexp], parser=form_parser)
+        self.assertEqual(matches[1], 'abc:123')
+        self.assertEqual(form_parser.fields, {'lsd': 'x'})
+        self.assertEqual(response.consumed, 3)